@@ -0,0 +1,25 @@
+"""
+ASGI config for RobustQ project.
+
+It exposes the ASGI callable as a module-level variable named ``application``. Requests to EVENT_STREAM_URL are
+served by the job event stream (jobs/events.py), everything else by Django.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'RobustQ.settings')
+
+django_application = get_asgi_application()
+
+from jobs import events  # noqa: E402 (needs the app registry)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == events.stream_url():
+        return await events.stream(scope, receive, send)
+    return await django_application(scope, receive, send)
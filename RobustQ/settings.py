@@ -11,6 +11,8 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
+from kombu import Queue
 
 try:
     from .local_config import DB
@@ -83,12 +85,16 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'jobs.context_processors.running_jobs',
+                'jobs.context_processors.event_stream',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'RobustQ.wsgi.application'
+# the job event stream (jobs/events.py) needs the ASGI application, see README
+ASGI_APPLICATION = 'RobustQ.asgi.application'
 
 
 # Database
@@ -105,12 +111,37 @@ DATABASES = {
     }
 }
 
+# 'default' keeps the keys of LOCAL_PREFIXES in the process for up to LOCAL_TIMEOUT seconds and everything else in
+# 'shared', a cache on shared memory all web and celery processes of this host use (jobs/cache_backend.py). memcached
+# on a unix socket works as 'shared' as well ('django.core.cache.backends.memcached.PyLibMCCache',
+# 'unix:/run/memcached/memcached.sock'). The database cache is the fallback if 'shared' fails. 'default' is local to
+# the host and only holds the upload progress of the web requests
+SHARED_CACHE_ROOT = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
 CACHES = {
     'default': {
+        'BACKEND': 'jobs.cache_backend.TieredCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'FALLBACK': 'db',
+            'LOCAL_TIMEOUT': 1,
+            'LOCAL_PREFIXES': ['upload_progress_'],
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(SHARED_CACHE_ROOT, 'robustq_cache'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'db': {
         'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
         'LOCATION': 'cache',
-    }
+    },
 }
+# cache alias of the state shared by the hosts: pipeline chains, running stages, the process registry of the cancel
+# path and the cost model (jobs/process_registry.py). Has to be reachable from every host running web or celery
+PIPELINE_CACHE = 'db'
+# the upload progress is written at most every UPLOAD_PROGRESS_INTERVAL seconds (jobs/uploadhandler.py)
+UPLOAD_PROGRESS_INTERVAL = 0.25
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -178,6 +209,8 @@ FILE_UPLOAD_HANDLERS = ["jobs.uploadhandler.ProgressBarUploadHandler",
 
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
 DJANGO_TABLES2_TEMPLATE = 'django_tables2/bootstrap4.html'
+# the job overview is paginated and sorted by the database
+JOBS_PER_PAGE = 25
 
 LOGIN_REDIRECT_URL = 'index-home'
 LOGIN_URL = 'login'
@@ -215,12 +248,101 @@ CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 86520  # 86520
 CELERY_TASK_SOFT_TIME_LIMIT = 86400  # 86400
 
+# shortest job first: jobs predicted to run longer than FAST_QUEUE_MAX_RUNTIME (s) run on the heavy queue, the fast
+# queue is ordered by the predicted runtime (jobs/cost_model.py). 'jobs' only dispatches the pipelines
+FAST_QUEUE = 'jobs_fast'
+HEAVY_QUEUE = 'jobs_heavy'
+FAST_QUEUE_MAX_RUNTIME = 3600
+# the full validation of the uploaded models (validate_model) runs on its own queue before a job is routed
+VALIDATION_QUEUE = 'validation'
+CELERY_TASK_QUEUES = (Queue('celery'), Queue('jobs'), Queue(FAST_QUEUE, queue_arguments={'x-max-priority': 10}),
+                      Queue(HEAVY_QUEUE), Queue(VALIDATION_QUEUE))
+# workers only reserve the next task, so a short job queued later still overtakes the waiting ones
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
 MAX_UPLOAD_SIZE = 15728640  # 15MB
 
 FILE_UPLOAD_MAX_MEMORY_SIZE = 0
 
+# server-sent job events (jobs/events.py): path served by RobustQ.asgi, keepalive comment and closing of idle
+# streams (s), events buffered per open stream
+EVENT_STREAM_URL = '/events/'
+EVENT_STREAM_KEEPALIVE = 15
+EVENT_STREAM_IDLE_TIMEOUT = 300
+EVENT_STREAM_QUEUE_SIZE = 100
+
+# downloads of the files of a job (jobs/job_archive.py): the zip of a finished job is stored in the job directory and
+# served from there, by the web server if JOB_ARCHIVE_SENDFILE names its header ('X-Sendfile' for Apache
+# mod_xsendfile, 'X-Accel-Redirect' for nginx with MEDIA_ROOT as internal location JOB_ARCHIVE_SENDFILE_URL)
+JOB_ARCHIVE_SENDFILE = None
+JOB_ARCHIVE_SENDFILE_URL = '/protected_uploads/'
+JOB_ARCHIVE_COMPRESSLEVEL = 1
+
+# bulk export of the results (jobs/result_export.py) reads the jobs in chunks of EXPORT_CHUNK_SIZE. The Parquet export
+# needs pyarrow
+EXPORT_CHUNK_SIZE = 2000
+
+# resumable uploads of model archives (jobs/chunked_upload.py): archives up to CHUNKED_UPLOAD_MAX_SIZE are sent in
+# chunks of CHUNKED_UPLOAD_CHUNK_SIZE, a dropped connection resumes at the last stored chunk. The models in an
+# archive are still limited to MAX_UPLOAD_SIZE each. Unfinished uploads are deleted after CHUNKED_UPLOAD_EXPIRY_HOURS
+CHUNKED_UPLOAD_ROOT = os.path.join(MEDIA_ROOT, 'chunked_uploads')
+CHUNKED_UPLOAD_MAX_SIZE = 524288000  # 500MB
+CHUNKED_UPLOAD_CHUNK_SIZE = 4194304  # 4MB
+CHUNKED_UPLOAD_EXPIRY_HOURS = 24
+
 DAYS_UNTIL_JOB_DELETE = 30
 
+# Result cache - identical model + parameters get completed from the cache instead of running the pipeline again
+RESULT_CACHE_ENABLED = True
+RESULT_CACHE_ROOT = os.path.join(MEDIA_ROOT, 'result_cache')
+RESULT_CACHE_MAX_SIZE = 5368709120  # 5GB
+
+# Stage cache - intermediate files (compressed network, dual system, MCS) reused by jobs with identical inputs
+STAGE_CACHE_ENABLED = True
+STAGE_CACHE_ROOT = os.path.join(MEDIA_ROOT, 'stage_cache')
+STAGE_CACHE_MAX_SIZE = 10737418240  # 10GB
+
+# Parsed models - compact form of every uploaded model (jobs/parsed_model.py), loaded by sbml_processing instead of
+# parsing the file again. Models up to PARSE_AT_SUBMISSION_MAX_SIZE that were not parsed at validation (e.g. json)
+# are parsed when the job is dispatched, larger ones by sbml_processing
+PARSED_MODEL_ROOT = os.path.join(MEDIA_ROOT, 'parsed_models')
+PARSE_AT_SUBMISSION_MAX_SIZE = 2621440  # 2.5MB
+
+# output of the pipeline subprocesses (jobs/subprocess_log.py): the task log keeps the first/last lines, longer output
+# is stored gzipped next to it. Lines are written in batches
+SUBPROCESS_LOG_HEAD_LINES = 2000
+SUBPROCESS_LOG_TAIL_LINES = 2000
+SUBPROCESS_LOG_BATCH_LINES = 500
+SUBPROCESS_LOG_FLUSH_SECONDS = 2
+# the details page shows the last LOG_TAIL_LINES lines of a task log and fetches the rest in steps of at most
+# LOG_TAIL_MAX_BYTES (jobs/log_tail.py)
+LOG_TAIL_LINES = 200
+LOG_TAIL_MAX_BYTES = 262144
+
+# progress of the running stage parsed from its output (jobs/progress.py), stored at most every n seconds
+PROGRESS_UPDATE_INTERVAL = 5
+# the supervisors of the stage subprocesses (jobs/supervisor.py) receive cancellations on unix sockets in this directory
+SUPERVISOR_SOCKET_DIR = os.path.join(tempfile.gettempdir(), 'robustq_supervisor')
+
+# number of unique MCS mcs_to_binary keeps in memory before spilling them to disk for deduplication
+MCS_DEDUPE_CHUNK_SIZE = 1000000
+
+# default engine for the network compression: 'perl' (scripts/compress_network.pl) or 'python'
+# (jobs/network_compression.py)
+COMPRESSION_ENGINE = 'python'
+# kernel based compression (blocked and fully coupled reactions) after the linear compression, python engine only
+KERNEL_COMPRESSION = True
+
+# dual system builder: 'perl' (scripts/create_ccds_files.pl) or 'python' (jobs/dual_system.py), same output
+DUAL_SYSTEM_ENGINE = 'python'
+
+# maximum number of mutation rates in a sweep job
+MAX_SWEEP_RATES = 200
+
+# defigueiredo and PoFcalc get a share of the free cores of the host instead of a fixed thread count and are pinned
+# to them (jobs/cpu_allocator.py). MAX_THREADS_MCS/MAX_THREADS_POFCALC optionally cap the share
+CPU_ALLOCATION = True
+
 if not DEBUG: # configures SSL etc when in production mode
     SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
     SECURE_SSL_REDIRECT = True # could also set to False but then csrf validation fails
@@ -37,14 +37,20 @@ urlpatterns = [
     path('jobs/details/<int:pk>', job_views.JobDetailView.as_view(), name='details'),
     path('jobs/delete/<int:pk>', job_views.JobDeleteView.as_view(), name='job-delete'),
     path('jobs/cancel/<int:pk>', job_views.cancel_job, name='cancel'),
+    path('jobs/status/<int:pk>', job_views.job_status, name='job_status'),
     path('jobs/download_results/<str:type>', job_views.download_results, name='download_results'),
     path('jobs/download_job/<int:pk>', job_views.download_job, name='download_job'),
     path('jobs/result_table/<int:pk>/<str:type>', job_views.result_table, name='result_table'),
-    path('uploadstream/<str:user>', job_views.uploadstream, name="uploadstream"),
+    path('jobs/sweep_table/<int:pk>/<str:type>', job_views.sweep_table, name='sweep_table'),
     path('upload_progress/<str:uuid>', job_views.upload_progress, name="upload_progress"),
+    path('jobs/uploads/', job_views.chunked_upload_create, name='chunked_upload_create'),
+    path('jobs/uploads/<uuid:upload_id>', job_views.chunked_upload_chunk, name='chunked_upload'),
+    path('jobs/uploads/<uuid:upload_id>/complete', job_views.ChunkedUploadCompleteView.as_view(),
+         name='chunked_upload_complete'),
     path('cancel_jobs/', job_views.cancel_all_jobs, name="cancel_all_jobs"),
     path('queue/', job_views.get_queue, name="queue"),
-    path('jobs/logs/<int:task_id>', job_views.serve_logfile, name="serve_logfile")
+    path('jobs/logs/<int:task_id>', job_views.serve_logfile, name="serve_logfile"),
+    path('jobs/logs/<int:task_id>/tail', job_views.tail_logfile, name="tail_logfile")
 ]
 
 if settings.DEBUG:
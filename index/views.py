@@ -46,10 +46,9 @@ class IndexView(NewJobMixin):
     def get_context_data(self, **kwargs):
         context = super().get_context_data()
         if self.request.user.is_authenticated:
-            jobs = self.request.user.job_set.all()
-            running_jobs = jobs.filter(is_finished='False')
-            context['running_jobs'] = running_jobs
-            context['jobs'] = jobs
+            jobs = Job.objects.filter(user=self.request.user)
+            context['running_jobs_count'] = jobs.filter(is_finished=False).count()
+            context['jobs_count'] = jobs.count()
         return context
 
 
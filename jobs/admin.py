@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import Job, SubTask
+from .models import Job, SubTask, CachedResult
 
 # Register your models here.
 admin.site.register(Job)
 admin.site.register(SubTask)
+admin.site.register(CachedResult)
@@ -0,0 +1,105 @@
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django.core.cache import caches
+import threading
+import copy
+import time
+
+"""Tiered cache backend of the 'default' cache. Every process has a small in-process tier for the keys of
+LOCAL_PREFIXES (e.g. the upload progress a request writes several times per second), which is kept for at most
+LOCAL_TIMEOUT seconds, so other processes see a change after that long at the latest. Everything is written through to
+the SHARED cache, a low-latency cache all processes of the host use (a file based cache on shared memory, /dev/shm,
+or memcached on a unix socket). If the shared tier fails (e.g. /dev/shm is missing or full) the process switches to
+the FALLBACK cache, the database cache. The cache is local to the host, state that other hosts read (pipeline chains,
+process registry) goes to settings.PIPELINE_CACHE"""
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        options = params.get('OPTIONS', {})
+        super().__init__(params)
+        self.shared_alias = options.get('SHARED', 'shared')
+        self.fallback_alias = options.get('FALLBACK', 'db')
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 1)
+        self.local_prefixes = tuple(options.get('LOCAL_PREFIXES', ()))
+        self.local = {}  # (key, version) -> (value, expiry)
+        self.lock = threading.Lock()
+        self.shared_failed = False
+
+    @property
+    def tier(self):
+        return caches[self.fallback_alias if self.shared_failed else self.shared_alias]
+
+    def _call(self, method, *args, **kwargs):
+        if not self.shared_failed:
+            try:
+                return getattr(self.tier, method)(*args, **kwargs)
+            except OSError:
+                self.shared_failed = True
+        return getattr(self.tier, method)(*args, **kwargs)
+
+    def _is_local(self, key):
+        return bool(self.local_timeout and self.local_prefixes and key.startswith(self.local_prefixes))
+
+    def _remember(self, key, version, value, timeout):
+        if not self._is_local(key):
+            return
+        expiry = self.local_timeout
+        if timeout is not DEFAULT_TIMEOUT and timeout is not None:
+            expiry = min(expiry, timeout)
+        now = time.monotonic()
+        with self.lock:
+            if len(self.local) > 1000:
+                # expired entries of other keys
+                self.local = {k: v for k, v in self.local.items() if v[1] > now}
+            if expiry <= 0:
+                self.local.pop((key, version), None)
+            else:
+                self.local[(key, version)] = (value, now + expiry)
+
+    def _forget(self, key, version):
+        with self.lock:
+            self.local.pop((key, version), None)
+
+    def _recall(self, key, version):
+        with self.lock:
+            value, expiry = self.local.get((key, version), (None, 0))
+            if expiry and expiry <= time.monotonic():
+                del self.local[(key, version)]
+                expiry = 0
+        # a copy, like the values of the other tiers the caller may change it
+        return (copy.deepcopy(value), True) if expiry else (None, False)
+
+    def get(self, key, default=None, version=None):
+        if self._is_local(key):
+            value, found = self._recall(key, version)
+            if found:
+                return value
+        value = self._call('get', key, default, version=version)
+        if value is not default:
+            self._remember(key, version, value, DEFAULT_TIMEOUT)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._call('set', key, value, timeout=timeout, version=version)
+        self._remember(key, version, value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self._call('add', key, value, timeout=timeout, version=version)
+        if added:
+            self._remember(key, version, value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._call('touch', key, timeout=timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._forget(key, version)
+        return self._call('delete', key, version=version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, version=version) is not None
+
+    def clear(self):
+        with self.lock:
+            self.local = {}
+        self._call('clear')
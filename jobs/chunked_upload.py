@@ -0,0 +1,129 @@
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+from datetime import timedelta
+from .models import ChunkedUpload
+import hashlib
+import fcntl
+import os
+
+"""Resumable uploads of model archives. The browser creates an upload (name and size of the zip) and sends the
+archive in chunks of CHUNKED_UPLOAD_CHUNK_SIZE, each with its offset and SHA-256. A chunk is appended to
+CHUNKED_UPLOAD_ROOT/<upload id>.part only if it starts at the stored offset and matches its checksum, so after a
+dropped connection the browser asks for the offset and continues from there. The complete archive is handed to
+NewJobMixin.zip_file_handler like a zip posted with the form"""
+
+READ_SIZE = 1 << 16
+
+
+class ChunkError(Exception):
+    """a request the upload can't take, status is the HTTP status of the response"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def root():
+    return getattr(settings, 'CHUNKED_UPLOAD_ROOT', os.path.join(settings.MEDIA_ROOT, 'chunked_uploads'))
+
+
+def max_size():
+    return getattr(settings, 'CHUNKED_UPLOAD_MAX_SIZE', 524288000)
+
+
+def chunk_size():
+    return getattr(settings, 'CHUNKED_UPLOAD_CHUNK_SIZE', 4194304)
+
+
+def expiry_hours():
+    return getattr(settings, 'CHUNKED_UPLOAD_EXPIRY_HOURS', 24)
+
+
+def part_path(upload):
+    return os.path.join(root(), f'{upload.id}.part')
+
+
+def state(upload):
+    return {'id': str(upload.id), 'filename': upload.filename, 'size': upload.size, 'offset': upload.offset,
+            'chunk_size': chunk_size()}
+
+
+def create(user, filename, size):
+    """starts the upload of a zip archive of size bytes"""
+    filename = os.path.basename(filename or '')
+    if os.path.splitext(filename)[1].lower() != '.zip':
+        raise ChunkError('Only zip archives can be uploaded in chunks')
+    if size <= 0 or size > max_size():
+        raise ChunkError(f'Archives have to be smaller than {filesizeformat(max_size())}', status=413)
+    upload = ChunkedUpload.objects.create(user=user, filename=filename, size=size)
+    os.makedirs(root(), exist_ok=True)
+    open(part_path(upload), 'wb').close()
+    return upload
+
+
+def append(upload, offset, stream, length, checksum):
+    """
+    appends a chunk to the archive
+    Args:
+        upload: ChunkedUpload
+        offset: position of the chunk in the archive, has to be the current offset of the upload
+        stream: file-like object the chunk is read from (the request)
+        length: size of the chunk
+        checksum: SHA-256 of the chunk (hex)
+
+    Returns: new offset of the upload. Raises ChunkError if the chunk doesn't fit, is incomplete or corrupted, the
+    upload keeps its offset then
+    """
+    if length <= 0 or length > chunk_size() or offset + length > upload.size:
+        raise ChunkError(f'Chunks have to be between 1 byte and {filesizeformat(chunk_size())} and end in the archive')
+    try:
+        f = open(part_path(upload), 'r+b')
+    except FileNotFoundError:
+        raise ChunkError('Upload expired', status=404)
+    with f:
+        # a retried request may still be writing the same chunk
+        fcntl.flock(f, fcntl.LOCK_EX)
+        upload.refresh_from_db(fields=['offset'])
+        if offset != upload.offset:
+            raise ChunkError(f'Expected the chunk at offset {upload.offset}', status=409)
+        f.seek(offset)
+        f.truncate()  # rest of an interrupted chunk
+        digest, remaining = hashlib.sha256(), length
+        while remaining:
+            data = stream.read(min(READ_SIZE, remaining))
+            if not data:
+                break
+            digest.update(data)
+            f.write(data)
+            remaining -= len(data)
+        if remaining or digest.hexdigest() != (checksum or '').lower():
+            f.truncate(offset)
+            raise ChunkError('Chunk incomplete or checksum mismatch')
+        f.flush()
+        os.fsync(f.fileno())
+        upload.offset = offset + length
+        ChunkedUpload.objects.filter(id=upload.id).update(offset=upload.offset, updated=timezone.now())
+    return upload.offset
+
+
+def archive(upload):
+    """the complete archive as an uploaded file"""
+    if upload.offset != upload.size:
+        raise ChunkError(f'Upload incomplete, {upload.offset} of {upload.size} bytes received', status=409)
+    return UploadedFile(open(part_path(upload), 'rb'), upload.filename, 'application/zip', upload.size)
+
+
+def discard(upload):
+    try:
+        os.remove(part_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def expire():
+    """deletes the uploads that were not continued for CHUNKED_UPLOAD_EXPIRY_HOURS"""
+    expired = timezone.now() - timedelta(hours=expiry_hours())
+    for upload in ChunkedUpload.objects.filter(updated__lt=expired):
+        discard(upload)
@@ -0,0 +1,17 @@
+from django.conf import settings
+from .models import Job
+
+"""Template context of every page"""
+
+
+def running_jobs(request):
+    """number of unfinished jobs of the user for the badge in the navbar. Only counted if a template uses it (a single
+    COUNT on the (user, is_finished, ...) index)"""
+    if not request.user.is_authenticated:
+        return {}
+    return {'running_jobs_count': lambda: Job.objects.filter(user=request.user, is_finished=False).count()}
+
+
+def event_stream(request):
+    """url of the job event stream (jobs/events.py)"""
+    return {'event_stream_url': getattr(settings, 'EVENT_STREAM_URL', '/events/')}
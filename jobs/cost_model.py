@@ -0,0 +1,141 @@
+from django.conf import settings
+from .models import SubTask
+from .process_registry import pipeline_cache
+import numpy as np
+import json
+import math
+import os
+import re
+
+"""Runtime cost model of the pipeline stages. Jobs are routed to the fast or the heavy queue by their predicted
+runtime and the fast queue is ordered shortest job first (message priorities).
+
+The runtime of a stage is modelled as log(1 + seconds) = w . [1, log(1 + reactions), log(1 + metabolites),
+cardinality, compression], with the MCS cardinality for defigueiredo/mcs_to_binary and the PoF cardinality for
+PoFcalc. Without history the weights in PRIOR are used. The cleanup task refits them hourly on the runtimes recorded
+in SubTask.runtime (ridge regression towards the prior), so the model improves as jobs finish. The predictions are
+stored next to the actual runtimes (Job.predicted_runtime, SubTask.predicted_runtime)"""
+
+# stage: (prior weights, Job field of the cardinality or None)
+PRIOR = {
+    'SBML_processing': ([-2.4, 0.84, 0.0, 0.0, 0.0], None),
+    'compress_network': ([-4.8, 1.2, 0.0, 0.0, 0.0], None),
+    'create_dual_system': ([-2.2, 0.5, 0.0, 0.0, 0.0], None),
+    'defigueiredo': ([-14.2, 2.2, 0.0, 2.0, -0.7], 'cardinality_mcs'),
+    'mcs_to_binary': ([-9.15, 1.5, 0.0, 1.0, -0.3], 'cardinality_mcs'),
+    'PoFcalc': ([-7.6, 1.5, 0.0, 0.3, -0.3], 'cardinality_pof'),
+}
+
+# weight of the prior weights of the slopes (ridge penalty)
+PRIOR_SAMPLES = 5
+# most recent runtimes per stage the weights are fitted on
+MAX_SAMPLES = 2000
+# rough size of a reaction in a model file, used if the file can't be counted
+BYTES_PER_REACTION = 7000
+MAX_PRIORITY = 9
+
+
+def _cache_key(stage):
+    return f'cost_model_{stage}'
+
+
+def count_from_file(fpath):
+    """number of reactions and metabolites of a model file without parsing it as a model: the tags of an SBML file
+    are counted, json models are loaded. Other formats are estimated from the file size"""
+    extension = os.path.splitext(fpath)[1].lower()
+    try:
+        if extension in ('.xml', '.sbml'):
+            reactions, metabolites, tail = 0, 0, b''
+            reaction_tag, species_tag = re.compile(rb'<reaction[\s>]'), re.compile(rb'<species[\s>]')
+            with open(fpath, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    # a tag split between two chunks is counted in the next one
+                    block = tail + chunk
+                    cut = max(0, len(block) - 10)
+                    reactions += len(reaction_tag.findall(block, 0, cut))
+                    metabolites += len(species_tag.findall(block, 0, cut))
+                    tail = block[cut:]
+            reactions += len(reaction_tag.findall(tail))
+            metabolites += len(species_tag.findall(tail))
+            return reactions, metabolites
+        if extension == '.json':
+            with open(fpath, 'r') as f:
+                model = json.load(f)
+            return len(model.get('reactions', [])), len(model.get('metabolites', []))
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        reactions = max(1, os.path.getsize(fpath) // BYTES_PER_REACTION)
+    except OSError:
+        reactions = 1000
+    return reactions, reactions * 3 // 4
+
+
+def model_counts(job):
+    """reactions and metabolites of the job's model, as recorded by sbml_processing or counted from the file"""
+    if job.reactions is not None and job.metabolites is not None:
+        return job.reactions, job.metabolites
+    return count_from_file(job.sbml_file.path)
+
+
+def features(reactions, metabolites, cardinality, compression):
+    return np.array([1.0, math.log1p(reactions), math.log1p(metabolites), float(cardinality or 0),
+                     float(bool(compression))])
+
+
+def weights(stage):
+    fitted = pipeline_cache().get(_cache_key(stage))
+    return np.array(fitted if fitted is not None else PRIOR[stage][0])
+
+
+def predict_stage(job, stage, counts=None):
+    """predicted runtime of a stage of the job in seconds"""
+    reactions, metabolites = counts or model_counts(job)
+    field = PRIOR[stage][1]
+    x = features(reactions, metabolites, getattr(job, field) if field else 0, job.compression)
+    return max(0.0, math.expm1(min(float(weights(stage) @ x), 50.0)))
+
+
+def predict(job):
+    """predicted runtime of all stages of the job in seconds {stage: seconds}"""
+    counts = model_counts(job)
+    return {stage: predict_stage(job, stage, counts) for stage in PRIOR}
+
+
+def fit_weights(x, y, prior, prior_samples=PRIOR_SAMPLES):
+    """ridge regression of y (log runtimes) on the feature rows x, the slopes are regularized towards the prior
+    weights, the intercept is free"""
+    x, y, prior = np.asarray(x, dtype=float), np.asarray(y, dtype=float), np.asarray(prior, dtype=float)
+    if not len(x):
+        return prior
+    regularization = prior_samples * np.diag([0.0] + [1.0] * (len(prior) - 1))
+    return np.linalg.solve(x.T @ x + regularization, x.T @ y + regularization @ prior)
+
+
+def refit():
+    """fits the weights of every stage on the recorded runtimes and stores them in the cache. Stages whose outputs
+    came from the stage cache didn't run and are left out"""
+    for stage, (prior, field) in PRIOR.items():
+        subtasks = SubTask.objects.filter(name=stage, runtime__isnull=False, cached=False, job__reactions__isnull=False,
+                                          job__metabolites__isnull=False)\
+            .select_related('job').order_by('-id')[:MAX_SAMPLES]
+        x, y = [], []
+        for subtask in subtasks:
+            job = subtask.job
+            x.append(features(job.reactions, job.metabolites, getattr(job, field) if field else 0, job.compression))
+            y.append(math.log1p(subtask.runtime))
+        if x:
+            pipeline_cache().set(_cache_key(stage), fit_weights(x, y, prior).tolist(), timeout=None)
+
+
+def priority(seconds):
+    """message priority in the fast queue, the shorter the job the higher"""
+    return max(0, MAX_PRIORITY - int(math.log2(1 + seconds / 60)))
+
+
+def route(job):
+    """queue and priority for the stages of a job, and its predicted runtime in seconds"""
+    runtime = sum(predict(job).values())
+    if runtime <= getattr(settings, 'FAST_QUEUE_MAX_RUNTIME', 3600):
+        return getattr(settings, 'FAST_QUEUE', 'jobs_fast'), priority(runtime), runtime
+    return getattr(settings, 'HEAVY_QUEUE', 'jobs_heavy'), 0, runtime
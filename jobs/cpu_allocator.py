@@ -0,0 +1,110 @@
+from django.conf import settings
+from contextlib import contextmanager
+from .process_registry import start_time
+import tempfile
+import fcntl
+import json
+import os
+
+"""Worker-local CPU allocator for the multi-threaded stages (defigueiredo, PoFcalc). Instead of a fixed thread count
+every stage gets a set of cores: an equal share of the free cores of the host with the jobs still waiting for cores,
+its subprocess is pinned to them and started with as many threads. The allocations of a host live in a json file
+(CPU_ALLOCATION_FILE) guarded by flock, so all worker processes of the host share them. Each allocation records the
+worker process holding it, allocations of processes that died without releasing their cores are reclaimed. The queues
+the workers of the host consume are registered the same way (register_queues), only jobs queued on them wait for the
+cores of the host"""
+
+
+def state_file():
+    return getattr(settings, 'CPU_ALLOCATION_FILE', os.path.join(tempfile.gettempdir(), 'robustq_cpu_allocation.json'))
+
+
+def enabled():
+    return getattr(settings, 'CPU_ALLOCATION', True)
+
+
+def host_cores():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def queues_file():
+    return f'{state_file()}.queues'
+
+
+@contextmanager
+def _locked_state(path=None):
+    """the allocations of this host {task id: {'cores', 'job_id', 'pid', 'started'}} (or the queues of its workers
+    {node: {'queues', 'pid', 'started'}}), written back on exit"""
+    fd = os.open(path or state_file(), os.O_RDWR | os.O_CREAT, 0o644)
+    with os.fdopen(fd, 'r+') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        content = f.read()
+        try:
+            state = json.loads(content) if content else {}
+        except ValueError:
+            state = {}
+        state = {task_id: allocation for task_id, allocation in state.items()
+                 if start_time(allocation['pid']) == allocation['started']}
+        yield state
+        f.seek(0)
+        f.truncate()
+        json.dump(state, f)
+
+
+def budget(n_free, waiting, max_threads=None):
+    """number of cores for a new stage: an equal share of the free cores with the waiting jobs, at least one"""
+    share = n_free // (1 + waiting)
+    if max_threads:
+        share = min(share, max_threads)
+    return max(1, share)
+
+
+def register_queues(node, queues):
+    """records the queues a worker of this host consumes, called in the worker's main process"""
+    with _locked_state(queues_file()) as state:
+        state[node] = {'queues': sorted(queues), 'pid': os.getpid(), 'started': start_time(os.getpid())}
+
+
+def host_queues():
+    """the queues the running workers of this host consume"""
+    with _locked_state(queues_file()) as state:
+        return {queue for worker in state.values() for queue in worker['queues']}
+
+
+def holders():
+    """ids of the jobs holding cores on this host"""
+    with _locked_state() as state:
+        return {allocation['job_id'] for allocation in state.values()}
+
+
+def allocate(task_id, job_id, max_threads=None, waiting=0):
+    """reserves cores for a task, returns the list of cores. If all cores are taken, the least loaded core is shared"""
+    with _locked_state() as state:
+        cores = host_cores()
+        load = {core: 0 for core in cores}
+        for allocation in state.values():
+            for core in allocation['cores']:
+                if core in load:
+                    load[core] += 1
+        free = [core for core in cores if not load[core]]
+        if free:
+            granted = free[:budget(len(free), waiting, max_threads)]
+        else:
+            granted = [min(cores, key=load.get)]
+        state[task_id] = {'cores': granted, 'job_id': job_id, 'pid': os.getpid(), 'started': start_time(os.getpid())}
+    return granted
+
+
+def release(task_id):
+    """returns the cores of a task to the pool"""
+    with _locked_state() as state:
+        state.pop(task_id, None)
+
+
+def pinning(cores):
+    """preexec_fn for subprocess.Popen pinning the process (and all its threads) to cores"""
+    if not hasattr(os, 'sched_setaffinity'):
+        return None
+    return lambda: os.sched_setaffinity(0, cores)
@@ -2,10 +2,9 @@ from functools import wraps
 from celery.result import AsyncResult
 from celery.contrib.abortable import AbortableAsyncResult
 from celery.utils.log import get_task_logger
-from django.core.cache import cache
-import os
 import signal
 from celery.exceptions import TimeLimitExceeded
+from . import process_registry
 
 """custom revoke chain Exception"""
 
@@ -36,16 +35,9 @@ def revoke_chain_authority(a_shared_task):
                 self.request.chain = None
 
             res = AbortableAsyncResult(self.request.id)
-            job_id = cache.get('current_job')
-            job_task = kwargs.get('job_id')
-
-            if job_id == job_task:
-                try:
-                    pid = cache.get(f'pipeline_{job_id}').get('pid')
-                    if pid:
-                        os.kill(pid, signal.SIGTERM)
-                except:
-                    pass
+            job_id = kwargs.get('job_id')
+            if job_id is not None:
+                process_registry.kill(job_id, signal.SIGTERM, task_id=self.request.id, group=True)
             try:
                 res.abort()
             except:
@@ -59,11 +51,9 @@ def revoke_chain_authority(a_shared_task):
             res.abort()
             logger = get_task_logger(self.request.id)
             logger.error('Time limit exceeded for task!')
-            try:
-                job_id = kwargs.get('job_id')
-                os.kill(cache.get(f'pipeline_{job_id}').get('pid'), signal.SIGKILL)
-            except:
-                pass
+            job_id = kwargs.get('job_id')
+            if job_id is not None:
+                process_registry.kill(job_id, signal.SIGKILL, task_id=self.request.id, group=True)
             raise e
 
     return inner
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""In-process replacement for scripts/create_ccds_files.pl. Builds the dual system (EFM/MCS) of a (compressed) network
+for defigueiredo and writes the same files byte for byte: <basis>_dual.{s,m,r,rv,v,x,c}file and
+<basis>_efmtool.{s,m,r,rv}file.
+
+Row i of the dual stoichiometric matrix belongs to reaction i: [S^T | I | -I_irrev | target]. Instead of building the
+transpose and the appended identities as dense matrices, every row is written directly from the column of S (the
+coefficients as they were read, the perl script doesn't touch them), the position of the reaction and its
+irreversible column. Only the first line of the reaction/metabolite/reversibility/target files is read, quotes etc.
+are stripped like the perl script does."""
+
+
+def _first_line(fname, strip):
+    with open(fname, 'r') as f:
+        line = f.readline()
+    for char in strip:
+        line = line.replace(char, '')
+    return line.split()
+
+
+def read_network(rfile, mfile, sfile, rvfile, tfile):
+    """reads the input files of one network (the fields of a line of the .inp file). Returns reactions, metabolites,
+    rows of the stoichiometric matrix (tokens as strings), reversibilities and the target reactions"""
+    reactions = _first_line(rfile, '">#')
+    metabolites = _first_line(mfile, '"#')
+    reversibility = _first_line(rvfile, '')
+    targets = _first_line(tfile, '">#')
+    with open(sfile, 'r') as f:
+        stoichiometry = [line.split() for line in f]
+
+    if len(reversibility) != len(reactions):
+        raise ValueError(f'number of reversibilities ({len(reversibility)}) and number of reactions '
+                         f'({len(reactions)}) do not match')
+    if len(metabolites) != len(stoichiometry):
+        raise ValueError(f'number of metabolites ({len(metabolites)}) and number of lines in stoichiometric matrix '
+                         f'({len(stoichiometry)}) do not match')
+    if any(len(row) != len(stoichiometry[0]) for row in stoichiometry):
+        raise ValueError(f'rows of the stoichiometric matrix in {sfile} differ in length')
+    return reactions, metabolites, stoichiometry, reversibility, targets
+
+
+def target_rows(reactions, reversibility, targets):
+    """rows of the dual system with -1 in the target column. Like the perl script, the rows of the last target
+    reaction are used"""
+    rows = set()
+    for target in targets:
+        if target not in reactions:
+            raise ValueError(f"'{target}' not found in list of reactions {' '.join(reactions)}")
+        rows = {i for i, reaction in enumerate(reactions) if reaction == target}
+        if any(float(reversibility[i]) != 0 for i in rows):
+            raise ValueError(f"biomass reaction '{target}' is not allowed to be reversible!")
+    return rows
+
+
+def _entry(token):
+    # print_matrix_to_file: a space, another one for non-negative values, the value
+    return ('  ' if float(token) >= 0 else ' ') + token
+
+
+def write_dual_matrix(fname, reactions, stoichiometry, reversibility, targets):
+    n_reacs = len(reactions)
+    irreversible = [i for i in range(n_reacs) if float(reversibility[i]) == 0]
+    irreversible_col = {r: i for i, r in enumerate(irreversible)}
+    target = target_rows(reactions, reversibility, targets)
+    entries = {}
+    zero, one, minus_one = _entry('0'), _entry('1'), _entry('-1')
+
+    with open(fname, 'w') as f:
+        # columns of S are the rows of S^T, the tokens are repeated a lot, so their formatting is cached
+        for i, column in enumerate(zip(*stoichiometry) if stoichiometry else [()] * n_reacs):
+            row = []
+            for token in column:
+                entry = entries.get(token)
+                if entry is None:
+                    entry = entries[token] = _entry(token)
+                row.append(entry)
+            row.append(zero * i + one + zero * (n_reacs - i - 1))
+            if i in irreversible_col:
+                col = irreversible_col[i]
+                row.append(zero * col + minus_one + zero * (len(irreversible) - col - 1))
+            else:
+                row.append(zero * len(irreversible))
+            row.append(minus_one if i in target else zero)
+            f.write(''.join(row) + '\n')
+
+
+def write_efmtool_files(basis, reactions, metabolites, stoichiometry, reversibility):
+    with open(f'{basis}_efmtool.rvfile', 'w') as f:
+        f.write(' '.join(reversibility))
+    with open(f'{basis}_efmtool.rfile', 'w') as f:
+        f.write(' '.join(f'"{r}"' for r in reactions))
+    with open(f'{basis}_efmtool.mfile', 'w') as f:
+        f.write(' '.join(f'"{m}"' for m in metabolites))
+    with open(f'{basis}_efmtool.sfile', 'w') as f:
+        f.writelines(' '.join(row) + '\n' for row in stoichiometry)
+
+
+def write_coupled_reactions(fname, reactions):
+    """reactions with the same name are coupled (only happens for combined networks, one line per name)"""
+    coupled = {}
+    for reaction in reactions:
+        coupled.setdefault(reaction, []).append(reaction)
+    with open(fname, 'w') as f:
+        for name in sorted(coupled):
+            if len(coupled[name]) > 1:
+                f.write(' '.join(f'"{r}"' for r in coupled[name]) + '\n')
+
+
+def create(rfile, mfile, sfile, rvfile, tfile, basis):
+    """counterpart of 'create_ccds_files.pl -c inp -o basis' for an .inp file with the single line
+    'rfile,mfile,sfile,rvfile,tfile'. Writes the dual system files and returns the number of rows and columns of the
+    dual stoichiometric matrix"""
+    reactions, metabolites, stoichiometry, reversibility, targets = read_network(rfile, mfile, sfile, rvfile, tfile)
+    irreversible = [r for r, rev in zip(reactions, reversibility) if float(rev) == 0]
+
+    write_efmtool_files(basis, reactions, metabolites, stoichiometry, reversibility)
+    write_coupled_reactions(f'{basis}_dual.cfile', reactions)
+    write_dual_matrix(f'{basis}_dual.sfile', reactions, stoichiometry, reversibility, targets)
+
+    files = {'mfile': [f'"{r}"' for r in reactions],
+             'rvfile': ['1'] * (len(metabolites) + len(reactions)) + ['0'] * (len(irreversible) + 1),
+             'rfile': [f'"{m}"' for m in metabolites] + [f'"v_{r}"' for r in reactions] +
+                      [f'"z_{r}"' for r in irreversible] + ['"target"'],
+             'vfile': [f'"{m}"' for m in metabolites] + [f'"v_{r}"' for r in reactions],
+             'xfile': [str(len(metabolites)), str(len(reactions)), str(len(irreversible)), '1']}
+    for ext, values in files.items():
+        with open(f'{basis}_dual.{ext}', 'w') as f:
+            f.write(' '.join(values))
+    return len(reactions), len(metabolites) + len(reactions) + len(irreversible) + 1
+
@@ -0,0 +1,198 @@
+from django.conf import settings
+from kombu import Exchange, Queue
+from asgiref.sync import sync_to_async
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+import threading
+import asyncio
+import logging
+import socket
+import time
+import json
+
+"""Push of job status events to the browser (server-sent events). The signal handlers and tasks publish the
+transitions of a job (status), its stages (started/finished) and the progress of the running stage on a fanout
+exchange of the broker (publish_job, publish_stage, publish_progress). Every ASGI process consumes the exchange with a
+single thread and hands the events of a user to the streams of that user (EventHub), the stream itself
+(EVENT_STREAM_URL, see RobustQ/asgi.py) is a coroutine that only waits on its queue, so open tabs cost no thread.
+Streams send a comment every EVENT_STREAM_KEEPALIVE seconds and are closed after EVENT_STREAM_IDLE_TIMEOUT seconds
+without events (the browser reconnects while the page is visible). Without the ASGI server the pages poll job_status"""
+
+EXCHANGE = Exchange('robustq.events', type='fanout', durable=False, auto_delete=True)
+
+logger = logging.getLogger(__name__)
+
+
+def stream_url():
+    return getattr(settings, 'EVENT_STREAM_URL', '/events/')
+
+
+def keepalive():
+    return getattr(settings, 'EVENT_STREAM_KEEPALIVE', 15)
+
+
+def idle_timeout():
+    return getattr(settings, 'EVENT_STREAM_IDLE_TIMEOUT', 300)
+
+
+def queue_size():
+    return getattr(settings, 'EVENT_STREAM_QUEUE_SIZE', 100)
+
+
+def publish(event):
+    """publishes an event (dict with at least 'user') to all ASGI processes. Best effort, the job itself must not fail
+    because the broker is not reachable"""
+    from RobustQ.celery import app
+    try:
+        with app.producer_or_acquire() as producer:
+            producer.publish(event, exchange=EXCHANGE, routing_key='', declare=[EXCHANGE], serializer='json',
+                             retry=False)
+    except Exception as e:
+        logger.warning(f'Could not publish event {event}: {repr(e)}')
+
+
+def publish_job(job_id):
+    """the current status of a job, read back from the database after it was updated"""
+    from .models import Job
+    job = Job.objects.filter(id=job_id).values('user_id', 'status', 'is_finished').first()
+    if job is not None:
+        publish({'type': 'job', 'job': job_id, 'user': job['user_id'], 'status': job['status'],
+                 'is_finished': job['is_finished']})
+
+
+def publish_stage(job_id, user_id, stage, state):
+    """a stage of a job started, finished or failed"""
+    publish({'type': 'stage', 'job': job_id, 'user': user_id, 'stage': stage, 'state': state})
+
+
+def publish_progress(job_id, user_id, record):
+    """the progress record of the running stage (progress.ProgressTracker)"""
+    publish({'type': 'progress', 'job': job_id, 'user': user_id, 'stage': record['stage'], 'progress': record})
+
+
+def encode(event):
+    return f'event: {event["type"]}\ndata: {json.dumps(event)}\n\n'.encode()
+
+
+class EventHub:
+    """events of the broker to the streams of an ASGI process, one queue per open stream"""
+    def __init__(self):
+        self.subscribers = {}  # user id -> set of asyncio.Queue
+        self.lock = threading.Lock()
+        self.loop = None
+        self.thread = None
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(maxsize=queue_size())
+        with self.lock:
+            self.loop = asyncio.get_running_loop()
+            self.subscribers.setdefault(user_id, set()).add(queue)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.consume, name='event-hub', daemon=True)
+                self.thread.start()
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self.lock:
+            queues = self.subscribers.get(user_id, set())
+            queues.discard(queue)
+            if not queues:
+                self.subscribers.pop(user_id, None)
+
+    def dispatch(self, event):
+        """called by the consumer thread"""
+        with self.lock:
+            queues = list(self.subscribers.get(event.get('user'), ()))
+        for queue in queues:
+            self.loop.call_soon_threadsafe(self.put, queue, event)
+
+    @staticmethod
+    def put(queue, event):
+        if queue.full():
+            # a slow client loses the oldest events, the next status/progress event supersedes them anyway
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    def on_message(self, body, message):
+        self.dispatch(body)
+
+    def consume(self):
+        """consumes the exchange on a queue of its own, reconnects if the broker goes away"""
+        from RobustQ.celery import app
+        while True:
+            try:
+                with app.connection_for_read() as connection:
+                    queue = Queue('', exchange=EXCHANGE, exclusive=True, auto_delete=True, durable=False)
+                    with connection.Consumer(queue, callbacks=[self.on_message], accept=['json'], no_ack=True):
+                        while True:
+                            try:
+                                connection.drain_events(timeout=1)
+                            except socket.timeout:
+                                pass
+            except Exception as e:
+                logger.warning(f'Event consumer lost the broker: {repr(e)}')
+                time.sleep(5)
+
+
+HUB = EventHub()
+
+
+def session_user(scope):
+    """id of the logged in user of an ASGI request (session cookie), None if anonymous"""
+    from django.contrib.auth import get_user
+    cookie = dict(scope.get('headers', [])).get(b'cookie', b'').decode('latin-1')
+    morsel = SimpleCookie(cookie).get(settings.SESSION_COOKIE_NAME)
+    if morsel is None:
+        return None
+    session = import_module(settings.SESSION_ENGINE).SessionStore(morsel.value)
+    user = get_user(SimpleNamespace(session=session))
+    return user.pk if user.is_authenticated else None
+
+
+async def _disconnected(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def stream(scope, receive, send):
+    """ASGI application of the event stream of the logged in user, ?job=<id> only streams the events of that job"""
+    user_id = await sync_to_async(session_user)(scope)
+    if user_id is None:
+        await send({'type': 'http.response.start', 'status': 403, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+    job = parse_qs(scope.get('query_string', b'').decode()).get('job', [None])[0]
+    job = int(job) if job and job.isdigit() else None
+
+    await send({'type': 'http.response.start', 'status': 200,
+                'headers': [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'),
+                            (b'x-accel-buffering', b'no')]})
+    queue = HUB.subscribe(user_id)
+    disconnected = asyncio.ensure_future(_disconnected(receive))
+    loop = asyncio.get_running_loop()
+    last_event = loop.time()
+    try:
+        await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+        while True:
+            get = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({get, disconnected}, timeout=keepalive(),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                get.cancel()
+                return
+            if get in done:
+                event = get.result()
+                if job is None or event.get('job') == job:
+                    await send({'type': 'http.response.body', 'body': encode(event), 'more_body': True})
+                    last_event = loop.time()
+                continue
+            get.cancel()
+            if loop.time() - last_event >= idle_timeout():
+                await send({'type': 'http.response.body', 'body': b'event: idle\ndata: {}\n\n'})
+                return
+            await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+    finally:
+        disconnected.cancel()
+        HUB.unsubscribe(user_id, queue)
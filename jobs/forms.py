@@ -11,11 +11,13 @@ class JobSubmissionForm(forms.ModelForm):
     """Job submission form class. Details on how to render the form based on the Job model"""
     class Meta:
         model = Job
-        fields = ['sbml_file', 'compression', 'cardinality_mcs', 'cardinality_pof', 'make_consistent',
-                  'skip_validation', 'mutation_rate']
+        fields = ['sbml_file', 'compression', 'compression_engine', 'cardinality_mcs', 'cardinality_pof', 'make_consistent',
+                  'skip_validation', 'mutation_rate', 'mutation_rate_sweep']
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, prevalidated=False, **kwargs):
         super(JobSubmissionForm, self).__init__(*args, **kwargs)
+        # the model file was validated already (or validation is skipped), its validators are not run again
+        self.prevalidated = prevalidated
         self.fields['sbml_file'].widget.attrs.update({'class': 'custom-file-input',
                                                       'aria-describedby': 'id_sbml_file_Addon01',
                                                       'data-toggle': 'popover',
@@ -37,6 +39,16 @@ class JobSubmissionForm(forms.ModelForm):
                                                                 'min': '0.000000001',
                                                                 'max': '1000',
                                                                 'value': '0.1'})
+        self.fields['compression_engine'].widget.attrs.update({'class': 'custom-select custom-select-sm',
+                                                               'style': 'width: 10rem;'})
+        self.fields['mutation_rate_sweep'].widget.attrs.update({'style': 'width: 10rem;',
+                                                                'placeholder': 'e.g. 0.001:1:20'})
+
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        if self.prevalidated:
+            exclude.append('sbml_file')
+        return exclude
 
 
 class JobTable(tables.Table):
@@ -101,6 +113,10 @@ class JobTable(tables.Table):
             return format_html('<span class="badge badge-warning" style="border-radius: 8px;">Cancelled</div>')
         elif value == 'Started':
             return format_html('<span class="badge badge-primary" style="border-radius: 8px;">Started</div>')
+        elif value == 'Validating':
+            return format_html('<span class="badge badge-secondary" style="border-radius: 8px;">Validating</div>')
+        elif value == 'Invalid':
+            return format_html('<span class="badge badge-danger" style="border-radius: 8px;">Invalid</div>')
         else:
             return value
     id = tables.LinkColumn('details', args=[tables.utils.A('pk')], text=lambda record: record.pk)
@@ -113,8 +129,8 @@ class JobTable(tables.Table):
                   'cardinality_pof', 'mutation_rate', 'make_consistent', 'result', 'duration', 'details']
 
         attrs = {
+            # sorted by the database (sort links of the headers), a page only holds a part of the jobs
             'class': 'table table-sm table-striped table-hover table-sortable',
-            'data-toggle': 'table',
             "th": {
                 "_ordering": {
                     "orderable": "sortable",  # Instead of `orderable`
@@ -126,3 +142,5 @@ class JobTable(tables.Table):
             "td": {"class": "text text-center"}
         }
         order_by = "-id"
+        # the status of the rows is updated by the job events (overview.html)
+        row_attrs = {'data-job': lambda record: record.pk}
@@ -0,0 +1,122 @@
+from django.conf import settings
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED
+import threading
+import io
+import os
+
+"""Zip archives of the files of a job for download. The archive is streamed while it is written (the zip goes to a
+non-seekable sink, every member gets a data descriptor), so neither the archive nor a file of it is held in memory.
+SUBSETS select the files: 'results' are the model, the result tables and the logs, 'all' adds the intermediate files
+of the stages (.mcs, _dual, compressed network, ...). The archive of a finished job is stored in the job directory
+while it is streamed (.archive_<subset>.zip) and later downloads serve that file, optionally through the web server
+(JOB_ARCHIVE_SENDFILE, e.g. 'X-Sendfile' for Apache mod_xsendfile or 'X-Accel-Redirect' for nginx)"""
+
+SUBSETS = ['results', 'all']
+READ_SIZE = 1 << 20
+
+
+def compresslevel():
+    return getattr(settings, 'JOB_ARCHIVE_COMPRESSLEVEL', 1)
+
+
+def job_dir(job):
+    return os.path.dirname(job.sbml_file.path)
+
+
+def cached_path(job, subset):
+    return os.path.join(job_dir(job), f'.archive_{subset}.zip')
+
+
+def members(job, subset='all'):
+    """(path, name in the archive) of the files of a job"""
+    path = job_dir(job)
+    results = {os.path.abspath(p) for p in (job.sbml_file.path, job.result_table, job.sweep_table) if p}
+    files = []
+    for root, dirs, names in os.walk(path):
+        dirs.sort()
+        for name in sorted(names):
+            file = os.path.join(root, name)
+            arcname = os.path.relpath(file, path)
+            if root == path and name.startswith('.archive_'):
+                continue
+            if subset == 'results' and os.path.abspath(file) not in results and \
+                    arcname.split(os.sep)[0] != 'logs':
+                continue
+            files.append((file, arcname))
+    return files
+
+
+class _Sink(io.RawIOBase):
+    """non-seekable output of the zip, collects the written bytes until they are sent (and copies them to a file)"""
+    def __init__(self, copy=None):
+        self.chunks, self.copy = [], copy
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        data = bytes(b)
+        self.chunks.append(data)
+        if self.copy is not None:
+            self.copy.write(data)
+        return len(data)
+
+    def drain(self):
+        chunks, self.chunks = self.chunks, []
+        return chunks
+
+
+def stream(files, copy=None):
+    """the bytes of a zip of files ([(path, name)]) as they are written, also written to copy (file) if given"""
+    sink = _Sink(copy)
+    with ZipFile(sink, 'w', ZIP_DEFLATED, compresslevel=compresslevel()) as zipf:
+        for path, arcname in files:
+            try:
+                info = ZipInfo.from_file(path, arcname)
+                src = open(path, 'rb')
+            except FileNotFoundError:  # e.g. deleted by a stage meanwhile
+                continue
+            info.compress_type, info._compresslevel = ZIP_DEFLATED, compresslevel()  # as ZipFile.write does
+            with src, zipf.open(info, 'w', force_zip64=info.file_size > 0x7fffffff) as dst:
+                for block in iter(lambda: src.read(READ_SIZE), b''):
+                    dst.write(block)
+                    yield from sink.drain()
+            yield from sink.drain()
+    yield from sink.drain()
+
+
+def stream_and_store(job, subset):
+    """streams the archive of a finished job and stores it, the file only appears once it is complete"""
+    target = cached_path(job, subset)
+    tmp = f'{target}.{os.getpid()}_{threading.get_ident()}.tmp'
+    complete = False
+    try:
+        try:
+            copy = open(tmp, 'wb')
+        except OSError:  # job directory not writable, only streamed
+            yield from stream(members(job, subset))
+            return
+        with copy:
+            yield from stream(members(job, subset), copy)
+        os.replace(tmp, target)
+        complete = True
+    finally:
+        # download aborted
+        if not complete and os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def cached(job, subset):
+    """path of the stored archive of a finished job, None if there is none"""
+    path = cached_path(job, subset)
+    return path if job.is_finished and os.path.exists(path) else None
+
+
+def archive(job, subset):
+    """(path of the stored archive, None) or (None, byte stream) of the archive of a job"""
+    path = cached(job, subset)
+    if path is not None:
+        return path, None
+    if job.is_finished:
+        return None, stream_and_store(job, subset)
+    return None, stream(members(job, subset))
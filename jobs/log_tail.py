@@ -0,0 +1,81 @@
+from django.conf import settings
+import os
+
+"""Incremental reading of task logs by byte offset. The details page renders only the last LOG_TAIL_LINES lines of a
+log and fetches the rest through the log tail endpoint: the lines after a cursor (new output of a running task) or
+before it (older output), at most LOG_TAIL_MAX_BYTES per request. Only complete lines are returned, the offsets of a
+result are the cursors of the next requests"""
+
+BLOCK_SIZE = 1 << 16
+
+
+def tail_lines():
+    return getattr(settings, 'LOG_TAIL_LINES', 200)
+
+
+def max_bytes():
+    return getattr(settings, 'LOG_TAIL_MAX_BYTES', 262144)
+
+
+def _result(data, start, end, size):
+    lines = data.decode('utf-8', errors='replace').splitlines()
+    return {'lines': lines, 'start': start, 'end': end, 'size': size, 'more_before': start > 0, 'more_after': end < size}
+
+
+def read_after(path, cursor, limit=None):
+    """complete lines starting at byte offset cursor"""
+    limit = limit or max_bytes()
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        cursor = min(max(0, cursor), size)
+        f.seek(cursor)
+        data = f.read(limit)
+    if cursor + len(data) < size or not data.endswith(b'\n'):
+        # the last line isn't complete (yet), it is returned with the next request. A single line longer than the
+        # limit is cut instead
+        cut = data.rfind(b'\n') + 1
+        if cut:
+            data = data[:cut]
+        elif len(data) < limit:
+            data = b''
+    return _result(data, cursor, cursor + len(data), size)
+
+
+def _last_line_end(f, end):
+    """offset after the last newline before end, 0 if there is none"""
+    while end > 0:
+        step = min(BLOCK_SIZE, end)
+        f.seek(end - step)
+        newline = f.read(step).rfind(b'\n')
+        if newline >= 0:
+            return end - step + newline + 1
+        end -= step
+    return 0
+
+
+def read_before(path, cursor=None, limit=None, n_lines=None):
+    """complete lines ending at byte offset cursor (default end of the file), at most n_lines"""
+    limit = limit or max_bytes()
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        end = size if cursor is None else min(max(0, cursor), size)
+        if cursor is None:
+            # without a cursor only complete lines are returned, the end is after the last newline
+            end = _last_line_end(f, end)
+        data, start = b'', end
+        while start > 0 and end - start < limit and (n_lines is None or data.count(b'\n') <= n_lines):
+            step = min(BLOCK_SIZE, start, limit - (end - start))
+            start -= step
+            f.seek(start)
+            data = f.read(step) + data
+    if start > 0:
+        # the first line is only partly read. A single line longer than the limit is cut instead
+        cut = data.find(b'\n') + 1
+        if 0 < cut < len(data):
+            data, start = data[cut:], start + cut
+    if n_lines is not None:
+        lines = data.splitlines(keepends=True)
+        if len(lines) > n_lines:
+            skipped = sum(len(line) for line in lines[:-n_lines])
+            data, start = data[skipped:], start + skipped
+    return _result(data, start, end, size)
@@ -0,0 +1,89 @@
+import tempfile
+import heapq
+import os
+
+"""Streaming conversion of the MCS found by defigueiredo (reaction names per line) to the binary format of PoFcalc.
+Every MCS is mapped to its sorted column indices (reaction -> column dict), so the same cut set written in a different
+order is a duplicate as well. Deduplication works in bounded memory: unique rows are collected in chunks of
+chunk_size, spilled to sorted temporary files and merged at the end.
+
+Besides the '0100..' text file PoFcalc reads, a sparse file with one MCS per line as column indices is written
+(first line: number of columns), which is a fraction of the size for genome-scale models"""
+
+DEFAULT_CHUNK_SIZE = 1000000
+
+
+def read_reactions(rxns_fname):
+    """reaction -> column dict from a (compressed) rfile"""
+    with open(rxns_fname, 'r') as f:
+        rxns = [r.replace('"', '') for r in f.read().strip().split()]
+    return {rxn: i for i, rxn in enumerate(rxns)}
+
+
+def _canonical(line, columns):
+    sep = ' ' if ' ' in line else ','
+    try:
+        indices = sorted({columns[rxn] for rxn in line.strip().split(sep) if rxn})
+    except KeyError as e:
+        raise ValueError(f'Reaction {e.args[0]} of MCS "{line.strip()}" not found in the reaction file')
+    return ' '.join(map(str, indices))
+
+
+def _spill(rows, tmpdir, chunks):
+    fname = os.path.join(tmpdir, f'chunk{len(chunks)}')
+    with open(fname, 'w') as f:
+        for row in sorted(rows):
+            f.write(row + '\n')
+    chunks.append(fname)
+
+
+def convert(mcs_fname, rxns_fname, output_file, sparse_file=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """streams mcs_fname and writes the unique MCS to output_file (binary text) and sparse_file.
+    Returns (number of MCS read, number of unique MCS)"""
+    columns = read_reactions(rxns_fname)
+    total = 0
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output_file))) as tmpdir:
+        chunks = []
+        rows = set()
+        with open(mcs_fname, 'r') as mcsfile:
+            for line in mcsfile:
+                if not line.strip():
+                    continue
+                total += 1
+                rows.add(_canonical(line, columns))
+                if len(rows) >= chunk_size:
+                    _spill(rows, tmpdir, chunks)
+                    rows = set()
+
+        if chunks:
+            _spill(rows, tmpdir, chunks)
+            files = [open(fname, 'r') for fname in chunks]
+            merged = (line.rstrip('\n') for line in heapq.merge(*files))
+        else:
+            files = []
+            merged = iter(sorted(rows))
+
+        unique = 0
+        try:
+            with open(output_file, 'w') as outfile:
+                sparsefile = open(sparse_file, 'w') if sparse_file else None
+                if sparsefile:
+                    sparsefile.write(f'{len(columns)}\n')
+                previous = None
+                for row in merged:
+                    if row == previous:
+                        continue
+                    previous = row
+                    unique += 1
+                    arr = bytearray(b'0' * len(columns))
+                    for index in row.split():
+                        arr[int(index)] = ord('1')
+                    outfile.write(arr.decode('ascii') + '\n')
+                    if sparsefile:
+                        sparsefile.write(row + '\n')
+                if sparsefile:
+                    sparsefile.close()
+        finally:
+            for f in files:
+                f.close()
+    return total, unique
@@ -2,7 +2,7 @@ from django.db import models
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.validators import FileExtensionValidator
-from .validators import sbml_validator
+from .validators import sbml_structure_validator, mutation_rate_sweep_validator
 from django.urls import reverse
 import datetime
 from django_celery_results.models import TaskResult
@@ -10,6 +10,7 @@ from .formatChecker import ContentTypeRestrictedFileField
 from django.conf import settings
 import os
 import random
+import uuid
 
 """defines Django database models"""
 
@@ -23,6 +24,9 @@ def user_directory_path(instance, filename):
     return '{0}_{1}/{2}_{3}{4}/{5}'.format(instance.user.id, user, fname_noext, date, i, filename)
 
 
+COMPRESSION_ENGINES = [('perl', 'compress_network.pl'), ('python', 'Python (in-process)')]
+
+
 def givemetimezone():
     return timezone.localtime(timezone.now())
 
@@ -36,6 +40,8 @@ class Job(models.Model):
     finished_date = models.DateTimeField(blank=True, null=True)
     ip = models.GenericIPAddressField(null=True)
     compression = models.BooleanField(default=True)
+    compression_engine = models.CharField(max_length=10, choices=COMPRESSION_ENGINES,
+                                          default=settings.COMPRESSION_ENGINE, verbose_name='Compression engine')
     cardinality_mcs = models.IntegerField(default=3, verbose_name='Cardinality MCS')
     cardinality_pof = models.IntegerField(default=8, verbose_name='Cardinality PoF')
     make_consistent = models.BooleanField(default=False)
@@ -52,14 +58,32 @@ class Job(models.Model):
     result_table = models.CharField(max_length=250, null=True)
     sbml_file = ContentTypeRestrictedFileField(upload_to=user_directory_path, content_types=settings.ALLOWED_CONTENT_TYPES,
                                  validators=[FileExtensionValidator(allowed_extensions=settings.ALLOWED_EXTENSIONS,
-                                                                    message='Wrong file type!'), sbml_validator],
+                                                                    message='Wrong file type!'), sbml_structure_validator],
                                  verbose_name='File', max_upload_size=settings.MAX_UPLOAD_SIZE)
     skip_validation = models.BooleanField(default=False)
     mutation_rate = models.FloatField(default=0.1, verbose_name="Mutation rate (%)")
+    cache_key = models.CharField(max_length=64, null=True, db_index=True)
+    model_digest = models.CharField(max_length=64, null=True)
+    cached = models.BooleanField(default=False, verbose_name='From cache')
+    mutation_rate_sweep = models.CharField(max_length=500, null=True, blank=True,
+                                           validators=[mutation_rate_sweep_validator],
+                                           verbose_name='Mutation rate sweep (%)')
+    sweep_table = models.CharField(max_length=250, null=True)
+    predicted_runtime = models.FloatField(null=True, blank=True)
+    queue = models.CharField(max_length=20, null=True, blank=True)
+    validation_errors = models.TextField(null=True, blank=True)
 
     def get_absolute_url(self):
         return reverse('details', kwargs={'pk': self.pk})  # returns to e.g. jobs//details/1
 
+    class Meta:
+        indexes = [
+            # overview, running jobs of a user (badge, cancel all) and the cleanup of expired jobs
+            models.Index(fields=['user', 'is_finished', 'status', 'submit_date'], name='job_user_state_idx'),
+            # default order of the overview
+            models.Index(fields=['user', '-id'], name='job_user_id_idx'),
+        ]
+
 
 class SubTask(models.Model):
     """connects Job - User - TaskResult models """
@@ -71,3 +95,37 @@ class SubTask(models.Model):
     command_arguments = models.CharField(max_length=1000, null=True)
     logfile_path = models.CharField(null=True, max_length=250)
     duration = models.CharField(null=True, max_length=25)
+    runtime = models.FloatField(null=True)
+    predicted_runtime = models.FloatField(null=True)
+    progress = models.JSONField(null=True)
+    cached = models.BooleanField(default=False)  # outputs copied from the stage cache, the runtime isn't a real one
+
+
+class CachedResult(models.Model):
+    """artifacts and results of a finished job, keyed by model content + parameters (see result_cache.py)"""
+    key = models.CharField(max_length=64, unique=True)
+    path = models.CharField(max_length=250)
+    model_name = models.CharField(max_length=50, null=True)
+    result_table = models.CharField(max_length=250, null=True)
+    sweep_table = models.CharField(max_length=250, null=True)
+    result = models.CharField(max_length=50, null=True)
+    reactions = models.IntegerField(null=True)
+    metabolites = models.IntegerField(null=True)
+    genes = models.IntegerField(null=True)
+    objective_expression = models.CharField(max_length=100, null=True)
+    source_job = models.IntegerField(null=True)
+    size = models.BigIntegerField(default=0)
+    hits = models.IntegerField(default=0)
+    created = models.DateTimeField(default=timezone.now)
+    last_used = models.DateTimeField(default=timezone.now)
+
+
+class ChunkedUpload(models.Model):
+    """a resumable upload of a model archive, assembled chunk by chunk in CHUNKED_UPLOAD_ROOT (see chunked_upload.py)"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=250)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    created = models.DateTimeField(default=timezone.now)
+    updated = models.DateTimeField(default=timezone.now)
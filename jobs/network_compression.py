@@ -0,0 +1,631 @@
+from fractions import Fraction
+from functools import reduce
+from bisect import bisect_left
+import numpy as np
+import logging
+import math
+import re
+
+"""In-process replacement for scripts/compress_network.pl (linear network compression).
+
+The stoichiometric matrix is stored sparse - a dict of non-zero entries per metabolite and per reaction - and reactions
+and metabolites keep their original index as id, so a merge only touches the entries of the reactions involved instead
+of rescanning the whole matrix. All coefficients are exact fractions. The compression rules, their order and the
+written files (_comp files, change protocol, .new_reac_names/.new_reac_stoich) are the same as the ones of the perl
+script, including the merged reaction names joined by the reaction separator (usually '%').
+
+Optionally (kernel=True) the kernel based compression the perl script has disabled runs after every linear pass:
+reactions with a zero row in the nullspace of the stoichiometric matrix are removed (blocked) and reactions with
+proportional rows (fully coupled) are merged. The nullspace is computed fraction-free (Bareiss-style integer
+elimination, int64 with a fallback to python ints), coupled reactions are found by hashing the normalized kernel
+rows."""
+
+REACTION_SEPARATORS = ['%', '=', '&', '!', '@']
+# entries of the stoichiometric matrix smaller than this are considered zero (Math::MatrixFraction)
+CONSIDER_ZERO = 1e-10
+FOREVER_GONE = 'FOREVER_GONE'
+# int64 elimination is exact as long as all entries stay below this (2 * INT64_SAFE**2 < 2**63)
+INT64_SAFE = 2 ** 31 - 1
+
+
+def _first_line(fname, strip):
+    with open(fname, 'r') as f:
+        line = f.readline()
+    for char in strip:
+        line = line.replace(char, '')
+    return line.split()
+
+
+def read_stoichiometry(fname):
+    with open(fname, 'r') as f:
+        rows = [line.split() for line in f if line.strip()]
+    if any(len(row) != len(rows[0]) for row in rows):
+        raise ValueError(f'rows of the stoichiometric matrix in {fname} differ in length')
+    return rows
+
+
+def to_fraction(value):
+    """same conversion as Math::MatrixFraction: the decimal is scaled by powers of 10 until it is an integer"""
+    x = float(value)
+    if abs(x) < CONSIDER_ZERO:
+        return Fraction(0)
+    denominator = 1
+    while int(x * denominator) != x * denominator:
+        denominator *= 10
+    return Fraction(int(x * denominator), denominator)
+
+
+def fraction_string(value):
+    return f'{value.numerator}/{value.denominator}'
+
+
+def decimal_string(value):
+    """a fraction as perl prints its decimal value"""
+    if value.denominator == 1:
+        return str(value.numerator)
+    return '%.15g' % (float(value.numerator) / float(value.denominator))
+
+
+def is_true(value):
+    # perl truth value of a reversibility entry
+    return value not in ('', '0')
+
+
+def lcm(a, b):
+    return a * b // math.gcd(a, b)
+
+
+def _max_abs(a):
+    return int(np.abs(a).max()) if a.size else 0
+
+
+def fraction_free_reduce(matrix):
+    """fraction-free Gauss-Jordan elimination of an integer matrix. Every row with a non-zero entry in the pivot column
+    is replaced by (p * a[i] - a[i, c] * a[k]) / g with the exact division by the gcd g of the new row. This is the
+    Bareiss scheme with the row content as divisor instead of the previous pivot: rows without an entry in the pivot
+    column stay as they are, so sparse stoichiometric matrices stay sparse and the entries small. The pivot of a
+    column is taken from the row with the fewest non-zeros. Works on int64 while the entries are small enough and
+    continues with python ints (object array) otherwise. Returns the reduced matrix and the (row, column) pairs of the
+    pivots"""
+    try:
+        a = np.array(matrix, dtype=np.int64)
+    except OverflowError:
+        a = np.array(matrix, dtype=object)
+    if _max_abs(a) > INT64_SAFE:
+        a = a.astype(object)
+    n_rows, n_cols = a.shape
+    free_rows = np.ones(n_rows, dtype=bool)
+    pivots = []
+    for c in range(n_cols):
+        if len(pivots) == n_rows:
+            break
+        candidates = np.flatnonzero((a[:, c] != 0) & free_rows)
+        if not candidates.size:
+            continue
+        k = candidates[np.argmin(np.count_nonzero(a[candidates], axis=1))]
+        free_rows[k] = False
+        pivots.append((k, c))
+        rows = np.flatnonzero(a[:, c] != 0)
+        rows = rows[rows != k]
+        if not rows.size:
+            continue
+        if a.dtype != object and max(_max_abs(a[rows]), _max_abs(a[k])) > INT64_SAFE:
+            a = a.astype(object)
+        reduced = a[k, c] * a[rows] - np.outer(a[rows, c], a[k])
+        content = np.gcd.reduce(reduced, axis=1)
+        content[content == 0] = 1
+        a[rows] = reduced // content[:, None]
+    return a, pivots
+
+
+def integer_kernel(matrix, n_cols):
+    """integer basis of the right nullspace of an integer matrix, one row per column of the matrix (= reaction) and
+    one column per basis vector. With all pivots scaled to their lcm d, the basis vector of free column f is d at f
+    and -a[k, f] * d / a[k, c] at the pivot column c of every pivot row k"""
+    if not len(matrix):
+        return np.identity(n_cols, dtype=np.int64)
+    a, pivots = fraction_free_reduce(matrix)
+    pivot_rows = [k for k, _ in pivots]
+    pivot_cols = [c for _, c in pivots]
+    pivot_set = set(pivot_cols)
+    free = [c for c in range(n_cols) if c not in pivot_set]
+    values = [int(a[k, c]) for k, c in pivots]
+    d = reduce(lcm, (abs(v) for v in values), 1)
+    scale = [d // v for v in values]
+    block = a[pivot_rows][:, free]
+    bound = max([d] + [abs(x) for x in scale]) * max(_max_abs(block), 1)
+    dtype = np.int64 if bound <= INT64_SAFE else object
+
+    kernel = np.zeros((n_cols, len(free)), dtype=dtype)
+    kernel[free, range(len(free))] = d
+    if pivots and free:
+        kernel[pivot_cols] = -block.astype(dtype) * np.array(scale, dtype=dtype)[:, None]
+    return kernel
+
+
+def normalized_rows(kernel):
+    """primitive rows of the kernel (gcd 1, first non-zero entry positive) as hashable keys and the factors with
+    row = factor * normalized row. Zero rows get the key None"""
+    if not kernel.shape[1]:
+        return [None] * len(kernel), [0] * len(kernel)
+    factors = np.gcd.reduce(kernel, axis=1)
+    first = kernel[np.arange(len(kernel)), (kernel != 0).argmax(axis=1)]
+    factors = np.where(first < 0, -factors, factors)
+    keys = []
+    for row, factor in zip(kernel, factors):
+        if not factor:
+            keys.append(None)
+        elif kernel.dtype == object:
+            keys.append(tuple(x // factor for x in row))
+        else:
+            keys.append((row // factor).tobytes())
+    return keys, [int(f) for f in factors]
+
+
+class Compressor:
+
+    def __init__(self, stoichiometry, reactions, metabolites, reversibility, no_one2many=(), no_compression=(),
+                 linear_only=False, kernel=False, logger=None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.linear_only = linear_only
+        self.kernel = kernel
+        self.protocol = []
+        self.separator = self._find_separator(reactions)
+        self.protocol.append(f'REACTION_SEPARATOR: {self.separator}\n')
+
+        self.names = list(reactions)
+        self.rever = list(reversibility)
+        self.meta_names = list(metabolites)
+        self.reacs = list(range(len(reactions)))
+        self.metas = list(range(len(metabolites)))
+        self.rows = {m: {} for m in self.metas}
+        self.cols = {r: {} for r in self.reacs}
+        for m, row in enumerate(stoichiometry):
+            for r, value in enumerate(row):
+                value = to_fraction(value)
+                if value:
+                    self.rows[m][r] = value
+                    self.cols[r][m] = value
+
+        self.no_one2many = [self._pattern(r) for r in no_one2many]
+        self.no_compression = [self._pattern(r) for r in no_compression]
+        self.new_names = {r: [r] for r in reactions}
+        self.new_stoic = {r: Fraction(1) for r in reactions}
+
+    def _find_separator(self, reactions):
+        for sep in REACTION_SEPARATORS:
+            if not any(sep in r for r in reactions):
+                return sep
+        raise ValueError(f'list of potential reaction separators ({" ".join(REACTION_SEPARATORS)}) did not contain '
+                         f'a suitable candidate')
+
+    def _pattern(self, reaction):
+        return re.compile(self.separator + reaction + self.separator)
+
+    # positions in the current (compressed) network, ids are the indices in the original network
+    def rpos(self, r):
+        return bisect_left(self.reacs, r)
+
+    def mpos(self, m):
+        return bisect_left(self.metas, m)
+
+    # sparse matrix operations
+    def _set(self, m, r, value):
+        if value:
+            self.rows[m][r] = value
+            self.cols[r][m] = value
+        else:
+            self.rows[m].pop(r, None)
+            self.cols[r].pop(m, None)
+
+    def divide(self, r, divisor):
+        for m, value in list(self.cols[r].items()):
+            self._set(m, r, value / divisor)
+
+    def add(self, dest, src, factor=1):
+        for m, value in list(self.cols[src].items()):
+            self._set(m, dest, self.rows[m].get(dest, 0) + factor * value)
+
+    def remove_reaction(self, r):
+        for m in self.cols.pop(r):
+            del self.rows[m][r]
+        del self.reacs[self.rpos(r)]
+
+    def remove_metabolite(self, m):
+        for r in self.rows.pop(m):
+            del self.cols[r][m]
+        del self.metas[self.mpos(m)]
+
+    def update_new_names(self, merged, new_name):
+        for reaction in merged.split(self.separator):
+            self.new_names[reaction].append(new_name)
+
+    def update_new_stoic(self, merged, factor):
+        for reaction in merged.split(self.separator):
+            self.new_stoic[reaction] *= factor
+
+    def _allowed(self, patterns, *reaction_lists):
+        for reactions in reaction_lists:
+            for r in reactions:
+                name = self.separator + self.names[r] + self.separator
+                if any(p.search(name) for p in patterns):
+                    return False
+        return True
+
+    def compress(self):
+        changes = self.remove_empty_reactions()
+        while True:
+            changes = self.remove_irrelevant_metabolites()
+            changes += self.merge_reactions()
+            if self.kernel:
+                changes += self.kernel_checks()
+            if not changes:
+                break
+
+    def remove_empty_reactions(self):
+        empty = [(pos, r) for pos, r in enumerate(self.reacs) if not self.cols[r]]
+        for pos, r in empty:
+            self.log(f'EMPTY_REAC: {pos} {self.names[r]}\n')
+            if self.linear_only:
+                self.update_new_names(self.names[r], FOREVER_GONE)
+                self.update_new_stoic(self.names[r], 0)
+        for pos, r in empty:
+            self.remove_reaction(r)
+        return len(empty)
+
+    def remove_irrelevant_metabolites(self):
+        changes = 0
+        remove_metas = []
+        remove_reacs = set()
+        for pos, m in enumerate(self.metas):
+            revs = outs = ins = 0
+            for r, value in self.rows[m].items():
+                if is_true(self.rever[r]):
+                    revs += 1
+                elif value < 0:
+                    outs += 1
+                else:
+                    ins += 1
+            if revs == 0 and outs == 0 and ins == 0:
+                self.log(f'REMOVE_UNUSED_META: m={pos}, {self.meta_names[m]}\n')
+            elif (revs == 1 and ins == 0 and outs == 0) or (revs == 0 and ins >= 1 and outs == 0) or \
+                    (revs == 0 and ins == 0 and outs >= 1):
+                reactions = sorted(self.rows[m])
+                removed = ' '.join(f'{self.names[r]} {self.rpos(r)}' for r in reactions)
+                self.log(f'REMOVE_DEADEND_META: m={pos}, {self.meta_names[m]}, removed_reactions: {removed}\n')
+                remove_reacs.update(reactions)
+            else:
+                continue
+            remove_metas.append(m)
+            changes += 1
+
+        for m in remove_metas:
+            self.remove_metabolite(m)
+        for r in sorted(remove_reacs):
+            if self.linear_only:
+                self.update_new_names(self.names[r], FOREVER_GONE)
+                self.update_new_stoic(self.names[r], 0)
+            self.remove_reaction(r)
+        return changes
+
+    def merge_reactions(self):
+        changes = 0
+        linear = self.linear_only
+        if not self.reacs:
+            # the perl script rebuilds the metabolites from the rows of the matrix, which has none without reactions
+            for m in list(self.metas):
+                self.remove_metabolite(m)
+        while True:
+            t_change = 0
+            pos = 0
+            while pos < len(self.metas):
+                m = self.metas[pos]
+                ins, outs, revs = [], [], []
+                for r in sorted(self.rows[m]):
+                    if is_true(self.rever[r]):
+                        revs.append(r)
+                    elif self.rows[m][r] < 0:
+                        outs.append(r)
+                    else:
+                        ins.append(r)
+
+                def allowed(first, second, one2many=False):
+                    return (not one2many or self._allowed(self.no_one2many, first, second)) and \
+                        self._allowed(self.no_compression, first, second)
+
+                merged = True
+                if not revs and len(outs) == 1 and len(ins) > 1 and not linear and allowed(ins, outs, True):
+                    self.merge_many_in_one_out_irrev(m, ins, outs[0])
+                elif not revs and len(outs) > 1 and len(ins) == 1 and not linear and allowed(ins, outs, True):
+                    self.merge_one_in_many_outs_irrev(m, ins[0], outs)
+                elif len(revs) == 1 and not ins and len(outs) > 1 and not linear and allowed(revs, outs, True):
+                    self.merge_many_outs_one_rev(m, revs[0], outs)
+                elif len(revs) == 1 and not outs and len(ins) > 1 and not linear and allowed(revs, ins, True):
+                    self.merge_many_in_one_rev(m, ins, revs[0])
+                elif len(revs) == 1 and not outs and len(ins) == 1 and allowed(revs, ins):
+                    self.merge_many_in_one_rev(m, ins, revs[0])
+                elif len(revs) == 1 and not ins and len(outs) == 1 and allowed(revs, outs):
+                    self.merge_many_outs_one_rev(m, revs[0], outs)
+                elif len(revs) == 2 and not outs and not ins and allowed(revs, revs):
+                    self.merge_two_rev(m, revs)
+                elif not revs and len(outs) == 1 and len(ins) == 1 and allowed(ins, outs):
+                    self.merge_two_irrev(m, ins[0], outs[0])
+                else:
+                    merged = False
+
+                if merged:
+                    t_change += 1
+                    changes += 1
+                pos += 1
+            if not t_change:
+                return changes
+
+    def _merge(self, m, pivot, targets, pivot_first):
+        """adds the pivot reaction (scaled to a coefficient of +-1 for metabolite m) to all targets (scaled the same
+        way), then removes the pivot and the balanced metabolite. Returns the new names of the targets and the name
+        of the metabolite"""
+        self.divide(pivot, abs(self.rows[m][pivot]))
+        for t in targets:
+            self.divide(t, abs(self.rows[m][t]))
+        for t in targets:
+            self.add(t, pivot)
+
+        new_names = []
+        for t in targets:
+            parts = [self.names[pivot], self.names[t]] if pivot_first else [self.names[t], self.names[pivot]]
+            self.names[t] = self.separator.join(parts)
+            new_names.append(self.names[t])
+        self.remove_reaction(pivot)
+        return new_names, self._remove_balanced(m)
+
+    def _remove_balanced(self, m):
+        if self.rows[m]:
+            raise RuntimeError(f'metabolite {self.meta_names[m]} is not balanced after merging its reactions. '
+                               f'This should never happen!')
+        self.remove_metabolite(m)
+        return self.meta_names[m]
+
+    def merge_many_in_one_out_irrev(self, m, ins, out):
+        m_pos, out_pos = self.mpos(m), self.rpos(out)
+        in_pos = [self.rpos(r) for r in ins]
+        in_vals, out_val = [self.rows[m][r] for r in ins], self.rows[m][out]
+        in_names, out_name = [self.names[r] for r in ins], self.names[out]
+        new_names, meta = self._merge(m, out, ins, pivot_first=False)
+        for i, r in enumerate(ins):
+            self.log(f'MERGED_MANY_IN_ONE_OUT: i={i}: {in_pos[i]} {fraction_string(in_vals[i])} {in_names[i]} '
+                     f'{out_pos} {fraction_string(out_val)} {out_name} => {self.rpos(r)} {new_names[i]} '
+                     f'meta_name={meta} meta_idx={m_pos}\n')
+
+    def merge_one_in_many_outs_irrev(self, m, in_, outs):
+        m_pos, in_pos = self.mpos(m), self.rpos(in_)
+        out_pos = [self.rpos(r) for r in outs]
+        in_val, out_vals = self.rows[m][in_], [self.rows[m][r] for r in outs]
+        in_name, out_names = self.names[in_], [self.names[r] for r in outs]
+        new_names, meta = self._merge(m, in_, outs, pivot_first=True)
+        for i, r in enumerate(outs):
+            self.log(f'MERGED_ONE_IN_MANY_OUT: i={i}: {in_pos} {fraction_string(in_val)} {in_name} {out_pos[i]} '
+                     f'{fraction_string(out_vals[i])} {out_names[i]} => {self.rpos(r)} {new_names[i]} '
+                     f'meta_name={meta} meta_idx={m_pos}\n')
+
+    def merge_many_outs_one_rev(self, m, rev, outs):
+        """reversible reaction rev produces metabolite m (after reversing it if needed), irreversible outs consume
+        it"""
+        m_pos, in_pos = self.mpos(m), self.rpos(rev)
+        out_pos = [self.rpos(r) for r in outs]
+        in_val, out_vals = self.rows[m][rev], [self.rows[m][r] for r in outs]
+        in_name, out_names = self.names[rev], [self.names[r] for r in outs]
+        fac1, fac2 = 1, -1
+        if in_val < 0:
+            self.divide(rev, -1)
+            fac1 = -1
+            self.log(f'REVERSED_REVERSIBLE_REACTION: {in_pos} {fraction_string(in_val)} {in_name}\n')
+        new_names, meta = self._merge(m, rev, outs, pivot_first=True)
+
+        if len(outs) == 1:
+            self.log(f'MERGED_IN_REV_OUT_IRREV: {in_pos} {fraction_string(in_val)} {in_name} {out_pos[0]} '
+                     f'{fraction_string(out_vals[0])} {out_names[0]} => {self.rpos(outs[0])} {new_names[0]} '
+                     f'meta_name={meta} meta_idx={m_pos}\n')
+            if self.linear_only:
+                self.update_new_names(new_names[0], new_names[0])
+                self.update_new_stoic(in_name, fac1 / in_val)
+                self.update_new_stoic(out_names[0], fac2 / out_vals[0])
+        else:
+            for i, r in enumerate(outs):
+                self.log(f'MERGED_MANY_OUT_ONE_REV: i={i}: {in_pos} {fraction_string(in_val)} {in_name} '
+                         f'{out_pos[i]} {fraction_string(out_vals[i])} {out_names[i]} => {self.rpos(r)} '
+                         f'{new_names[i]} meta_name={meta} meta_idx={m_pos}\n')
+
+    def merge_many_in_one_rev(self, m, ins, rev):
+        """irreversible ins produce metabolite m, reversible reaction rev consumes it (after reversing it if
+        needed)"""
+        m_pos, out_pos = self.mpos(m), self.rpos(rev)
+        in_pos = [self.rpos(r) for r in ins]
+        in_vals, out_val = [self.rows[m][r] for r in ins], self.rows[m][rev]
+        in_names, out_name = [self.names[r] for r in ins], self.names[rev]
+        fac1, fac2 = 1, -1
+        if out_val > 0:
+            self.divide(rev, -1)
+            fac2 = 1
+            self.log(f'REVERSED_REVERSIBLE_REACTION: {out_pos} {fraction_string(out_val)} {out_name}\n')
+        new_names, meta = self._merge(m, rev, ins, pivot_first=False)
+
+        if len(ins) == 1:
+            self.log(f'MERGED_IN_IRREV_OUT_REV: {in_pos[0]} {fraction_string(in_vals[0])} {in_names[0]} {out_pos} '
+                     f'{fraction_string(out_val)} {out_name} => {self.rpos(ins[0])} {new_names[0]} '
+                     f'meta_name={meta} meta_idx={m_pos}\n')
+            if self.linear_only:
+                self.update_new_names(new_names[0], new_names[0])
+                self.update_new_stoic(in_names[0], fac1 / in_vals[0])
+                self.update_new_stoic(out_name, fac2 / out_val)
+        else:
+            for i, r in enumerate(ins):
+                self.log(f'MERGED_MANY_IN_ONE_REV: i={i}: {in_pos[i]} {fraction_string(in_vals[i])} {in_names[i]} '
+                         f'{out_pos} {fraction_string(out_val)} {out_name} => {self.rpos(r)} {new_names[i]} '
+                         f'meta_name={meta} meta_idx={m_pos}\n')
+
+    def merge_two_rev(self, m, revs):
+        r1, r2 = revs
+        m_pos, pos1, pos2 = self.mpos(m), self.rpos(r1), self.rpos(r2)
+        val1, val2 = self.rows[m][r1], self.rows[m][r2]
+        name1, name2 = self.names[r1], self.names[r2]
+        # factors of the original reactions in the merged one as the perl script notes them
+        fac1 = 1 if val1 > 0 else -1
+        fac2 = -1 if val2 > 0 else 1
+
+        self.divide(r1, val1)
+        self.divide(r2, val2)
+        self.add(r1, r2, factor=-1)
+        new_name = self.names[r1] = name1 + self.separator + name2
+        self.remove_reaction(r2)
+        meta = self._remove_balanced(m)
+
+        self.log(f'MERGED_TWO_REV: {pos1} {fraction_string(val1)} {name1} {pos2} {fraction_string(val2)} {name2} => '
+                 f'{self.rpos(r1)} {new_name} meta_name={meta} meta_id={m_pos}\n')
+        if self.linear_only:
+            self.update_new_names(new_name, new_name)
+            self.update_new_stoic(name1, fac1 / val1)
+            self.update_new_stoic(name2, fac2 / val2)
+
+    def merge_two_irrev(self, m, in_, out):
+        m_pos, in_pos, out_pos = self.mpos(m), self.rpos(in_), self.rpos(out)
+        in_val, out_val = self.rows[m][in_], self.rows[m][out]
+        in_name, out_name = self.names[in_], self.names[out]
+        new_names, meta = self._merge(m, out, [in_], pivot_first=False)
+
+        self.log(f'MERGED_TWO_IRREV: {in_pos} {fraction_string(in_val)} {in_name} {out_pos} '
+                 f'{fraction_string(out_val)} {out_name} => {self.rpos(in_)} {new_names[0]} meta_name={meta} '
+                 f'meta_idx={m_pos}\n')
+        if self.linear_only:
+            self.update_new_names(new_names[0], new_names[0])
+            self.update_new_stoic(in_name, 1 / in_val)
+            self.update_new_stoic(out_name, -1 / out_val)
+
+    def kernel_checks(self):
+        """removes blocked reactions (zero row in the kernel) and merges fully coupled reactions (proportional rows in
+        the kernel). The same step as kernel_checks of the perl script"""
+        if not self.metas or not self.reacs:
+            return 0
+        self.logger.info(f'Computing the kernel of the {len(self.metas)}x{len(self.reacs)} stoichiometric matrix')
+        kernel = integer_kernel(self.integer_stoichiometry(), len(self.reacs))
+
+        blocked = []
+        coupled = {}
+        for r, key, factor in zip(self.reacs, *normalized_rows(kernel)):
+            if key is None:
+                blocked.append(r)
+            else:
+                coupled.setdefault(key, []).append((r, factor))
+
+        changes = 0
+        for r in blocked:
+            self.remove_blocked(r)
+            changes += 1
+        for group in coupled.values():
+            group = [(r, factor) for r, factor in group if self._allowed(self.no_compression, [r])]
+            if len(group) > 1:
+                self.merge_coupled(group)
+                changes += 1
+        return changes
+
+    def remove_blocked(self, r):
+        self.log(f'REMOVE_BLOCKED_REAC: {self.rpos(r)} {self.names[r]}\n')
+        if self.linear_only:
+            self.update_new_names(self.names[r], FOREVER_GONE)
+            self.update_new_stoic(self.names[r], 0)
+        self.remove_reaction(r)
+
+    def merge_coupled(self, group):
+        """merges reactions whose fluxes are proportional in every steady state. group holds (reaction, factor) with
+        flux(reaction) = factor * t, the merged reaction carries flux t and is the sum of the reactions scaled by
+        their factor relative to the first one"""
+        dest, dest_factor = group[0]
+        factors = [Fraction(factor, dest_factor) for _, factor in group]
+        irreversible = {f > 0 for (r, _), f in zip(group, factors) if not is_true(self.rever[r])}
+        if irreversible == {True, False}:
+            # irreversible reactions that have to run in opposite directions: no flux through any of them
+            for r, _ in group:
+                self.remove_blocked(r)
+            return
+        if irreversible == {False}:
+            factors = [-f for f in factors]
+
+        positions = [self.rpos(r) for r, _ in group]
+        names = [self.names[r] for r, _ in group]
+        self.divide(dest, factors[0])
+        for (r, _), factor in zip(group[1:], factors[1:]):
+            self.add(dest, r, factor)
+        if irreversible:
+            self.rever[dest] = next(self.rever[r] for r, _ in group if not is_true(self.rever[r]))
+        new_name = self.names[dest] = self.separator.join(names)
+        for r, _ in group[1:]:
+            self.remove_reaction(r)
+
+        merged = ' '.join(f'{pos} {name} {fraction_string(f)}' for pos, name, f in zip(positions, names, factors))
+        self.log(f'MERGED_COUPLED_REACS: {merged} => {self.rpos(dest)} {new_name}\n')
+        if self.linear_only:
+            self.update_new_names(new_name, new_name)
+            # like the linear merges, the stoichiometry notes the magnitude of the factor
+            for name, factor in zip(names, factors):
+                self.update_new_stoic(name, abs(factor))
+
+    def log(self, entry):
+        self.protocol.append(entry)
+        self.logger.info(entry.rstrip('\n'))
+
+    def stoichiometry(self):
+        """dense rows of the compressed stoichiometric matrix"""
+        return [[self.rows[m].get(r, Fraction(0)) for r in self.reacs] for m in self.metas]
+
+    def integer_stoichiometry(self):
+        """dense integer rows of the compressed stoichiometric matrix, every row is scaled by the lcm of its
+        denominators (doesn't change the nullspace)"""
+        positions = {r: pos for pos, r in enumerate(self.reacs)}
+        matrix = []
+        for m in self.metas:
+            row = [0] * len(self.reacs)
+            scale = reduce(lcm, (value.denominator for value in self.rows[m].values()), 1)
+            for r, value in self.rows[m].items():
+                row[positions[r]] = int(value * scale)
+            matrix.append(row)
+        return matrix
+
+
+def compress(sfile, mfile, rfile, rvfile, pfile, postfix, nfile=None, skipfile=None, linear_only=False,
+             kernel=False, logger=None):
+    """counterpart of 'compress_network.pl -s sfile -m mfile -r rfile -v rvfile -p pfile -o postfix [-n nfile]
+    [-i skipfile] [-l] -k'. Writes the same files and returns the Compressor. kernel=True additionally runs the
+    kernel based compression"""
+    reactions = _first_line(rfile, '">#')
+    metabolites = _first_line(mfile, '"#')
+    reversibility = _first_line(rvfile, '')
+    no_one2many = _first_line(nfile, '">#') if nfile else []
+    no_compression = _first_line(skipfile, '">#') if skipfile else []
+
+    comp = Compressor(read_stoichiometry(sfile), reactions, metabolites, reversibility, no_one2many,
+                      no_compression, linear_only=linear_only, kernel=kernel, logger=logger)
+    comp.compress()
+    comp.logger.info(f'original network:   number of reactions: {len(reactions)}, '
+                     f'number of metabolites: {len(metabolites)}')
+    comp.logger.info(f'compressed network: number of reactions: {len(comp.reacs)}, '
+                     f'number of metabolites: {len(comp.metas)}')
+
+    with open(pfile, 'w') as f:
+        f.write(''.join(comp.protocol))
+    with open(rfile + postfix, 'w') as f:
+        f.write(' '.join(f'"{comp.names[r]}"' for r in comp.reacs))
+    with open(mfile + postfix, 'w') as f:
+        f.write(' '.join(f'"{comp.meta_names[m]}"' for m in comp.metas))
+    with open(rvfile + postfix, 'w') as f:
+        f.write(' '.join(comp.rever[r] for r in comp.reacs))
+    with open(sfile + postfix, 'w') as f:
+        for row in comp.stoichiometry():
+            f.write(' '.join(decimal_string(value) for value in row) + '\n')
+
+    if linear_only:
+        with open(rfile + '.new_reac_names', 'w') as f:
+            for name in sorted(comp.new_names):
+                f.write(f'{name}: {comp.new_names[name][-1]}\n')
+        with open(rfile + '.new_reac_stoich', 'w') as f:
+            for name in sorted(comp.new_stoic):
+                f.write(f'{name}: {decimal_string(comp.new_stoic[name])}\n')
+    return comp
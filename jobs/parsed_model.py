@@ -0,0 +1,199 @@
+from django.conf import settings
+from .result_cache import file_digest
+import numpy as np
+import tempfile
+import json
+import os
+
+"""Parsed models, keyed by the digest of the model file (result_cache.file_digest). A model is parsed once - the SBML
+document libsbml reads in the validate_model task is converted directly - and stored in a compact form:
+reaction/metabolite/gene ids and names, the sparse stoichiometric matrix, bounds, objective coefficients, gene rules,
+subsystems, metabolite formulas and charges, compartments and the annotations and notes of the model and its
+components (as json) as arrays of one .npz file in PARSED_MODEL_ROOT. sbml_processing rebuilds the cobra model from it
+instead of parsing the file again, and the counts of a job are known at submission"""
+
+# bump if the stored form changes
+PARSED_MODEL_VERSION = 2
+
+LOADERS = {'.xml': 'read_sbml_model', '.sbml': 'read_sbml_model', '.json': 'load_json_model',
+           '.mat': 'load_matlab_model'}
+
+
+def cache_root():
+    return getattr(settings, 'PARSED_MODEL_ROOT', os.path.join(settings.MEDIA_ROOT, 'parsed_models'))
+
+
+def path_for(digest):
+    return os.path.join(cache_root(), f'{digest}.npz')
+
+
+def from_cobra(model):
+    """compact form (dict of numpy arrays) of a cobra model"""
+    import cobra
+    metabolite_index = {met.id: i for i, met in enumerate(model.metabolites)}
+    rows, cols, values = [], [], []
+    for col, rxn in enumerate(model.reactions):
+        for met, coefficient in rxn.metabolites.items():
+            rows.append(metabolite_index[met.id])
+            cols.append(col)
+            values.append(coefficient)
+    objective = {rxn.id: coefficient for rxn, coefficient in
+                 cobra.util.solver.linear_reaction_coefficients(model).items()}
+
+    def strings(items):
+        return np.array([item or '' for item in items], dtype=str)
+
+    def dicts(items):
+        return strings(json.dumps(item) if item else '' for item in items)
+
+    return {
+        'meta': np.array(json.dumps({'version': PARSED_MODEL_VERSION, 'id': model.id, 'name': model.name,
+                                     'direction': model.objective_direction, 'annotation': model.annotation,
+                                     'notes': model.notes})),
+        'reaction_ids': strings(rxn.id for rxn in model.reactions),
+        'reaction_names': strings(rxn.name for rxn in model.reactions),
+        'reaction_subsystems': strings(rxn.subsystem for rxn in model.reactions),
+        'reaction_annotations': dicts(rxn.annotation for rxn in model.reactions),
+        'reaction_notes': dicts(rxn.notes for rxn in model.reactions),
+        'gene_rules': strings(rxn.gene_reaction_rule for rxn in model.reactions),
+        'lower_bounds': np.array([rxn.lower_bound for rxn in model.reactions], dtype=float),
+        'upper_bounds': np.array([rxn.upper_bound for rxn in model.reactions], dtype=float),
+        'objective': np.array([objective.get(rxn.id, 0) for rxn in model.reactions], dtype=float),
+        'metabolite_ids': strings(met.id for met in model.metabolites),
+        'metabolite_names': strings(met.name for met in model.metabolites),
+        'metabolite_formulas': strings(met.formula for met in model.metabolites),
+        'metabolite_compartments': strings(met.compartment for met in model.metabolites),
+        # nan if the charge isn't set
+        'metabolite_charges': np.array([np.nan if met.charge is None else met.charge for met in model.metabolites],
+                                       dtype=float),
+        'metabolite_annotations': dicts(met.annotation for met in model.metabolites),
+        'metabolite_notes': dicts(met.notes for met in model.metabolites),
+        'gene_ids': strings(gene.id for gene in model.genes),
+        'gene_names': strings(gene.name for gene in model.genes),
+        'gene_annotations': dicts(gene.annotation for gene in model.genes),
+        'gene_notes': dicts(gene.notes for gene in model.genes),
+        'compartment_ids': strings(model.compartments.keys()),
+        'compartment_names': strings(model.compartments.values()),
+        'rows': np.array(rows, dtype=np.int64),
+        'cols': np.array(cols, dtype=np.int64),
+        'values': np.array(values, dtype=float),
+    }
+
+
+def to_cobra(form):
+    """rebuilds the cobra model from its compact form. Metabolites and reactions keep their order"""
+    import cobra
+    meta = json.loads(str(form['meta']))
+    model = cobra.Model(meta['id'] or None, name=meta['name'] or None)
+    model.annotation, model.notes = meta['annotation'], meta['notes']
+    model.compartments = dict(zip(form['compartment_ids'].tolist(), form['compartment_names'].tolist()))
+    metabolites = [cobra.Metabolite(met_id, formula=formula or None, name=name, compartment=compartment or None,
+                                    charge=None if np.isnan(charge) else int(charge) if charge.is_integer() else charge)
+                   for met_id, name, formula, compartment, charge in zip(form['metabolite_ids'].tolist(),
+                                                                         form['metabolite_names'].tolist(),
+                                                                         form['metabolite_formulas'].tolist(),
+                                                                         form['metabolite_compartments'].tolist(),
+                                                                         form['metabolite_charges'].tolist())]
+    _set_dicts(metabolites, form['metabolite_annotations'], form['metabolite_notes'])
+    model.add_metabolites(metabolites)
+
+    stoichiometry = [{} for _ in range(len(form['reaction_ids']))]
+    for row, col, value in zip(form['rows'].tolist(), form['cols'].tolist(), form['values'].tolist()):
+        stoichiometry[col][metabolites[row]] = value
+    reactions = []
+    for rxn_id, name, subsystem, rule, lower, upper, coefficients in zip(form['reaction_ids'].tolist(),
+                                                                         form['reaction_names'].tolist(),
+                                                                         form['reaction_subsystems'].tolist(),
+                                                                         form['gene_rules'].tolist(),
+                                                                         form['lower_bounds'].tolist(),
+                                                                         form['upper_bounds'].tolist(),
+                                                                         stoichiometry):
+        rxn = cobra.Reaction(rxn_id, name=name, subsystem=subsystem, lower_bound=lower, upper_bound=upper)
+        rxn.add_metabolites(coefficients)
+        rxn.gene_reaction_rule = rule
+        reactions.append(rxn)
+    _set_dicts(reactions, form['reaction_annotations'], form['reaction_notes'])
+    model.add_reactions(reactions)
+    # genes that are not part of any gene rule
+    missing_genes = [cobra.Gene(gene_id) for gene_id in form['gene_ids'].tolist() if gene_id not in model.genes]
+    for gene in missing_genes:
+        gene._model = model
+    model.genes.extend(missing_genes)
+    genes = [model.genes.get_by_id(gene_id) for gene_id in form['gene_ids'].tolist()]
+    for gene, name in zip(genes, form['gene_names'].tolist()):
+        gene.name = name
+    _set_dicts(genes, form['gene_annotations'], form['gene_notes'])
+
+    model.objective = {rxn: coefficient for rxn, coefficient in zip(model.reactions, form['objective'].tolist())
+                       if coefficient}
+    model.objective_direction = meta['direction']
+    return model
+
+
+def _set_dicts(items, annotations, notes):
+    """annotations and notes (json, empty if there were none) of metabolites, reactions or genes"""
+    for item, annotation, note in zip(items, annotations.tolist(), notes.tolist()):
+        item.annotation = json.loads(annotation) if annotation else {}
+        item.notes = json.loads(note) if note else {}
+
+
+def counts(form):
+    """number of reactions, metabolites and genes and the objective reaction (if there is exactly one)"""
+    objective = form['reaction_ids'][np.flatnonzero(form['objective'])].tolist()
+    return {'reactions': len(form['reaction_ids']), 'metabolites': len(form['metabolite_ids']),
+            'genes': len(form['gene_ids']), 'objective_expression': objective[0] if len(objective) == 1 else None}
+
+
+def load(digest):
+    """the compact form of a model or None"""
+    try:
+        with np.load(path_for(digest), allow_pickle=False) as data:
+            form = {key: data[key] for key in data.files}
+    except (OSError, ValueError, KeyError):
+        return None
+    if json.loads(str(form['meta'])).get('version') != PARSED_MODEL_VERSION:
+        return None
+    return form
+
+
+def store(digest, model):
+    """stores the compact form of a cobra model, written to a temporary file first so readers never see a partial
+    file"""
+    os.makedirs(cache_root(), exist_ok=True)
+    form = from_cobra(model)
+    fd, tmp = tempfile.mkstemp(dir=cache_root(), suffix='.npz')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez_compressed(f, **form)
+        os.replace(tmp, path_for(digest))
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return form
+
+
+def parse(fpath, document=None):
+    """cobra model of a file. An SBML document already read by libsbml is converted without reading the file again,
+    through the converter behind cobra.io.read_sbml_model (private in cobra, the file is read if it is missing)"""
+    import cobra
+    if document is not None:
+        try:
+            from cobra.io.sbml import _sbml_to_model
+        except ImportError:
+            pass
+        else:
+            return _sbml_to_model(document)
+    extension = os.path.splitext(fpath)[1].lower()
+    if extension not in LOADERS:
+        raise ValueError(f'Unsupported model file {os.path.basename(fpath)}')
+    return getattr(cobra.io, LOADERS[extension])(fpath)
+
+
+def ensure(fpath, digest=None, document=None):
+    """compact form of the model file, parsed and stored if it isn't yet. Returns digest and form"""
+    if digest is None:
+        digest = file_digest(fpath)
+    form = load(digest)
+    if form is None:
+        form = store(digest, parse(fpath, document))
+    return digest, form
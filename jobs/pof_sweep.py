@@ -0,0 +1,65 @@
+from decimal import Decimal, InvalidOperation, localcontext
+import numpy as np
+
+"""Mutation rate sweeps. PoFcalc runs once with the job's own mutation rate and its output already holds everything
+that doesn't depend on the rate: the number of lethal and possible cut sets per cardinality (result table) and the
+final PoF as a polynomial in the mutation rate p ('Final PoF(d0=r) = 1p + 2p^2 - 3p^3 + 1p^4'). Both are evaluated
+for all rates of the sweep here, the table in one vectorized pass over rates x cardinalities.
+
+The coefficients of the polynomial alternate in sign and grow like binomial coefficients of the number of reactions,
+so it is evaluated in decimal arithmetic with enough digits to absorb the cancellation instead of in float64."""
+
+GUARD_DIGITS = 30
+
+
+def accumulate(lethal, possible, rates):
+    """accumulated PoF per cardinality (rates x cardinalities) from the 'lethal CS' and 'possible CS' columns of a
+    result table (d = 1, 2, ..). The number of reactions is the number of possible sets of size 1"""
+    lethal = np.asarray(lethal, dtype=float)
+    possible = np.asarray(possible, dtype=float)
+    rates = np.asarray(rates, dtype=float)[:, None]
+    n_reactions = possible[0]
+    d = np.arange(1, len(possible) + 1)
+    fraction = np.divide(lethal, possible, out=np.zeros_like(lethal), where=possible > 0)
+    weights = possible * rates ** d * (1 - rates) ** np.maximum(n_reactions - d, 0)
+    return np.cumsum(weights * fraction, axis=1)
+
+
+def parse_polynomial(line):
+    """coefficients {degree: Decimal} of a 'Final PoF(d0=r) = ...' line of PoFcalc, None if it isn't a polynomial"""
+    terms = line.split('=')[-1].split()
+    if not any('p' in term for term in terms):
+        return None
+    coefficients = {}
+    sign = ''
+    try:
+        for term in terms:
+            if term in ('+', '-'):
+                sign = term
+                continue
+            coefficient, p, exponent = term.partition('p')
+            degree = (int(exponent.lstrip('^')) if exponent else 1) if p else 0
+            # no arithmetic, it would round the coefficient to the precision of the default context
+            coefficients[degree] = Decimal(sign + (coefficient or '1'))
+            sign = ''
+    except (ValueError, InvalidOperation):
+        return None
+    return coefficients
+
+
+def evaluate_polynomial(coefficients, rates):
+    """value of the polynomial for every mutation rate (float list)"""
+    if not coefficients:
+        return [0.] * len(rates)
+    degree = max(coefficients)
+    largest = max(abs(c) for c in coefficients.values())
+    with localcontext() as context:
+        context.prec = max(largest.adjusted(), 0) + GUARD_DIGITS
+        values = []
+        for rate in rates:
+            p = Decimal(float(rate))
+            value = Decimal(0)
+            for k in range(degree, -1, -1):
+                value = value * p + coefficients.get(k, 0)
+            values.append(float(value))
+    return values
@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.core.cache import caches
+import socket
+import signal
+import os
+
+"""Registry of the live subprocesses of running jobs, replaces the global current_job/running_task_pid cache keys so
+several jobs can run at the same time on one or more hosts. Entries are stored per job in the pipeline cache
+(process_registry_<job id>) as {host: {task id: {pid: start time}}}. A process is only signalled by the host it runs
+on and only if its start time still matches, so a recycled pid never gets killed. Processes on other hosts are
+cancelled by the supervisor of their host (see supervisor.py)"""
+
+HOST = socket.gethostname()
+
+
+def pipeline_cache():
+    """cache of the state the hosts share (pipeline chains, running stages, process registry, cost model),
+    PIPELINE_CACHE is an alias of settings.CACHES that all hosts reach (the database cache), not the host-local
+    'default'"""
+    return caches[getattr(settings, 'PIPELINE_CACHE', 'db')]
+
+
+def _key(job_id):
+    return f'process_registry_{job_id}'
+
+
+def start_time(pid):
+    """start time of a process in clock ticks after boot (linux), None if it is not running or /proc is missing"""
+    try:
+        with open(f'/proc/{pid}/stat', 'r') as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # the command name (2nd field) may contain spaces, the start time is the 22nd field
+    return int(stat[stat.rindex(')') + 2:].split()[19])
+
+
+def entries(job_id):
+    return pipeline_cache().get(_key(job_id), {})
+
+
+def register(job_id, task_id, pid):
+    registry = entries(job_id)
+    registry.setdefault(HOST, {}).setdefault(task_id, {})[pid] = start_time(pid)
+    pipeline_cache().set(_key(job_id), registry, timeout=None)
+
+
+def unregister(job_id, task_id):
+    """removes the processes of a finished task on this host"""
+    registry = entries(job_id)
+    if task_id not in registry.get(HOST, {}):
+        return
+    del registry[HOST][task_id]
+    if not registry[HOST]:
+        del registry[HOST]
+    if registry:
+        pipeline_cache().set(_key(job_id), registry, timeout=None)
+    else:
+        pipeline_cache().delete(_key(job_id))
+
+
+def clear(job_id):
+    pipeline_cache().delete(_key(job_id))
+
+
+def kill(job_id, sig=signal.SIGTERM, task_id=None, group=False):
+    """sends sig to the registered processes of a job (or only those of task_id) that run on this host, with group
+    to their whole process group (processes started by the supervisor lead their own group).
+    Returns the pids that got signalled"""
+    killed = []
+    for task, processes in entries(job_id).get(HOST, {}).items():
+        if task_id is not None and task != task_id:
+            continue
+        for pid, started in processes.items():
+            if start_time(pid) != started:
+                continue  # finished, pid possibly recycled by another process
+            try:
+                if group:
+                    os.killpg(pid, sig)
+                else:
+                    os.kill(pid, sig)
+                killed.append(pid)
+            except ProcessLookupError:
+                pass
+    return killed
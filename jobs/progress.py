@@ -0,0 +1,117 @@
+from django.conf import settings
+from .models import SubTask
+from . import cost_model, events
+import time
+import re
+
+"""Live progress of the running stage of a job. PoFcalc draws a progress bar ('[###   ] 42%' redrawn with
+backspaces, no newline until it is done), defigueiredo reports the cardinality it enumerates. The output of the
+subprocess is parsed while it streams (supervisor.run) into a progress record of the SubTask (SubTask.progress),
+written and pushed to the event stream of the job (events.py) at most every PROGRESS_UPDATE_INTERVAL seconds. The ETA
+is computed when the record is read: from the rate of the progress so far, or the predicted runtime of the stage
+(cost_model.py) while there is none"""
+
+PERCENT = re.compile(r'(\d{1,3})%')
+CARDINALITY = re.compile(r'\b(?:cardinality|card\.?|size|d)\s*[=:]?\s*(\d+)\b', re.IGNORECASE)
+MCS_COUNT = re.compile(r'(\d+)\s+(?:MCS|minimal cut ?sets?|cut ?sets?)\b', re.IGNORECASE)
+
+
+def update_interval():
+    return getattr(settings, 'PROGRESS_UPDATE_INTERVAL', 5)
+
+
+class ProgressTracker:
+    """parses the output of a stage into its progress record and stores it at a bounded rate"""
+    def __init__(self, task_id, stage, max_cardinality=None):
+        self.task_id = task_id
+        self.interval = update_interval()
+        self.record = {'stage': stage, 'percent': None, 'cardinality': None, 'max_cardinality': max_cardinality,
+                       'mcs': None, 'started': time.time(), 'updated': None}
+        self.changed = False
+        self.last_write = 0.0
+        self.owner = None  # job and user id of the SubTask, looked up with the first write
+
+    def feed_text(self, text):
+        """raw output (progress bars don't end their lines)"""
+        percents = PERCENT.findall(text)
+        if percents:
+            self.update(percent=min(100, int(percents[-1])))
+
+    def feed_line(self, line):
+        """a line of output reporting the cardinality and/or the number of MCS"""
+        cardinality, count = CARDINALITY.search(line), MCS_COUNT.search(line)
+        fields = {}
+        if cardinality:
+            fields['cardinality'] = int(cardinality.group(1))
+            if self.record['max_cardinality']:
+                # MCS of cardinality d are enumerated after all smaller ones, the larger ones take the longest
+                fields['percent'] = min(99, int(100 * (fields['cardinality'] - 1) / self.record['max_cardinality']))
+        if count:
+            fields['mcs'] = int(count.group(1))
+        if fields:
+            self.update(**fields)
+
+    def update(self, **fields):
+        for key, value in fields.items():
+            if self.record[key] != value:
+                self.record[key] = value
+                self.changed = True
+        if self.changed and time.monotonic() - self.last_write >= self.interval:
+            self.write()
+
+    def write(self):
+        self.record['updated'] = time.time()
+        SubTask.objects.filter(task_id=self.task_id).update(progress=dict(self.record))
+        self.changed, self.last_write = False, time.monotonic()
+        if self.owner is None:
+            self.owner = SubTask.objects.filter(task_id=self.task_id).values_list('job_id', 'user_id').first() or ()
+        if self.owner:
+            events.publish_progress(*self.owner, dict(self.record))
+
+    def finish(self):
+        """stores the last state, e.g. when the process exited"""
+        if self.changed:
+            self.write()
+
+
+def stage_eta(record, predicted_runtime=None, now=None):
+    """remaining seconds of a running stage, None if unknown"""
+    now = now or time.time()
+    elapsed = now - record['started'] if record and record.get('started') else None
+    percent = record.get('percent') if record else None
+    if elapsed is not None and percent:
+        return max(0.0, elapsed * (100 - percent) / percent)
+    if predicted_runtime is not None:
+        return max(0.0, predicted_runtime - (elapsed or 0.0))
+    return None
+
+
+def job_progress(job, now=None):
+    """progress of the stages of a job and the ETA of the job: the running stage and the predicted runtimes of the
+    stages that did not start yet"""
+    now = now or time.time()
+    subtasks = list(SubTask.objects.filter(job=job).order_by('id').values('name', 'progress', 'duration',
+                                                                            'predicted_runtime'))
+    stages, eta = [], 0.0
+    for subtask in subtasks:
+        running = subtask['duration'] is None and not job.is_finished
+        stage = {'name': subtask['name'], 'progress': subtask['progress'], 'running': running, 'eta': None}
+        if running:
+            stage['eta'] = stage_eta(subtask['progress'], subtask['predicted_runtime'], now)
+            if stage['eta'] is None:
+                eta = None
+            elif eta is not None:
+                eta += stage['eta']
+        stages.append(stage)
+
+    if job.is_finished:
+        return {'stages': stages, 'eta': 0.0}
+    started = {subtask['name'] for subtask in subtasks}
+    pending = [stage for stage in cost_model.PRIOR if stage not in started]
+    if pending and eta is not None:
+        try:
+            predicted = cost_model.predict(job)
+            eta += sum(predicted[stage] for stage in pending)
+        except Exception:
+            eta = None
+    return {'stages': stages, 'eta': eta}
@@ -0,0 +1,187 @@
+from django.conf import settings
+from django.utils import timezone
+from datetime import timedelta
+from .models import Job, CachedResult
+import hashlib
+import shutil
+import json
+import os
+
+"""Content-addressed result cache. Jobs are keyed by the hash of their (normalized) model file and the parameters
+that influence the pipeline. A finished job stores its artifacts under RESULT_CACHE_ROOT/<key>/, later submissions
+with the same key are completed by copying these artifacts instead of running the pipeline again"""
+
+# Job fields that change the result of the pipeline
+CACHE_PARAMS = ['compression', 'cardinality_mcs', 'cardinality_pof', 'make_consistent', 'mutation_rate',
+                'mutation_rate_sweep']
+
+# Job fields that get copied from the cache entry on a hit
+CACHE_FIELDS = ['result', 'reactions', 'metabolites', 'genes', 'objective_expression']
+
+# model formats whose lines are normalized for the digest, other files (.mat, .zip) are hashed as they are
+TEXT_EXTENSIONS = ['.xml', '.sbml', '.json']
+CHUNK_SIZE = 1 << 20
+
+
+def cache_root():
+    return getattr(settings, 'RESULT_CACHE_ROOT', os.path.join(settings.MEDIA_ROOT, 'result_cache'))
+
+
+def file_digest(fpath):
+    """sha256 of the model content. For text formats (TEXT_EXTENSIONS) line endings and leading/trailing whitespace of
+    every line are normalized so that the same model saved by different editors/OSes maps to the same digest, binary
+    files are hashed raw in chunks of CHUNK_SIZE"""
+    sha = hashlib.sha256()
+    with open(fpath, 'rb') as f:
+        if os.path.splitext(fpath)[1].lower() in TEXT_EXTENSIONS:
+            for line in f:
+                line = line.strip()
+                if line:
+                    sha.update(line)
+                    sha.update(b'\n')
+        else:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                sha.update(chunk)
+    return sha.hexdigest()
+
+
+def cache_key(job, model_digest=None):
+    """combines model digest and job parameters to the key of the result cache"""
+    if model_digest is None:
+        model_digest = file_digest(job.sbml_file.path)
+    params = {p: getattr(job, p) for p in CACHE_PARAMS}
+    params['model'] = model_digest
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def directory_size(path):
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for file in files:
+            try:
+                total += os.path.getsize(os.path.join(root, file))
+            except OSError:
+                pass
+    return total
+
+
+def lookup(key):
+    """returns the CachedResult for key or None. Entries whose files have gone missing are dropped"""
+    if not getattr(settings, 'RESULT_CACHE_ENABLED', True):
+        return None
+    entry = CachedResult.objects.filter(key=key).first()
+    if entry is None:
+        return None
+    if not os.path.isdir(entry.path):
+        entry.delete()
+        return None
+    return entry
+
+
+def _rename(fname, old_prefix, new_prefix):
+    """artifacts are named after the model (<model>.ext, <model>_.., result_table_<model>.csv,
+    sweep_table_<model>.csv) - swap the model name if the resubmitted file was named differently. Other files (e.g.
+    chg_proto.txt) are kept even if they happen to start with the model name"""
+    if old_prefix == new_prefix:
+        return fname
+    for table in ('result_table_', 'sweep_table_'):
+        if fname == f'{table}{old_prefix}.csv':
+            return f'{table}{new_prefix}.csv'
+    for separator in ('.', '_'):
+        if fname.startswith(old_prefix + separator):
+            return new_prefix + fname[len(old_prefix):]
+    return fname
+
+
+def copy_artifacts(src, dst, old_prefix, new_prefix, skip=(), link=False):
+    """copies all artifacts of a job directory (without logs and the model file itself). With link the files are
+    hardlinked where possible (same file system), the artifacts of a finished job aren't written to anymore"""
+    copied = []
+    for fname in os.listdir(src):
+        fpath = os.path.join(src, fname)
+        if fname in skip or not os.path.isfile(fpath):
+            continue
+        target = os.path.join(dst, _rename(fname, old_prefix, new_prefix))
+        try:
+            if not link:
+                raise OSError()
+            os.link(fpath, target)
+        except OSError:
+            shutil.copyfile(fpath, target)
+        copied.append(target)
+    return copied
+
+
+def store(job_id):
+    """stores the artifacts of a finished job in the cache. Does nothing if the key is already cached"""
+    if not getattr(settings, 'RESULT_CACHE_ENABLED', True):
+        return None
+    job = Job.objects.get(id=job_id)
+    if job.status != 'Done' or not job.cache_key or lookup(job.cache_key):
+        return None
+
+    path = os.path.dirname(job.sbml_file.path)
+    model_name = os.path.splitext(os.path.basename(job.sbml_file.path))[0]
+    target = os.path.join(cache_root(), job.cache_key)
+    os.makedirs(target, exist_ok=True)
+    copy_artifacts(path, target, model_name, model_name, skip=(os.path.basename(job.sbml_file.path),))
+
+    result_table = None
+    if job.result_table:
+        result_table = os.path.basename(job.result_table)
+    sweep_table = None
+    if job.sweep_table:
+        sweep_table = os.path.basename(job.sweep_table)
+
+    entry, _ = CachedResult.objects.get_or_create(key=job.cache_key, defaults={
+        'path': target,
+        'model_name': model_name,
+        'result_table': result_table,
+        'sweep_table': sweep_table,
+        'size': directory_size(target),
+        'source_job': job.id,
+        **{f: getattr(job, f) for f in CACHE_FIELDS}
+    })
+    evict()
+    return entry
+
+
+def restore(job, entry):
+    """completes job from the cache entry: links the artifacts into the job folder and marks the job as done. Runs in
+    the restore_cached_result task, not in the request that submitted the job"""
+    path = os.path.dirname(job.sbml_file.path)
+    model_name = os.path.splitext(os.path.basename(job.sbml_file.path))[0]
+    copy_artifacts(entry.path, path, entry.model_name, model_name, link=True)
+
+    result_table = None
+    if entry.result_table:
+        result_table = os.path.join(path, _rename(entry.result_table, entry.model_name, model_name))
+    sweep_table = None
+    if entry.sweep_table:
+        sweep_table = os.path.join(path, _rename(entry.sweep_table, entry.model_name, model_name))
+
+    now = timezone.now()
+    Job.objects.filter(id=job.id).update(status='Done', is_finished=True, start_date=now, finished_date=now,
+                                         duration='00:00:00', model_name=model_name, result_table=result_table,
+                                         sweep_table=sweep_table, cached=True, **{f: getattr(entry, f) for f in CACHE_FIELDS})
+    CachedResult.objects.filter(id=entry.id).update(last_used=now, hits=entry.hits + 1)
+
+
+def evict():
+    """removes entries older than DAYS_UNTIL_JOB_DELETE and then the least recently used entries until the cache
+    fits into RESULT_CACHE_MAX_SIZE (bytes)"""
+    expired = timezone.now() - timedelta(days=settings.DAYS_UNTIL_JOB_DELETE)
+    for entry in CachedResult.objects.filter(created__lt=expired):
+        shutil.rmtree(entry.path, ignore_errors=True)
+        entry.delete()
+
+    max_size = getattr(settings, 'RESULT_CACHE_MAX_SIZE', None)
+    if max_size is None:
+        return
+    total = 0
+    for entry in CachedResult.objects.order_by('-last_used'):
+        if total + entry.size > max_size:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            entry.delete()
+        else:
+            total += entry.size
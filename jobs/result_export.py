@@ -0,0 +1,146 @@
+from django.conf import settings
+import importlib.util
+import tempfile
+import csv
+
+"""Bulk export of the results of a user's jobs. The jobs are read from the database in chunks of EXPORT_CHUNK_SIZE
+(QuerySet.iterator) and written row by row: CSV is streamed to the response, Excel (xlsxwriter in constant memory
+mode) and Parquet (pyarrow, optional) are written to a temporary file that is served once complete. With tables, the
+result table of every job (PoF per cardinality, TABLE_COLUMNS) is joined in, one row per cardinality"""
+
+FIELDS = ['id', 'model_name', 'result', 'cardinality_mcs', 'cardinality_pof', 'compression', 'make_consistent',
+          'mutation_rate', 'reactions', 'metabolites', 'genes', 'objective_expression', 'duration', 'status']
+FORMATS = ['csv', 'xlsx', 'parquet']
+CONTENT_TYPES = {'csv': 'text/csv',
+                 'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                 'parquet': 'application/vnd.apache.parquet'}
+EXCEL_MAX_ROWS = 1048576
+# columns of the result table the PoFcalc task writes
+TABLE_COLUMNS = ['d', 'weight', 'F(d)', 'weighted F(d)', 'acc. weighted F(d)', 'lethal CS', 'possible CS']
+
+
+def chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def parquet_available():
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def columns(with_tables=False):
+    return FIELDS + TABLE_COLUMNS if with_tables else list(FIELDS)
+
+
+def table_rows(path):
+    """the rows of a result table (csv), in the order of TABLE_COLUMNS"""
+    try:
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                yield [row.get(column) for column in TABLE_COLUMNS]
+    except OSError:  # deleted meanwhile
+        return
+
+
+def rows(jobs, with_tables=False):
+    """rows of the jobs of a queryset, read in chunks. With tables one row per row of the job's result table, jobs
+    without a table get a single row"""
+    for values in jobs.order_by('id').values_list(*FIELDS, 'result_table').iterator(chunk_size=chunk_size()):
+        job, table = list(values[:-1]), values[-1]
+        if not with_tables:
+            yield job
+            continue
+        empty = True
+        for row in table_rows(table) if table else ():
+            empty = False
+            yield job + row
+        if empty:
+            yield job + [None] * len(TABLE_COLUMNS)
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def typed(rows, with_tables):
+    """the numbers of the result tables as numbers (the csv export keeps them as written by PoFcalc)"""
+    if not with_tables:
+        yield from rows
+        return
+    n = len(FIELDS)
+    for row in rows:
+        d = _number(row[n])
+        yield row[:n] + [int(d) if d is not None else None] + [_number(value) for value in row[n + 1:]]
+
+
+class _Echo:
+    """file-like object of csv.writer, returns the formatted line instead of writing it"""
+    def write(self, value):
+        return value
+
+
+def csv_stream(jobs, with_tables=False, batch=500):
+    writer = csv.writer(_Echo(), delimiter=';')
+    yield writer.writerow(columns(with_tables))
+    lines = []
+    for row in rows(jobs, with_tables):
+        lines.append(writer.writerow(row))
+        if len(lines) >= batch:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def write_xlsx(jobs, with_tables, file):
+    import xlsxwriter
+    workbook = xlsxwriter.Workbook(file, {'constant_memory': True})
+    header, sheet, index = columns(with_tables), None, EXCEL_MAX_ROWS
+    for row in typed(rows(jobs, with_tables), with_tables):
+        if index == EXCEL_MAX_ROWS:
+            # the rows of a sheet are limited, the export continues on the next one
+            sheet, index = workbook.add_worksheet(), 1
+            sheet.write_row(0, 0, header)
+        sheet.write_row(index, 0, row)
+        index += 1
+    if sheet is None:
+        workbook.add_worksheet().write_row(0, 0, header)
+    workbook.close()
+
+
+def write_parquet(jobs, with_tables, file):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    types = {'id': pa.int64(), 'cardinality_mcs': pa.int64(), 'cardinality_pof': pa.int64(), 'reactions': pa.int64(),
+             'metabolites': pa.int64(), 'genes': pa.int64(), 'compression': pa.bool_(), 'make_consistent': pa.bool_(),
+             'mutation_rate': pa.float64(), 'd': pa.int64()}
+    schema = pa.schema([(name, types.get(name, pa.float64() if name in TABLE_COLUMNS else pa.string()))
+                        for name in columns(with_tables)])
+
+    def write(writer, batch):
+        writer.write_table(pa.Table.from_arrays([pa.array(column, type=field.type)
+                                                 for column, field in zip(zip(*batch), schema)], schema=schema))
+
+    with pq.ParquetWriter(file, schema) as writer:
+        batch = []
+        for row in typed(rows(jobs, with_tables), with_tables):
+            batch.append(row)
+            if len(batch) >= chunk_size():
+                write(writer, batch)
+                batch = []
+        if batch:
+            write(writer, batch)
+
+
+def export_file(jobs, format, with_tables=False):
+    """writes the export to a temporary file (removed when it is closed) and returns it, rewound"""
+    file = tempfile.TemporaryFile()
+    try:
+        (write_xlsx if format == 'xlsx' else write_parquet)(jobs, with_tables, file)
+    except Exception:
+        file.close()
+        raise
+    file.seek(0)
+    return file
@@ -1,7 +1,8 @@
 from django.db.models.signals import post_save, pre_delete
 from django.dispatch import receiver
 from jobs.models import Job, SubTask
-from .tasks import execute_pipeline, revoke_job
+from .tasks import revoke_job, prepare_pipeline, validate_model, restore_cached_result
+from . import result_cache, process_registry, cost_model, events, cpu_allocator
 from django_celery_results.models import TaskResult
 from celery.signals import task_postrun, after_task_publish, task_prerun, task_failure, celeryd_init, task_revoked
 import os
@@ -10,7 +11,6 @@ import logging
 from time import time
 import datetime
 import sys
-from django.core.cache import cache
 from django.conf import settings
 from celery.result import AsyncResult
 from django.utils import timezone
@@ -27,32 +27,40 @@ timer = {}  # will be used for tracking task execution times
 @receiver(post_save, sender=Job)
 def start_job(sender, instance, created, **kwargs):
     """gets triggered when a job is saved (aka when the user submits a job)
-    sends the entire task pipeline to the message queue for execution"""
+    sends the job to the validation queue, which dispatches the task pipeline of a valid model"""
     if created:  # to avoid recursive calls
         pass
 
-    sender.objects.filter(id=instance.id).update(status='Queued')
+    # identical model + parameters already computed? then we complete the job from the result cache
+    digest = result_cache.file_digest(instance.sbml_file.path)
+    key = result_cache.cache_key(instance, model_digest=digest)
+    sender.objects.filter(id=instance.id).update(cache_key=key, model_digest=digest)
+    instance.model_digest = digest
+    entry = result_cache.lookup(key)
+    if entry is not None:
+        sender.objects.filter(id=instance.id).update(status='Queued')
+        events.publish_job(instance.id)
+        restore_cached_result.apply_async(kwargs={'job_id': instance.id, 'entry_id': entry.id},
+                                          queue=settings.VALIDATION_QUEUE)
+        return
 
-    # get params
-    id = instance.id
-    compression_checked = instance.compression
-    cardinality_defi = instance.cardinality_mcs
-    cardinality_pof = instance.cardinality_pof
-    make_consistent = instance.make_consistent
-    mutation_rate = instance.mutation_rate
+    if instance.skip_validation:
+        # the model is parsed for its counts before the pipeline is dispatched, not in this request
+        sender.objects.filter(id=instance.id).update(status='Queued')
+        events.publish_job(instance.id)
+        prepare_pipeline.apply_async(kwargs={'job_id': instance.id}, queue=settings.VALIDATION_QUEUE)
+        return
 
-    # Send the task to the celery worker
-    execute_pipeline.apply_async(kwargs={'job_id':id,
-                                         'compression_checked':compression_checked,
-                                         'cardinality_defi':cardinality_defi,
-                                         'cardinality_pof':cardinality_pof,
-                                         'make_consistent':make_consistent,
-                                         'mutation_rate':mutation_rate},
-                                 queue='jobs')
+    # the form only checked the structure of the file, the full validation runs on the validation queue and
+    # dispatches the pipeline of a valid model
+    sender.objects.filter(id=instance.id).update(status='Validating')
+    events.publish_job(instance.id)
+    validate_model.apply_async(kwargs={'job_id': instance.id}, queue=settings.VALIDATION_QUEUE)
 
 
 #  these tasks are ignored by the signal handlers
-excluded_tasks = ['jobs.tasks.cleanup_expired_results', 'update_db', 'result_email', 'abort_task']
+excluded_tasks = ['jobs.tasks.cleanup_expired_results', 'update_db', 'result_email', 'abort_task', 'validate_model',
+                  'restore_cached_result', 'prepare_pipeline']
 if not settings.DEBUG:
     excluded_tasks += ['execute_pipeline']
 
@@ -81,9 +89,6 @@ def task_prerun_handler(sender=None, task_id=None, task=None, *args, **kwargs):
 
     job_id = kwargs['kwargs']['job_id']
 
-    cache.set("current_task", task_id, timeout=None)
-    cache.set('current_job', job_id, timeout=None)
-
     job_qs = Job.objects.filter(id=job_id)
     job = job_qs.get()
 
@@ -93,9 +98,21 @@ def task_prerun_handler(sender=None, task_id=None, task=None, *args, **kwargs):
         return
     if job.status is not "Done" and job.status != 'Cancelled':
         job_qs.update(status="Started", is_finished=False)
+        if job.status != 'Started':
+            events.publish_job(job_id)
     else:
         return
 
+    if sender.name != 'execute_pipeline':
+        # the running stage of the job's pipeline, replaces the pid of the previous stage
+        process_registry.pipeline_cache().set(f'pipeline_{job_id}', {
+            'name': task.name,
+            'task_id': task_id,
+            'status': 'STARTED',
+            'pipeline_id': job.task_id_job,
+            'job_id': job_id
+        }, timeout=86400)
+
     fpath = job.sbml_file.path
     path = os.path.dirname(fpath)
     path_logs = os.path.join(path, 'logs')
@@ -141,7 +158,16 @@ def task_prerun_handler(sender=None, task_id=None, task=None, *args, **kwargs):
     if settings.DEBUG:
         logger.info(f'Starting task id {task_id} for task {task.name}')
 
-    SubTask.objects.create(job=job, user=job.user, task_id=task_id, name=task.name, logfile_path=logfilepath) # user_task_logfile_path
+    predicted_runtime = None
+    if task.name in cost_model.PRIOR:
+        try:
+            predicted_runtime = cost_model.predict_stage(job, task.name)
+        except Exception as e:
+            logger.warning(f'Could not predict the runtime of {task.name}: {repr(e)}')
+
+    SubTask.objects.create(job=job, user=job.user, task_id=task_id, name=task.name, logfile_path=logfilepath,
+                           predicted_runtime=predicted_runtime) # user_task_logfile_path
+    events.publish_stage(job_id, job.user_id, task.name, 'started')
 
 
 @task_postrun.connect
@@ -159,19 +185,23 @@ def task_postrun_handler(sender, task_id, task, retval, state, *args,  **kwargs)
     logger = get_task_logger(task_id)
     logger.info("%s ran for %s", task.__name__, str(datetime.timedelta(seconds=cost)))
 
-    SubTask.objects.filter(task_id=task_id).update(duration=str(datetime.timedelta(seconds=cost)))
+    SubTask.objects.filter(task_id=task_id).update(duration=str(datetime.timedelta(seconds=cost)),
+                                                   runtime=cost if cost >= 0 and state == 'SUCCESS' else None)
+    subtask = SubTask.objects.filter(task_id=task_id).values('job_id', 'user_id').first()
+    if subtask is not None:
+        events.publish_stage(subtask['job_id'], subtask['user_id'], task.name,
+                             'finished' if state == 'SUCCESS' else 'failed')
 
     for handler in logger.handlers:
         handler.flush()
         handler.close()
     logger.handlers = []
-    if task.__name__ == 'execute_pipeline':
-        cache.delete('running_job')
-        try:
-            job_id = kwargs['kwargs']['job_id']
-            Job.objects.filter(id=job_id).update(is_finished=True)
-        except:
-            pass
+    try:
+        process_registry.unregister(kwargs['kwargs']['job_id'], task_id)
+    except (KeyError, TypeError):
+        pass
+    # execute_pipeline only dispatches the chain, the job is finished by update_db_post_run, task_failure_handler
+    # or revoke_job
 
 
 @task_failure.connect
@@ -189,19 +219,19 @@ def task_failure_handler(sender=None, task_id=None, exception=None, *args, **kwa
     minutes, seconds = divmod(remainder, 60)
     duration = '{:02}:{:02}:{:02}'.format(int(hours), int(minutes), int(seconds))
     job.update(is_finished=True, duration=duration, finished_date=finished_date)
+    events.publish_job(task.job_id)
 
     logger = get_task_logger(task_id)
     logger.error(f'Task {task_id} failed: {exception}')
 
-    cache.delete('running_job')
-
 
 @celeryd_init.connect
 def worker_init(sender, instance, conf, options, **kwargs):
-    """this removes the lock on the worker (currently useless)"""
-    cache.delete('running_job')
     if settings.DEBUG:
         print(getpass.getuser())
+    # only the jobs of the queues this host consumes share its cores (thread_budget)
+    queues = options.get('queues') or [queue.name for queue in settings.CELERY_TASK_QUEUES]
+    cpu_allocator.register_queues(sender, queues.split(',') if isinstance(queues, str) else queues)
 
 
 @task_revoked.connect(sender="execute_pipeline")
@@ -213,6 +243,7 @@ def task_revoked_handler(request, terminated, signum, expired, *args, **kwargs):
     job = Job.objects.filter(id=job_id)
     job.update(status="Cancelled", is_finished=True)
     SubTask.objects.filter(task_id=request.id).update(status="Terminated")
+    events.publish_job(job_id)
     logger = get_task_logger(request.id)
     logger.warning(f'Task {request.task} has been flagged as revoked, with terminate={terminated}, '
                    f'signal {signum}, expired: {expired}')
@@ -0,0 +1,124 @@
+from django.conf import settings
+from .result_cache import directory_size
+import hashlib
+import shutil
+import json
+import time
+import os
+
+"""Stage-level artifact cache. Every pipeline stage up to mcs_to_binary produces the same files for the same inputs,
+so each stage keys its outputs by the hash of its input files (+ the parameters it gets passed) and copies them from
+STAGE_CACHE_ROOT/<stage>/<key>/ instead of running again. File names are stored with the model name replaced by a
+placeholder, so jobs with differently named files share the same entries"""
+
+# bump if the output of a stage changes for the same inputs (e.g. new script version)
+STAGE_CACHE_VERSION = 1
+
+MODEL_PLACEHOLDER = '{model}'
+META_FILE = 'stage_meta.json'
+CHUNK_SIZE = 1 << 20
+
+
+def cache_root():
+    return getattr(settings, 'STAGE_CACHE_ROOT', os.path.join(settings.MEDIA_ROOT, 'stage_cache'))
+
+
+def enabled():
+    return getattr(settings, 'STAGE_CACHE_ENABLED', True)
+
+
+def stage_key(stage, path, inputs, **params):
+    """sha256 over stage name, parameters and the content of all input files (relative to path)"""
+    sha = hashlib.sha256()
+    sha.update(json.dumps({'stage': stage, 'version': STAGE_CACHE_VERSION, 'params': params},
+                          sort_keys=True).encode('utf-8'))
+    for fname in inputs:
+        # only the content counts, file names differ between jobs. The size separates consecutive files
+        sha.update(str(os.path.getsize(os.path.join(path, fname))).encode('utf-8'))
+        with open(os.path.join(path, fname), 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _entry_path(stage, key):
+    return os.path.join(cache_root(), stage, key)
+
+
+def _stored_name(fname, model_name):
+    if fname.startswith(model_name):
+        return MODEL_PLACEHOLDER + fname[len(model_name):]
+    return fname
+
+
+def fetch(stage, key, path, model_name, outputs):
+    """copies the cached outputs of a stage into the job folder. Returns the stored meta data (dict) on a hit,
+    None if the stage has to run"""
+    if not enabled():
+        return None
+    entry = _entry_path(stage, key)
+    try:
+        with open(os.path.join(entry, META_FILE), 'r') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    stored = [_stored_name(fname, model_name) for fname in outputs]
+    if not all(os.path.isfile(os.path.join(entry, fname)) for fname in stored):
+        return None
+
+    for src, dst in zip(stored, outputs):
+        shutil.copyfile(os.path.join(entry, src), os.path.join(path, dst))
+    os.utime(entry)  # marks the entry as recently used for eviction
+    return meta
+
+
+def publish(stage, key, path, model_name, outputs, **meta):
+    """stores the outputs of a finished stage. Files get written to a temporary folder first and are moved in place
+    with a single rename, so concurrent jobs never see half written entries"""
+    if not enabled():
+        return
+    entry = _entry_path(stage, key)
+    if os.path.exists(entry):
+        return
+    tmp = f'{entry}.tmp{os.getpid()}'
+    os.makedirs(tmp, exist_ok=True)
+    try:
+        for fname in outputs:
+            shutil.copyfile(os.path.join(path, fname),
+                            os.path.join(tmp, _stored_name(fname, model_name)))
+        with open(os.path.join(tmp, META_FILE), 'w') as f:
+            json.dump(meta, f)
+        os.rename(tmp, entry)
+    except OSError:
+        # either a file is missing or another job published the same entry in the meantime
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def evict():
+    """removes entries that haven't been used for DAYS_UNTIL_JOB_DELETE and then the least recently used entries
+    until the stage cache fits into STAGE_CACHE_MAX_SIZE (bytes)"""
+    root = cache_root()
+    if not os.path.isdir(root):
+        return
+    expired = time.time() - settings.DAYS_UNTIL_JOB_DELETE * 86400
+    entries = []
+    for stage in os.listdir(root):
+        for key in os.listdir(os.path.join(root, stage)):
+            entry = os.path.join(root, stage, key)
+            mtime = os.path.getmtime(entry)
+            if mtime < expired:
+                shutil.rmtree(entry, ignore_errors=True)
+            else:
+                entries.append((mtime, entry))
+
+    max_size = getattr(settings, 'STAGE_CACHE_MAX_SIZE', None)
+    if max_size is None:
+        return
+    total = 0
+    for mtime, entry in sorted(entries, reverse=True):
+        size = directory_size(entry)
+        if total + size > max_size:
+            shutil.rmtree(entry, ignore_errors=True)
+        else:
+            total += size
@@ -0,0 +1,128 @@
+from django.conf import settings
+from collections import deque
+import codecs
+import gzip
+import logging
+import time
+import os
+
+"""Buffered logging of the output of the pipeline subprocesses. Tools like defigueiredo print millions of lines, so
+the output is read in chunks and written to the task log in batches (every SUBPROCESS_LOG_BATCH_LINES lines or
+SUBPROCESS_LOG_FLUSH_SECONDS) instead of one log record per line. The task log keeps the first
+SUBPROCESS_LOG_HEAD_LINES and the last SUBPROCESS_LOG_TAIL_LINES lines, longer output is stored in full next to it
+(<stage>.out.gz). The stages stream their subprocesses through the supervisor (supervisor.py), which reads the output in
+chunks of READ_SIZE and feeds it to an OutputLog"""
+
+READ_SIZE = 1 << 16
+
+
+def head_lines():
+    return getattr(settings, 'SUBPROCESS_LOG_HEAD_LINES', 2000)
+
+
+def tail_lines():
+    return getattr(settings, 'SUBPROCESS_LOG_TAIL_LINES', 2000)
+
+
+def batch_lines():
+    return getattr(settings, 'SUBPROCESS_LOG_BATCH_LINES', 500)
+
+
+def flush_seconds():
+    return getattr(settings, 'SUBPROCESS_LOG_FLUSH_SECONDS', 2)
+
+
+def logfile(logger):
+    """path of the file the task logger writes to, None if it has no file handler"""
+    for handler in logger.handlers:
+        if isinstance(handler, logging.FileHandler):
+            return handler.baseFilename
+    return None
+
+
+def full_log_path(path):
+    return f'{os.path.splitext(path)[0]}.out.gz'
+
+
+def clean(line):
+    return line.strip().strip('\"').replace(r'\n', '\n')
+
+
+class LineSplitter:
+    """splits chunks of a binary stream into decoded lines, a line split between two chunks is completed by the next"""
+    def __init__(self):
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.rest = ''
+
+    def decode(self, chunk):
+        return self.decoder.decode(chunk)
+
+    def split(self, text):
+        lines = (self.rest + text).split('\n')
+        self.rest = lines.pop()
+        return lines
+
+    def feed(self, chunk):
+        return self.split(self.decode(chunk))
+
+    def end(self):
+        rest, self.rest = self.rest + self.decoder.decode(b'', final=True), ''
+        return [rest] if rest else []
+
+
+class OutputLog:
+    """
+    writes the output lines of a subprocess to the task log
+    Args:
+        logger: task logger
+        on_line: callable, gets every (cleaned) line
+        include: callable, whether a line goes to the task log (default all)
+    """
+    def __init__(self, logger, on_line=None, include=None):
+        self.logger, self.on_line, self.include = logger, on_line, include
+        self.n_head, self.n_batch, self.interval = head_lines(), batch_lines(), flush_seconds()
+        self.path = logfile(logger)
+        self.head, self.batch, self.tail = [], [], deque(maxlen=tail_lines())
+        self.full, self.omitted, self.count = None, 0, 0
+        self.last_flush = time.monotonic()
+
+    def write(self, line):
+        line = clean(line)
+        self.count += 1
+        if self.on_line is not None:
+            self.on_line(line)
+        if self.include is not None and not self.include(line):
+            return
+        if self.full is not None:
+            self.full.write(line + '\n')
+        if len(self.head) < self.n_head:
+            self.head.append(line)
+            self.batch.append(line)
+        else:
+            if self.full is None and self.path:
+                # the output gets truncated, from now on it is stored in full
+                self.full = gzip.open(full_log_path(self.path), 'wt', compresslevel=3)
+                self.full.write('\n'.join(self.head) + '\n' + line + '\n')
+            if len(self.tail) == self.tail.maxlen:
+                self.omitted += 1
+            self.tail.append(line)
+        if self.batch and (len(self.batch) >= self.n_batch or time.monotonic() - self.last_flush >= self.interval):
+            self.flush()
+
+    def flush(self):
+        if self.batch:
+            self.logger.info('%s', '\n'.join(self.batch))
+        self.batch, self.last_flush = [], time.monotonic()
+
+    def close(self):
+        """writes the pending lines and the tail"""
+        self.flush()
+        if self.omitted:
+            stored = f', full output in {os.path.basename(full_log_path(self.path))}' if self.full else ''
+            self.logger.info(f'... {self.omitted} lines omitted{stored} ...')
+        if self.tail:
+            self.logger.info('%s', '\n'.join(self.tail))
+            self.tail.clear()
+        if self.full is not None:
+            self.full.close()
+            self.full = None
@@ -0,0 +1,149 @@
+from django.conf import settings
+from celery.worker.control import control_command
+from celery.contrib.abortable import AbortableAsyncResult
+from .custom_wraps import ExecutionAbortedError
+from .subprocess_log import OutputLog, LineSplitter, READ_SIZE
+from . import process_registry
+import tempfile
+import asyncio
+import signal
+import socket
+import os
+
+"""Supervisor of the stage subprocesses of a worker. A stage runs its command through run(): the process is started
+as the leader of its own process group on an asyncio loop, its output is streamed into the task log
+(subprocess_log.OutputLog) and the supervisor listens on a unix socket of the task (SUPERVISOR_SOCKET_DIR/<task
+id>.sock) for a cancel message. Cancelling a job pushes the cancellation: cancel_job() broadcasts the control command
+cancel_job to all workers, every host sends the message to the sockets of the job's tasks (process_registry.py) and
+the supervisor kills the process group right away. Nothing polls the result backend while a process runs"""
+
+CANCEL = b'cancel\n'
+
+
+def socket_dir():
+    return getattr(settings, 'SUPERVISOR_SOCKET_DIR', os.path.join(tempfile.gettempdir(), 'robustq_supervisor'))
+
+
+def socket_path(task_id):
+    return os.path.join(socket_dir(), f'{task_id}.sock')
+
+
+def _kill_group(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def _supervise(cmd_args, output, task_id, on_start, on_output, preexec_fn, cwd):
+    cancelled = asyncio.Event()
+    process = await asyncio.create_subprocess_exec(*cmd_args, stdout=asyncio.subprocess.PIPE,
+                                                   stderr=asyncio.subprocess.STDOUT, start_new_session=True,
+                                                   preexec_fn=preexec_fn, cwd=cwd)
+
+    async def on_connect(reader, writer):
+        if await reader.readline() == CANCEL:
+            cancelled.set()
+            _kill_group(process)
+            writer.write(b'ok\n')
+        writer.close()
+
+    os.makedirs(socket_dir(), exist_ok=True)
+    path = socket_path(task_id)
+    server = await asyncio.start_unix_server(on_connect, path=path)
+    try:
+        if on_start is not None:
+            on_start(process.pid)
+        splitter = LineSplitter()
+        while True:
+            chunk = await process.stdout.read(READ_SIZE)
+            if not chunk:
+                break
+            text = splitter.decode(chunk)
+            if on_output is not None:
+                on_output(text)
+            for line in splitter.split(text):
+                output.write(line)
+        for line in splitter.end():
+            output.write(line)
+        returncode = await process.wait()
+    finally:
+        if process.returncode is None:
+            # e.g. the soft time limit of the task was hit
+            _kill_group(process)
+        server.close()
+        if os.path.exists(path):
+            os.remove(path)
+    return returncode, cancelled.is_set()
+
+
+def run(cmd_args, logger, task_id, on_start=None, on_output=None, preexec_fn=None, cwd=None, on_line=None,
+        include=None):
+    """
+    runs the command of a stage under the supervisor
+    Args:
+        cmd_args: command line
+        logger: task logger
+        task_id: id of the task running the command
+        on_start: callable, gets the pid of the started process (e.g. to register it)
+        on_output: callable, gets the output as it is read, also lines that aren't finished yet (progress bars)
+        preexec_fn: passed to the subprocess (see cpu_allocator.pinning)
+        cwd: working directory of the subprocess
+        on_line, include: see subprocess_log.OutputLog
+
+    Returns: return code of the process. Raises ExecutionAbortedError if it got cancelled
+    """
+    output = OutputLog(logger, on_line, include)
+    try:
+        returncode, cancelled = asyncio.run(_supervise(cmd_args, output, task_id, on_start, on_output, preexec_fn,
+                                                       cwd))
+    finally:
+        output.close()
+    # killed from outside the supervisor (e.g. process_registry.kill), one look at the task state
+    if cancelled or (returncode < 0 and AbortableAsyncResult(task_id).is_aborted()):
+        raise ExecutionAbortedError('Task aborted by user')
+    return returncode
+
+
+def send_cancel(task_id):
+    """sends the cancel message to the supervisor of a task on this host, True if it was received"""
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(1)
+    try:
+        client.connect(socket_path(task_id))
+        client.sendall(CANCEL)
+        return client.recv(16) == b'ok\n'
+    except OSError:
+        return False
+    finally:
+        client.close()
+
+
+def cancel(job_id, task_id=None):
+    """cancels the processes of a job (or only those of task_id) on this host. Processes whose supervisor can't be
+    reached get their process group killed directly. Returns the ids of the cancelled tasks"""
+    cancelled = []
+    for task in list(process_registry.entries(job_id).get(process_registry.HOST, {})):
+        if task_id is not None and task != task_id:
+            continue
+        if send_cancel(task) or process_registry.kill(job_id, signal.SIGKILL, task_id=task, group=True):
+            cancelled.append(task)
+    return cancelled
+
+
+def cancel_job(job_id, task_id=None):
+    """cancels the processes of a job (or only those of task_id) on all hosts: on this one directly, the workers get
+    the control command cancel_job"""
+    from RobustQ.celery import app
+    cancelled = cancel(job_id, task_id)
+    try:
+        app.control.broadcast('cancel_job', arguments={'job_id': job_id, 'task_id': task_id})
+    except Exception:
+        pass  # broker not reachable, the processes on this host are cancelled anyway
+    return cancelled
+
+
+@control_command(name='cancel_job', args=[('job_id', int), ('task_id', str)], signature='<job_id> [task_id]')
+def cancel_job_command(state, job_id, task_id=None):
+    """remote control command of the workers, see cancel_job()"""
+    return {'ok': cancel(job_id, task_id)}
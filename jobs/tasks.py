@@ -1,32 +1,32 @@
 from __future__ import absolute_import, unicode_literals
 from celery import shared_task
-from .models import Job, SubTask
+from .models import Job, SubTask, CachedResult
 from RobustQ.celery import app
 import time
 from django.utils import timezone
 from datetime import timedelta
-import subprocess
 from celery.utils.log import get_task_logger
 import sys
 import os
 from shutil import copyfile
 import logging
 import numpy as np
-from django.core.cache import cache
 import shutil
 from celery import chain
 from celery.contrib.abortable import AbortableTask, AbortableAsyncResult
-import threading
 from .custom_wraps import revoke_chain_authority, ExecutionAbortedError
+from .validators import parse_mutation_rates
+from . import result_cache, stage_cache, process_registry, cpu_allocator, cost_model, parsed_model, pof_sweep, mcs_binary, network_compression, dual_system, upload_validation, supervisor, progress, events, chunked_upload
 from django.conf import settings
 from django.core.mail import send_mail
-import signal
 from celery.exceptions import SoftTimeLimitExceeded
 import pandas as pd
 
 
 BASE_DIR = os.getcwd()
 
+log = logging.getLogger(__name__)
+
 
 def revoke_job(job):
     # terminate the running and all subsequent tasks of the job
@@ -34,14 +34,15 @@ def revoke_job(job):
     if not task_id_job:
         # something went wrong
         Job.objects.filter(id=job.id).update(status="Cancelled", is_finished=True)
+        events.publish_job(job.id)
         return
 
     result = AbortableAsyncResult(task_id_job)
-    # calling abort() and/or revoke() on this result will result in a cascade of revokes of uncompleted tasks
-    # as in the execute_pipeline() task all chain tasks get called .revoke() on them
+    # revoke execute_pipeline in case it is still queued, the stages of the chain are aborted/revoked directly
     result.revoke()
     result.abort()
     logger = get_task_logger(task_id_job)
+    stop_chain(job.id, logger)
     print(f'REVOKING JOB {task_id_job}')
     if settings.DEBUG:
         logger.warning("Revoking from within REVOKE_JOB")
@@ -50,78 +51,65 @@ def revoke_job(job):
     if job.status != 'Cancelled':  # should be set to cancelled in task_revoked_handler (signals)
         #  does not work e.g. when celery is not running
         Job.objects.filter(id=job.id).update(status="Cancelled", is_finished=True)
+        events.publish_job(job.id)
 
-    # Get the currently running task/job set by the task_prerun_handler (signals.py)
-    # current_task = cache.get('current_task')
-    current_job = cache.get('current_job')  # more reliable than 'running_job'
-    # as running_job is only set by exec_pipline task
-    pid = cache.get("running_task_pid")
-    if current_job == job.id:  # make sure we dont kill the running task from the wrong view
-        # kill the process with the pid - this is only applicable for subprocesses spawned by the worker with Popen
-        print(f"Attempting to close process from revoke_job. pid={pid}, job={job.id}")
-        if pid is not None:
-            try:
-                os.kill(pid, signal.SIGKILL)  # if it is running, kill it
-            except ProcessLookupError:
-                pass
-    pipe_dict = cache.get(f'pipeline_{job.id}')
-    if pipe_dict:
-        try:
-            if pid == pipe_dict['pid']:
-                return
+    # cancel the remaining processes of the job on all hosts (see supervisor.py)
+    cancelled = supervisor.cancel_job(job.id)
+    log.info(f'revoke_job cancelled tasks {cancelled} of job {job.id} on this host, the workers of the other hosts '
+             f'got the cancel_job command')
+
+
+def chain_results(job_id):
+    """results of the stages of a job's pipeline chain, in order (recorded by execute_pipeline)"""
+    task_ids = process_registry.pipeline_cache().get(f'pipeline_chain_{job_id}', [])
+    return [AbortableAsyncResult(task_id) for task_id in task_ids]
+
+
+def stop_chain(job_id, logger):
+    """aborts the running stage of a job's pipeline chain (terminating its subprocess) and revokes the stages that
+    did not start yet"""
+    for result in chain_results(job_id):
+        if result.status == 'STARTED':
+            result.abort()
+            result.revoke()
             if settings.DEBUG:
-                logger.warning("trying with pipe dict")
-                logger.warning(repr(pipe_dict))
-                logger.warning(f'PID IS DIFFERENT: {pid}, {pipe_dict["pid"]}')
-            os.kill(pipe_dict['pid'], signal.SIGTERM)
-        except:
-            pass
+                logger.warning(f'Cancelling current running task {result.id}')
+            # pushed to the supervisor of the stage, on whichever host it runs
+            if not supervisor.cancel_job(job_id, task_id=result.id):
+                logger.warning(f'No (valid) PID found on this host for task cancel.')
+        if result.status == 'PENDING':
+            logger.warning(f'Revoking pending task {result.id}')
+            result.revoke()
+    process_registry.pipeline_cache().delete(f'pipeline_chain_{job_id}')
 
 
 def update_meta_info(self, job_id, pid):
     # update meta info
-    cache.set("running_task_pid", pid)
-    pipe_dict = cache.get(f"pipeline_{job_id}", {})
+    process_registry.register(job_id, self.request.id, pid)
+    pipe_dict = process_registry.pipeline_cache().get(f"pipeline_{job_id}", {})
     pipe_dict.update({
         'pid': pid,
         'job_id': job_id,
         'task_id': self.request.id,
         'name': self.request.task
     })
-    cache.set(f"pipeline_{job_id}", pipe_dict)
+    process_registry.pipeline_cache().set(f"pipeline_{job_id}", pipe_dict)
     self.update_state(state='STARTED', meta={'pid_subprocess': pid})
 
 
-def log_subprocess_output(pipe, logger=None, **kwargs):
-    """logs stdout from a subprocess pipe to the individual task logger"""
-    formatter_new = logging.Formatter('[%(asctime)s] %(message)s')
-    self = kwargs.pop('self', 0)
-    # change logger format temporarily while reading stdout - dirty solution?
-    for loggr in logger.handlers:
-        loggr.setFormatter(formatter_new)
-    for line in iter(pipe.readline, b''): # b'\n'-separated lines
-        logger.info('%s', line.decode('utf-8').strip().strip('\"').replace(r'\n', '\n'))
-        if self and self.is_aborted():
-            raise ExecutionAbortedError("Task aborted mid-execution")
-    # return back to normal formatting
-    for loggr in logger.handlers:
-        loggr.setFormatter(logging.Formatter('[%(asctime)s][%(levelname)s] %(message)s'))
-
-
-def check_abort_state(task_id, proc, logger):
-    """checks if a task gets revoked/aborted
-    if it does, try to kill the subprocess"""
-    result = AbortableAsyncResult(task_id)
-    if result.is_aborted() or result.state == 'REVOKED':
-        # respect aborted state, and terminate gracefully
-        proc.kill()
-        raise ExecutionAbortedError('Task aborted by user')
-
-
-def call_repeatedly(secs, func, task_id, proc, logger):
-    while proc.poll() is None:
-        time.sleep(secs)
-        func(task_id, proc, logger)
+def thread_budget(self, job_id, max_threads, logger):
+    """cores for a multi-threaded stage from the worker-local cpu allocator (cpu_allocator.py), shared with the other
+    jobs queued for the queues of this host that do not hold cores yet. Returns the number of threads and the
+    preexec_fn pinning the subprocess to the cores. The cores have to be given back with
+    cpu_allocator.release(self.request.id)"""
+    if not cpu_allocator.enabled():
+        return max_threads or 10, None
+    queues = cpu_allocator.host_queues() or {self.request.delivery_info.get('routing_key')}
+    waiting = Job.objects.filter(is_finished=False, status__in=['Queued', 'Started'], queue__in=queues) \
+        .exclude(id=job_id).exclude(id__in=cpu_allocator.holders()).count()
+    cores = cpu_allocator.allocate(self.request.id, job_id, max_threads, waiting)
+    logger.info(f'Allocated {len(cores)} core(s) {cores}, {waiting} other job(s) waiting for cores')
+    return len(cores), cpu_allocator.pinning(cores)
 
 
 @app.task(ignore_result=True)
@@ -140,9 +128,24 @@ def cleanup_expired_results():
             pass
     jobs.delete()
 
+    # expired/oversized entries of the result and stage cache
+    result_cache.evict()
+    stage_cache.evict()
+
+    # resumable uploads that were abandoned
+    chunked_upload.expire()
+
+    # the runtime predictions learn from the finished stages
+    cost_model.refit()
+
     # sometimes jobs get "stuck"
     Job.objects.filter(is_finished=True, status="Queued").update(status="Failed")
 
+    # no task waits for the pipelines to finish, so their overall time limit is enforced here
+    overdue = timezone.now() - timedelta(seconds=settings.CELERY_TASK_SOFT_TIME_LIMIT)
+    for job in Job.objects.filter(is_finished=False, start_date__lt=overdue):
+        revoke_job(job)
+
     # TODO delete taskresults?
 
 
@@ -158,15 +161,14 @@ app.conf.beat_schedule = {
 def setup_process(self, result, job_id, *args, **kwargs):
     """ Basic setup for most tasks. Configures task based logger and filepath variables """
 
-    cache.set("current_task", self.request.id, timeout=None)
     # Logging
     logger = get_task_logger(self.request.id)
     app.log.redirect_stdouts_to_logger(logger, loglevel=logging.INFO)
     if settings.DEBUG:
         logger.debug(f'Task {self.request.task} started with args={args}, kwargs={kwargs}. Job ID = {job_id}')
 
-    # Filepath extractions
-    fpath = Job.objects.get(id=job_id).sbml_file.path
+    # Filepath extractions, the stages of a pipeline get the path passed by execute_pipeline
+    fpath = kwargs.get('fpath') or Job.objects.get(id=job_id).sbml_file.path
     path = os.path.dirname(fpath)
     fname = os.path.basename(fpath)
     model_name, extension = os.path.splitext(fname)
@@ -174,6 +176,29 @@ def setup_process(self, result, job_id, *args, **kwargs):
     return logger, fpath, path, fname, model_name, extension
 
 
+def fetch_stage(self, logger, key, path, model_name, outputs):
+    """copies the outputs of this task from the stage cache if a previous job ran it with identical inputs.
+    Returns the stored meta data or None if the task has to run"""
+    try:
+        meta = stage_cache.fetch(self.name, key, path, model_name, outputs)
+    except OSError as e:
+        logger.warning(f'Could not read from the stage cache: {repr(e)}')
+        return None
+    if meta is not None:
+        logger.info(f'Reusing the outputs of {self.name} from a previous job with identical inputs: {", ".join(outputs)}')
+        # keeps the runtime of the cache hit out of the cost model fit
+        SubTask.objects.filter(task_id=self.request.id).update(cached=True)
+    return meta
+
+
+def publish_stage(self, logger, key, path, model_name, outputs, **meta):
+    """stores the outputs of this task in the stage cache"""
+    try:
+        stage_cache.publish(self.name, key, path, model_name, outputs, **meta)
+    except OSError as e:
+        logger.warning(f'Could not store the outputs of {self.name} in the stage cache: {repr(e)}')
+
+
 @shared_task(bind=True, name="update_db")
 def update_db_post_run(self, result=None, job_id=None, *args, **kwargs):
     """updates database entries after a chain/pipeline is finished. Updates duration, status, finish time"""
@@ -185,6 +210,13 @@ def update_db_post_run(self, result=None, job_id=None, *args, **kwargs):
     duration = '{:02}:{:02}:{:02}'.format(int(hours), int(minutes), int(seconds))
 
     job.update(is_finished=True, finished_date=finished_date, status="Done", result=result, duration=duration)
+    process_registry.pipeline_cache().delete(f'pipeline_chain_{job_id}')
+    events.publish_job(job_id)
+
+    try:
+        result_cache.store(job_id)
+    except Exception as e:
+        get_task_logger(self.request.id).warning(f'Could not store job {job_id} in the result cache: {repr(e)}')
 
 
 @shared_task(bind=True, name="result_email")  # TODO
@@ -227,18 +259,38 @@ def sbml_processing(self, job_id=None, make_consistent=False, *args, **kwargs):
 
     #  Set start date to now
     Job.objects.filter(id=job_id).update(start_date=timezone.now())
+
+    outputs = [f'{model_name}.{type}file' for type in ['s', 'm', 'r', 'rv', 'n']]
+    stage_key = stage_cache.stage_key(self.name, path, [fname], make_consistent=make_consistent)
+    meta = fetch_stage(self, logger, stage_key, path, model_name, outputs)
+    if meta is not None:
+        Job.objects.filter(id=job_id).update(**meta['model_info'])
+        return meta['bm_rxn']
+
     logger.info(f'Make model consistent = {make_consistent}')
     logger.info(f'Trying to load SBML model {fname}')
 
-    if extension == '.json':
-        m = cobra.io.load_json_model(fpath)
-    elif extension == '.xml' or extension == '.sbml':
-        m = cobra.io.read_sbml_model(fpath)
-    elif extension == '.mat':
-        m = cobra.io.load_matlab_model(fpath)
+    # the model parsed at upload/by a previous job with the same file (parsed_model.py)
+    digest = Job.objects.get(id=job_id).model_digest or result_cache.file_digest(fpath)
+    form = parsed_model.load(digest)
+    if form is not None:
+        m = parsed_model.to_cobra(form)
+        logger.info('Loaded the parsed model of the upload.')
     else:
-        logger.error(f'ERROR: input file ({fname}) missing matching extension (.json/.xml/.sbml)')
-        raise Exception(f'ERROR: input file ({fname}) missing matching extension (.json/.xml/.sbml)')
+        if extension == '.json':
+            m = cobra.io.load_json_model(fpath)
+        elif extension == '.xml' or extension == '.sbml':
+            m = cobra.io.read_sbml_model(fpath)
+        elif extension == '.mat':
+            m = cobra.io.load_matlab_model(fpath)
+        else:
+            logger.error(f'ERROR: input file ({fname}) missing matching extension (.json/.xml/.sbml)')
+            raise Exception(f'ERROR: input file ({fname}) missing matching extension (.json/.xml/.sbml)')
+
+        try:
+            parsed_model.store(digest, m)
+        except Exception as e:
+            logger.warning(f'Could not store the parsed model: {repr(e)}')
 
     logger.info('Successfully loaded model.')
 
@@ -316,9 +368,10 @@ def sbml_processing(self, job_id=None, make_consistent=False, *args, **kwargs):
         logger.info(f'{model_name}:\n{rxns_orig} rxns, {mets_orig} mets, obj: {fba_orig} '
                     f'--> {rxns_cons} rxns, {mets_cons} mets, obj: {fba_cons}\n')
 
-        job.update(reactions=rxns_cons, metabolites=mets_cons, genes=len(m.genes), objective_expression=bm_rxn)
+        model_info = dict(reactions=rxns_cons, metabolites=mets_cons, genes=len(m.genes), objective_expression=bm_rxn)
     else:
-        job.update(reactions=reactions, metabolites=metabolites, genes=genes, objective_expression=bm_rxn)
+        model_info = dict(reactions=reactions, metabolites=metabolites, genes=genes, objective_expression=bm_rxn)
+    job.update(**model_info)
 
     try:
         medium = m.medium
@@ -396,6 +449,8 @@ def sbml_processing(self, job_id=None, make_consistent=False, *args, **kwargs):
             raise e
         else:
             raise Exception('There was an error writing out files.')
+
+    publish_stage(self, logger, stage_key, path, model_name, outputs, bm_rxn=bm_rxn, model_info=model_info)
     # return biomass reaction for next task
     return bm_rxn
 
@@ -415,55 +470,78 @@ def compress_network(self, result, job_id, *args, **kwargs):
         logger.info('Compression set to False, skipping compression')
         return
 
-    # call the script process
-    cmd_args = [os.path.join(BASE_DIR, 'scripts/compress_network.pl'),
-                                         '-s', f'{model_name}.sfile',
-                                         '-m', f'{model_name}.mfile',
-                                         '-r', f'{model_name}.rfile',
-                                         '-v', f'{model_name}.rvfile',
-                                         '-n', f'{model_name}.nfile',
-                                         '-i', f'{model_name}.nfile',
-                                         '-p', 'chg_proto.txt',
-                                         '-o', '_comp',
-                                         '-l',
-                                         '-k',
-                                         ]
-
-    if settings.DEBUG:
-        logger.info(f'Starting network compression script with the following arguments: {" ".join(cmd_args)}')
-        subtask = SubTask.objects.filter(task_id=self.request.id)
-        subtask.update(command_arguments=" ".join(cmd_args))
-
-    try:
-        compress_process = subprocess.Popen(cmd_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-        update_meta_info(self, job_id, compress_process.pid)
-        threading.Thread(target=call_repeatedly, args=(1, check_abort_state, self.request.id, compress_process,
-                                                       logger)).start()
+    inputs = [f'{model_name}.{type}file' for type in ['s', 'm', 'r', 'rv', 'n']]
+    outputs = [f'{model_name}.{type}file_comp' for type in ['s', 'm', 'r', 'rv', 't']] + \
+              [f'{model_name}.rfile.new_reac_names', f'{model_name}.rfile.new_reac_stoich', 'chg_proto.txt']
+    engine = Job.objects.get(id=job_id).compression_engine
+    kernel = engine == 'python' and settings.KERNEL_COMPRESSION
+    stage_key = stage_cache.stage_key(self.name, path, inputs, engine=engine, kernel=kernel)
+    if fetch_stage(self, logger, stage_key, path, model_name, outputs) is not None:
+        os.chdir(BASE_DIR)
+        return 0
+
+    if engine == 'python':
+        try:
+            compress_in_process(logger, model_name, kernel)
+        except Exception as e:
+            logger.error(repr(e))
+            os.chdir(BASE_DIR)
+            raise e
+        returncode = 0
+    else:
+        # call the script process
+        cmd_args = [os.path.join(BASE_DIR, 'scripts/compress_network.pl'),
+                                             '-s', f'{model_name}.sfile',
+                                             '-m', f'{model_name}.mfile',
+                                             '-r', f'{model_name}.rfile',
+                                             '-v', f'{model_name}.rvfile',
+                                             '-n', f'{model_name}.nfile',
+                                             '-i', f'{model_name}.nfile',
+                                             '-p', 'chg_proto.txt',
+                                             '-o', '_comp',
+                                             '-l',
+                                             '-k',
+                                             ]
 
-        with compress_process.stdout:
-            log_subprocess_output(compress_process.stdout, logger=logger)
+        if settings.DEBUG:
+            logger.info(f'Starting network compression script with the following arguments: {" ".join(cmd_args)}')
+            subtask = SubTask.objects.filter(task_id=self.request.id)
+            subtask.update(command_arguments=" ".join(cmd_args))
 
-        compress_process.wait()
-    except SoftTimeLimitExceeded as e:
-        AbortableAsyncResult(self.request.id).abort()
-        compress_process.kill()
-        raise e
-    except ExecutionAbortedError as e:
-        compress_process.kill()
-        raise e
-    except Exception as e:
-        logger.error(repr(e))
-        raise e
+        try:
+            returncode = supervisor.run(cmd_args, logger, self.request.id,
+                                        on_start=lambda pid: update_meta_info(self, job_id, pid))
+        except SoftTimeLimitExceeded as e:
+            AbortableAsyncResult(self.request.id).abort()
+            raise e
+        except ExecutionAbortedError as e:
+            raise e
+        except Exception as e:
+            logger.error(repr(e))
+            raise e
 
     # write/copy growth reaction
     copyfile(os.path.join(path, f'{model_name}.nfile'), os.path.join(path, f'{model_name}.tfile_comp'))
 
     os.chdir(BASE_DIR)
 
-    if compress_process.returncode:
+    if returncode:
         raise ExecutionAbortedError(f'Process {self.name} had non-zero exit status')
 
-    return compress_process.returncode
+    publish_stage(self, logger, stage_key, path, model_name, outputs)
+    return returncode
+
+
+def compress_in_process(logger, model_name, kernel=False):
+    """same compression as scripts/compress_network.pl (with -l -k) with the in-process engine
+    (network_compression.py), optionally followed by the kernel based compression. Expects the job folder as working
+    directory"""
+    logger.info(f'Using the in-process network compression (kernel based compression: {kernel})')
+    start = time.time()
+    network_compression.compress(f'{model_name}.sfile', f'{model_name}.mfile', f'{model_name}.rfile',
+                                 f'{model_name}.rvfile', 'chg_proto.txt', '_comp', nfile=f'{model_name}.nfile',
+                                 skipfile=f'{model_name}.nfile', linear_only=True, kernel=kernel, logger=logger)
+    logger.info(f'Network compression took {time.time() - start:.2f}s')
 
 
 @shared_task(bind=True, name="create_dual_system")
@@ -496,36 +574,54 @@ def create_dual_system(self, result, job_id, *args, **kwargs):
     f.close()
     comp_suffix = 'comp' if kwargs['do_compress'] else 'uncomp'
 
-    cmd_args = [os.path.join(BASE_DIR, 'scripts/create_ccds_files.pl'),
-                                         '-c', f'{model_name}.inp',
-                                         '-o', f'{model_name}_{comp_suffix}'
-                ]
-
-    if settings.DEBUG:
-        subtask = SubTask.objects.filter(task_id=self.request.id)
-        subtask.update(command_arguments=" ".join(cmd_args))
-        logger.info(f'Starting {self.request.task} with the following arguments: {" ".join(cmd_args)}')
+    file_ext = 'file_comp' if kwargs['do_compress'] else 'file'
+    inputs = [f'{model_name}.{type}{file_ext}' for type in filetypes]
+    outputs = [f'{model_name}_{comp_suffix}_dual.{type}file' for type in ['c', 'm', 'r', 'rv', 's', 'v', 'x']] + \
+              [f'{model_name}_{comp_suffix}_efmtool.{type}file' for type in ['m', 'r', 'rv', 's']]
+    stage_key = stage_cache.stage_key(self.name, path, inputs)
+    if fetch_stage(self, logger, stage_key, path, model_name, outputs) is not None:
+        os.chdir(BASE_DIR)
+        return 0
 
-    # Start the process
-    try:
-
-        create_dual_system_process = subprocess.Popen(cmd_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-        cache.set("running_task_pid", create_dual_system_process.pid)
+    if settings.DUAL_SYSTEM_ENGINE == 'python':
+        try:
+            logger.info('Using the in-process dual system builder')
+            start = time.time()
+            rows, cols = dual_system.create(*inputs, basis=f'{model_name}_{comp_suffix}')
+            logger.info(f'Created the {rows}x{cols} dual system in {time.time() - start:.2f}s')
+        except Exception as e:
+            logger.error(repr(e))
+            os.chdir(BASE_DIR)
+            raise e
+        returncode = 0
+    else:
+        cmd_args = [os.path.join(BASE_DIR, 'scripts/create_ccds_files.pl'),
+                                             '-c', f'{model_name}.inp',
+                                             '-o', f'{model_name}_{comp_suffix}'
+                    ]
 
-        with create_dual_system_process.stdout:
-            log_subprocess_output(create_dual_system_process.stdout, logger=logger)
-        create_dual_system_process.wait()
+        if settings.DEBUG:
+            subtask = SubTask.objects.filter(task_id=self.request.id)
+            subtask.update(command_arguments=" ".join(cmd_args))
+            logger.info(f'Starting {self.request.task} with the following arguments: {" ".join(cmd_args)}')
 
-    except Exception as e:
-        logger.error(repr(e))
-        raise e
+        # Start the process
+        try:
+            returncode = supervisor.run(cmd_args, logger, self.request.id,
+                                        on_start=lambda pid: update_meta_info(self, job_id, pid))
+        except ExecutionAbortedError as e:
+            raise e
+        except Exception as e:
+            logger.error(repr(e))
+            raise e
 
     os.chdir(BASE_DIR)
 
-    if create_dual_system_process.returncode:
+    if returncode:
         raise ExecutionAbortedError(f'Process {self.name} had non-zero exit status')
 
-    return create_dual_system_process.returncode
+    publish_stage(self, logger, stage_key, path, model_name, outputs)
+    return returncode
 
 
 @shared_task(bind=True, name="defigueiredo", base=AbortableTask)
@@ -538,74 +634,67 @@ def defigueiredo(self, result, job_id, cardinality, *args, **kwargs):
                                                                       **kwargs)
 
     dm = cardinality
-    # threads - parameter?
-    try:
-        t = settings.MAX_THREADS_MCS
-    except:
-        t = 10
 
     comp_suffix = 'comp' if kwargs['do_compress'] else 'uncomp'
 
-    logger.info(f'Getting MCS: using up to d={dm} (cardinality) and t={t} thread(s)')
     os.chdir(path)
-    cmd_args = [os.path.join(BASE_DIR, 'bin/defigueiredo'),
-                                         '-m', f'{model_name}_{comp_suffix}_dual.mfile',
-                                         '-r', f'{model_name}_{comp_suffix}_dual.rfile',
-                                         '-s', f'{model_name}_{comp_suffix}_dual.sfile',
-                                         '-v', f'{model_name}_{comp_suffix}_dual.vfile',
-                                         '-c', f'{model_name}_{comp_suffix}_dual.cfile',
-                                         '-x', f'{model_name}_{comp_suffix}_dual.xfile',
-                                         '-o', f'{model_name}.mcs.{comp_suffix}',
-                                         '-t', f'{t}',
-                                         '-u', f'{dm}',
-                                         # '-l',
-                                         '-p',
-                                         '-i'
-                ]
-
-    if settings.DEBUG:
-        subtask = SubTask.objects.filter(task_id=self.request.id)
-        subtask.update(command_arguments=" ".join(cmd_args))
-        logger.info(f'Starting {self.request.task} with the following arguments: {" ".join(cmd_args)}')
-
-    # Start the process
+    inputs = [f'{model_name}_{comp_suffix}_dual.{type}file' for type in ['m', 'r', 's', 'v', 'c', 'x']]
+    outputs = [f'{model_name}.mcs.{comp_suffix}']
+    stage_key = stage_cache.stage_key(self.name, path, inputs, cardinality=dm)
+    if fetch_stage(self, logger, stage_key, path, model_name, outputs) is not None:
+        os.chdir(BASE_DIR)
+        return 0
+
+    tracker = progress.ProgressTracker(self.request.id, self.name, max_cardinality=dm)
     try:
-        defigueiredo_process = subprocess.Popen(cmd_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-
-        update_meta_info(self, job_id, defigueiredo_process.pid)
-        threading.Thread(target=call_repeatedly, args=(1, check_abort_state, self.request.id, defigueiredo_process,
-                                                       logger)).start()
+        # the cores are released in finally
+        t, pin = thread_budget(self, job_id, getattr(settings, 'MAX_THREADS_MCS', None), logger)
+        logger.info(f'Getting MCS: using up to d={dm} (cardinality) and t={t} thread(s)')
+        cmd_args = [os.path.join(BASE_DIR, 'bin/defigueiredo'),
+                                             '-m', f'{model_name}_{comp_suffix}_dual.mfile',
+                                             '-r', f'{model_name}_{comp_suffix}_dual.rfile',
+                                             '-s', f'{model_name}_{comp_suffix}_dual.sfile',
+                                             '-v', f'{model_name}_{comp_suffix}_dual.vfile',
+                                             '-c', f'{model_name}_{comp_suffix}_dual.cfile',
+                                             '-x', f'{model_name}_{comp_suffix}_dual.xfile',
+                                             '-o', f'{model_name}.mcs.{comp_suffix}',
+                                             '-t', f'{t}',
+                                             '-u', f'{dm}',
+                                             # '-l',
+                                             '-p',
+                                             '-i'
+                    ]
 
-        with defigueiredo_process.stdout:
-            log_subprocess_output(defigueiredo_process.stdout, logger=logger, self=self, pid=defigueiredo_process.pid)
+        if settings.DEBUG:
+            subtask = SubTask.objects.filter(task_id=self.request.id)
+            subtask.update(command_arguments=" ".join(cmd_args))
+            logger.info(f'Starting {self.request.task} with the following arguments: {" ".join(cmd_args)}')
 
-        defigueiredo_process.wait()
+        # Start the process
+        returncode = supervisor.run(cmd_args, logger, self.request.id, preexec_fn=pin,
+                                    on_start=lambda pid: update_meta_info(self, job_id, pid),
+                                    on_line=tracker.feed_line)
 
     except SoftTimeLimitExceeded as e:
-        try:
-            defigueiredo_process.kill()
-            os.kill(defigueiredo_process.pid, signal.SIGKILL)
-            AbortableAsyncResult(self.request.id).abort()
-        except ProcessLookupError:
-            pass
+        AbortableAsyncResult(self.request.id).abort()
         raise e
 
     except ExecutionAbortedError as e:
-        defigueiredo_process.kill()
         raise e
 
     except Exception as e:
         logger.error(repr(e))
         raise ExecutionAbortedError(repr(e))
 
+    finally:
+        tracker.finish()
+        cpu_allocator.release(self.request.id)
+
     os.chdir(BASE_DIR)
 
-    # one final check - sleep to let the other worker catch up
-    time.sleep(2)
-    if self.is_aborted():
-        raise ExecutionAbortedError("Task aborted!")
-    time.sleep(1)
-    return defigueiredo_process.returncode
+    if not returncode:
+        publish_stage(self, logger, stage_key, path, model_name, outputs)
+    return returncode
 
 
 @shared_task(bind=True, name="mcs_to_binary")
@@ -624,33 +713,32 @@ def mcs_to_binary(self, result, job_id, *args, **kwargs):
     rxns_fname = f'{model_name}.rfile_comp' if kwargs['do_compress'] else f'{model_name}.rfile'
     output_file = f'{model_name}.mcs.{comp_suffix}.binary'
 
+    sparse_file = f'{model_name}.mcs.{comp_suffix}.sparse'
+    outputs = [output_file, sparse_file]
+
+    stage_key = stage_cache.stage_key(self.name, path, [mcs_fname, rxns_fname])
+    if fetch_stage(self, logger, stage_key, path, model_name, outputs) is not None:
+        os.chdir(BASE_DIR)
+        return
+
     try:
-        with open(os.path.join(path, rxns_fname), 'r') as f:
-            rxns = f.read().strip().split()
-            rxns = [r.replace('"', '') for r in rxns]
-
-        with open(os.path.join(path, mcs_fname), 'r') as mcsfile, \
-                open(os.path.join(path, output_file), 'w') as outfile:
-            mcs_list = mcsfile.readlines()
-            mcs_set = set(mcs_list)
-            for line in mcs_set:
-                arr = ['0'] * len(rxns)
-                sep = ' ' if ' ' in line else ','
-                mcs = line.strip().split(sep)
-                for rxn in mcs:
-                    arr[rxns.index(rxn)] = '1'
-                outfile.write(''.join(arr) + '\n')
-
-        if len(mcs_list) > len(mcs_set):
-            logger.warning(f'Duplicate MCS entries were found in {mcs_fname} (total {len(mcs_list)} vs {len(mcs_set)} unique).'
+        chunk_size = getattr(settings, 'MCS_DEDUPE_CHUNK_SIZE', mcs_binary.DEFAULT_CHUNK_SIZE)
+        total, unique = mcs_binary.convert(os.path.join(path, mcs_fname), os.path.join(path, rxns_fname),
+                                           os.path.join(path, output_file), os.path.join(path, sparse_file),
+                                           chunk_size=chunk_size)
+
+        if total > unique:
+            logger.warning(f'Duplicate MCS entries were found in {mcs_fname} (total {total} vs {unique} unique).'
                            f' Duplicate entries were removed for PoF calculation and written to {output_file}')
 
-        logger.info(f'Successfully read {mcs_fname} and {rxns_fname} and wrote output to {output_file}')
+        logger.info(f'Successfully read {mcs_fname} and {rxns_fname} and wrote output to {output_file} '
+                    f'and {sparse_file}')
 
     except Exception as e:
         logger.error(repr(e))
         raise e
 
+    publish_stage(self, logger, stage_key, path, model_name, outputs)
     os.chdir(BASE_DIR)
 
 
@@ -668,11 +756,8 @@ def pofcalc(self, result, job_id, cardinality, mutation_rate, *args, **kwargs):
 
     os.chdir(path)
     d = cardinality
-    try:
-        t = settings.MAX_THREADS_POFCALC
-    except:
-        t = 10
-    mutation_rate = Job.objects.get(id=job_id).mutation_rate / 100  # % conversion
+    job_instance = Job.objects.get(id=job_id)
+    mutation_rate = job_instance.mutation_rate / 100  # % conversion
     comp_suffix = 'comp' if kwargs['do_compress'] else 'uncomp'
 
     logger.info(f'Calculating PoF up to d={d} with a mutation rate of {mutation_rate}')
@@ -681,7 +766,6 @@ def pofcalc(self, result, job_id, cardinality, mutation_rate, *args, **kwargs):
                                          '-m', f'{model_name}.mcs.{comp_suffix}.binary',
                                          # '-o', f'{model_name}.mcs.comp',
                                          '-d', f'{d}',
-                                         '-t', f'{t}',
                                          '-p', f'{mutation_rate}'
                 ]
 
@@ -706,30 +790,29 @@ def pofcalc(self, result, job_id, cardinality, mutation_rate, *args, **kwargs):
         cmd_args += ['-c', f'{model_name}.num_{comp_suffix}_rxns',
                      '-r', f'{nr_words}']
 
-    if settings.DEBUG:
-        subtask = SubTask.objects.filter(task_id=self.request.id)
-        subtask.update(command_arguments=" ".join(cmd_args))
-        logger.info(f'Starting {self.request.task} with the following arguments: {" ".join(cmd_args)}')
-
-    # Start the process
+    tracker = progress.ProgressTracker(self.request.id, self.name)
     try:
-        pofcalc_process = subprocess.Popen(cmd_args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        # the cores are released in finally
+        t, pin = thread_budget(self, job_id, getattr(settings, 'MAX_THREADS_POFCALC', None), logger)
+        cmd_args += ['-t', f'{t}']
 
-        update_meta_info(self, job_id, pofcalc_process.pid)
+        if settings.DEBUG:
+            subtask = SubTask.objects.filter(task_id=self.request.id)
+            subtask.update(command_arguments=" ".join(cmd_args))
+            logger.info(f'Starting {self.request.task} with the following arguments: {" ".join(cmd_args)}')
 
-        threading.Thread(target=call_repeatedly, args=(3, check_abort_state, self.request.id, pofcalc_process,
-                                                       logger)).start()
+        # Start the process
         stout = []
-        with pofcalc_process.stdout:
-            for line in iter(pofcalc_process.stdout.readline, b''):
-                line = line.decode('utf-8').strip().strip('\"').replace(r'\n', '\n').replace(r'\x08', '')
-                if '%' not in line:
-                    stout.append(line)
-                if self.is_aborted():
-                    # respect aborted state, and terminate gracefully.
-                    logger.warning('Task aborted (stdoutstream)')
-                    os.kill(pofcalc_process.pid, signal.SIGTERM)
-                    pofcalc_process.kill()
+
+        def collect(line):
+            if '%' not in line:
+                stout.append(line.replace(r'\x08', ''))
+
+        # the progress bar (%) is not logged but tracked
+        returncode = supervisor.run(cmd_args, logger, self.request.id, preexec_fn=pin,
+                                    on_start=lambda pid: update_meta_info(self, job_id, pid),
+                                    on_output=tracker.feed_text, on_line=collect,
+                                    include=lambda line: '%' not in line)
 
         # out, err = pofcalc_process.communicate()
         # out = out.decode('utf-8').strip().strip('\"').replace(r'\n', '\n')
@@ -741,6 +824,7 @@ def pofcalc(self, result, job_id, cardinality, mutation_rate, *args, **kwargs):
         # out = out.splitlines()  # convert to list for following steps
         out = stout
         job = Job.objects.filter(id=job_id)
+        df = None
 
         # extract the table with results from stdout
         for i in range(len(out)):
@@ -755,8 +839,6 @@ def pofcalc(self, result, job_id, cardinality, mutation_rate, *args, **kwargs):
                 job.update(result_table=filepath)
                 break
 
-        logger.info('\n'.join(out))
-
         if 'Final PoF' in out[-1]:
             # gets the result from the process output
             try:
@@ -767,44 +849,77 @@ def pofcalc(self, result, job_id, cardinality, mutation_rate, *args, **kwargs):
                     pof_result = '1'
             job.update(result=pof_result)  # stores the string of the result
 
-        pofcalc_process.wait()
+        if job_instance.mutation_rate_sweep and not returncode and df is not None:
+            pofcalc_sweep(logger, job_instance, path, model_name, df, out)
 
     except SoftTimeLimitExceeded as e:
-        try:
-            pofcalc_process.kill()
-            os.kill(pofcalc_process.pid, signal.SIGKILL)
-            AbortableAsyncResult(self.request.id).abort()
-        except ProcessLookupError:
-            pass
+        AbortableAsyncResult(self.request.id).abort()
+        raise e
+
+    except ExecutionAbortedError as e:
+        logger.warning('Task aborted (stdoutstream)')
         raise e
 
     except Exception as e:
         logger.error(repr(e))
         raise e
 
+    finally:
+        tracker.finish()
+        cpu_allocator.release(self.request.id)
+
     os.chdir(BASE_DIR)
 
-    if pofcalc_process.returncode:
+    if returncode:
         raise ExecutionAbortedError(f'Process {self.name} had non-zero exit status')
     else:
-        return float(pof_result) if pof_result else pofcalc_process.returncode
+        return float(pof_result) if pof_result else returncode
+
+
+def pofcalc_sweep(logger, job, path, model_name, table, out):
+    """evaluates all mutation rates of a sweep job from the PoFcalc run of the job's own rate: the lethal and possible
+    cut sets per cardinality of its result table and the final PoF polynomial of its output (pof_sweep.py). Writes the
+    rate x cardinality table, there is no second PoF calculation"""
+    rates = parse_mutation_rates(job.mutation_rate_sweep)
+    logger.info(f'Mutation rate sweep over {len(rates)} rates ({rates[0]:g}% - {rates[-1]:g}%)')
+    start = time.time()
+    accumulated = pof_sweep.accumulate(table['lethal CS'].astype(float), table['possible CS'].astype(float),
+                                       np.array(rates) / 100)
+    df = pd.DataFrame(data=accumulated, columns=[f'd={k}' for k in range(1, len(table) + 1)])
+    df.insert(0, 'mutation rate (%)', rates)
+
+    polynomials = [pof_sweep.parse_polynomial(line) for line in out if 'Final PoF' in line]
+    polynomials = [polynomial for polynomial in polynomials if polynomial is not None]
+    if polynomials:
+        df['PoF (d0=r)'] = pof_sweep.evaluate_polynomial(polynomials[0], np.array(rates) / 100)
+    else:
+        logger.warning('PoFcalc did not report the PoF polynomial, the sweep table has no final PoF column')
+
+    filepath = os.path.join(path, f'sweep_table_{model_name}.csv')
+    df.to_csv(filepath, index=False, float_format='%.10g')
+    logger.info(f'\n{df.to_string(index=False)}')
+    logger.info(f'Mutation rate sweep took {time.time() - start:.2f}s')
+    Job.objects.filter(id=job.id).update(sweep_table=filepath)
 
 
 @shared_task(bind=True, name="abort_task", ignore_result=True)
 def abort_task(self, *args, **kwargs):
+    """errback of the pipeline chain. The failed stage itself is handled by task_failure_handler (signals.py)"""
     res = AbortableAsyncResult(kwargs['t_id'])
     res.revoke()
     res.abort()
+    if kwargs.get('job_id') is not None:
+        stop_chain(kwargs['job_id'], get_task_logger(kwargs['t_id']))
 
 
-@shared_task(bind=True, name="execute_pipeline", base=AbortableTask, time_limit=settings.CELERY_TASK_TIME_LIMIT,
-             soft_time_limit=settings.CELERY_TASK_SOFT_TIME_LIMIT)
+@shared_task(bind=True, name="execute_pipeline", base=AbortableTask)
 def execute_pipeline(self, job_id, compression_checked, cardinality_defi,
                      cardinality_pof, make_consistent, mutation_rate, *args, **kwargs):
     """
-    Executes the pipeline for Pof calculation. Creates a celery chain from all tasks and calls it.
-    Blocks celery workers from picking up another job until the execution is finished to ensure
-    consecutive execution of the jobs passed to the queue
+    Executes the pipeline for Pof calculation. Creates a celery chain from all tasks and dispatches it.
+    Returns right away, the job is driven by the chain itself: the task signals (signals.py) track the running
+    stage and failures, update_db_post_run finishes the job and abort_task is the errback of the chain.
+    Cancelling goes through revoke_job, which finds the stages in the chain record of the job
     Args:
         self: task object, passed from celery
         job_id: job id
@@ -815,7 +930,7 @@ def execute_pipeline(self, job_id, compression_checked, cardinality_defi,
         *args:
         **kwargs:
 
-    Returns: AsyncResult
+    Returns: id of the last task of the chain
 
     """
     this_result = AbortableAsyncResult(self.request.id)
@@ -823,88 +938,123 @@ def execute_pipeline(self, job_id, compression_checked, cardinality_defi,
     if this_result.is_aborted() or this_result.status == 'REVOKED' or job.status == 'Cancelled' \
             or this_result.status == 'ABORTED':
         return 'ABORTED'
-    pipe_cache = f'pipeline_{job_id}'
 
-    cache.set('running_job', job_id, timeout=10000)
     logger, fpath, path, fname, model_name, extension = setup_process(self, job_id=job_id, result=None, *args,
                                                                       **kwargs)
 
-    Job.objects.filter(id=job_id).update(task_id_job=self.request.id, model_name=model_name)
-
-    result = chain(sbml_processing.s(job_id=job_id, make_consistent=make_consistent),
-                   compress_network.s(job_id=job_id, do_compress=compression_checked),
-                   create_dual_system.s(job_id=job_id, do_compress=compression_checked),
-                   defigueiredo.s(job_id=job_id, cardinality=cardinality_defi, do_compress=compression_checked),
-                   mcs_to_binary.s(job_id=job_id, do_compress=compression_checked),
-                   pofcalc.s(job_id=job_id, cardinality=cardinality_pof, do_compress=compression_checked,
-                             mutation_rate=mutation_rate),
-                   update_db_post_run.s(job_id=job_id),
-                   send_result_email.s(job_id=job_id)
-                   ).on_error(abort_task.s(t_id=self.request.id)).apply_async()
-
-    cache.set('current_chain', result.task_id, timeout=40000)
-
-    copy = result
-    parents = list()
-    parents.append(copy)
-    while copy.parent:
-        parents.append(copy.parent)
-        copy = copy.parent
-
-    def check_parents(parents):
-        """ loops through all tasks in a chain, checks their status and aborts if need be"""
-        for parent in parents:
-            if parent.status == 'STARTED':
-                AbortableAsyncResult(parent.id).abort()
-                parent.revoke()
-                if settings.DEBUG:
-                    logger.warning(f'Cancelling current running task {parent.id}')
-                if job_id == cache.get('current_job'):
-                    try:
-                        os.kill(cache.get('running_task_pid'), signal.SIGTERM)
-                    except ProcessLookupError:
-                        logger.warning(f'No (valid) PID found for task cancel.')
-            if parent.status == 'PENDING':
-                logger.warning(f'Revoking pending task {parent.id}')
-                parent.revoke()
+    # short jobs go to the fast queue (shortest first), long ones to the heavy queue, see cost_model.py
+    queue, priority, runtime = cost_model.route(job)
+    logger.info(f'Predicted runtime {timedelta(seconds=int(runtime))}, running on queue {queue} '
+                f'with priority {priority}')
+    Job.objects.filter(id=job_id).update(task_id_job=self.request.id, model_name=model_name,
+                                         predicted_runtime=runtime, queue=queue)
+
+    stages = [sbml_processing.s(job_id=job_id, make_consistent=make_consistent, fpath=fpath),
+              compress_network.s(job_id=job_id, do_compress=compression_checked, fpath=fpath),
+              create_dual_system.s(job_id=job_id, do_compress=compression_checked, fpath=fpath),
+              defigueiredo.s(job_id=job_id, cardinality=cardinality_defi, do_compress=compression_checked,
+                             fpath=fpath),
+              mcs_to_binary.s(job_id=job_id, do_compress=compression_checked, fpath=fpath),
+              pofcalc.s(job_id=job_id, cardinality=cardinality_pof, do_compress=compression_checked,
+                        mutation_rate=mutation_rate, fpath=fpath),
+              update_db_post_run.s(job_id=job_id),
+              send_result_email.s(job_id=job_id)]
+    result = chain(*[stage.set(queue=queue, priority=priority) for stage in stages]
+                   ).on_error(abort_task.s(t_id=self.request.id, job_id=job_id)).apply_async()
+
+    task_ids = [result.id]
+    parent = result.parent
+    while parent:
+        task_ids.append(parent.id)
+        parent = parent.parent
+    process_registry.pipeline_cache().set(f'pipeline_chain_{job_id}', task_ids[::-1], timeout=None)
 
-    try:
-        while not result.ready():  # this blocks the worker from starting another task before the previous one has finished
-            for parent in parents:
-                if parent.status == 'FAILURE' or parent.status == 'REVOKED' or AbortableAsyncResult(parent.id).is_aborted():
-                    try:
-                        name = parent._cache['task_name']
-                    except:  # broad exception clause because could be AttributeError or ValueError or TypeError
-                        name = None
-                    logger.error(f'Task {parent.id}, {name} ended with status {parent.status}!')
-                    this_result.abort()
-                    self.update_state(state='FAILURE', meta={'reason': f'{name} failed/got aborted'})
-                if parent.status == 'STARTED':
-                    if not cache.get(pipe_cache):
-                        name = parent.name or 'unspecified'
-                        cache.set(pipe_cache, {
-                            'name': name,
-                            'task_id': parent.id,
-                            'status': parent.status,
-                            'pipeline_id': this_result.id,
-                            'job_id': job_id
-                        }, timeout=86400)
-            job.refresh_from_db()
-            if this_result.is_aborted() or this_result.status == 'REVOKED' or job.status == 'Cancelled':
-                # if this (execute_pipeline) task has been revoked (by clicking 'cancel'), revoke all tasks in the chain
-                # as well to stop them from being executed
-                logger.warning(f'Task {self.request.id} was flagged as revoked or got aborted, status {this_result.status}')
-                result.revoke()
-                check_parents(parents)
-                logger.warning(f'Job {job_id} now has status {job.status} (after loop)')
-                break
+    if settings.DEBUG:
+        logger.info(f'Dispatched pipeline of job {job_id}: {", ".join(task_ids[::-1])}')
+    return result.task_id
 
-            time.sleep(1)
 
-        return result.task_id
-    except SoftTimeLimitExceeded as e:
-        this_result.abort()
-        check_parents(parents)
-        revoke_job(job)
-        logger.error(repr(e))
-        raise e
+def dispatch_pipeline(job):
+    """sends the pipeline of a job to the message queue. Fills in the counts of the parsed model first, models up to
+    PARSE_AT_SUBMISSION_MAX_SIZE that weren't parsed at validation (e.g. json) are parsed now. Only called from the
+    tasks on the validation queue, the parse must not run in the request that submitted the job"""
+    form = parsed_model.load(job.model_digest) if job.model_digest else None
+    if form is None and os.path.getsize(job.sbml_file.path) <= settings.PARSE_AT_SUBMISSION_MAX_SIZE:
+        try:
+            _, form = parsed_model.ensure(job.sbml_file.path, digest=job.model_digest)
+        except Exception:
+            pass  # sbml_processing reports errors of the model
+    if form is not None:
+        Job.objects.filter(id=job.id).update(**parsed_model.counts(form))
+
+    execute_pipeline.apply_async(kwargs={'job_id': job.id,
+                                         'compression_checked': job.compression,
+                                         'cardinality_defi': job.cardinality_mcs,
+                                         'cardinality_pof': job.cardinality_pof,
+                                         'make_consistent': job.make_consistent,
+                                         'mutation_rate': job.mutation_rate},
+                                 queue='jobs')
+
+
+@shared_task(bind=True, name="validate_model", ignore_result=True)
+def validate_model(self, job_id):
+    """
+    Full validation of the model of a job (libSBML, see validators.sbml_validator), runs on the validation queue
+    before the job enters the compute queues. The form only checked the structure of the file. Valid jobs are
+    queued and dispatched, invalid ones finish with status 'Invalid' and the messages in Job.validation_errors
+    Args:
+        self: task object, passed from celery
+        job_id: job id
+    """
+    job = Job.objects.get(id=job_id)
+    if job.status != 'Validating':  # cancelled meanwhile
+        return
+    errors = upload_validation.validate_file(job.sbml_file.path, full=True)
+    if errors:
+        Job.objects.filter(id=job_id, status='Validating').update(status='Invalid', is_finished=True,
+                                                                  finished_date=timezone.now(),
+                                                                  validation_errors='\n'.join(errors))
+        events.publish_job(job_id)
+        return
+    if Job.objects.filter(id=job_id, status='Validating').update(status='Queued'):
+        events.publish_job(job_id)
+        dispatch_pipeline(job)
+
+
+@shared_task(bind=True, name="prepare_pipeline", ignore_result=True)
+def prepare_pipeline(self, job_id):
+    """
+    Dispatches the pipeline of a job that skips validation, runs on the validation queue so the request that
+    submitted the job doesn't parse the model (see dispatch_pipeline)
+    Args:
+        self: task object, passed from celery
+        job_id: job id
+    """
+    job = Job.objects.get(id=job_id)
+    if job.status != 'Queued':  # cancelled meanwhile
+        return
+    dispatch_pipeline(job)
+
+
+@shared_task(bind=True, name="restore_cached_result", ignore_result=True)
+def restore_cached_result(self, job_id, entry_id):
+    """
+    Completes a job from the result cache (result_cache.restore), runs on the validation queue so the request that
+    submitted the job doesn't wait for the artifacts. If the entry was evicted meanwhile the job runs as usual
+    Args:
+        self: task object, passed from celery
+        job_id: job id
+        entry_id: id of the CachedResult
+    """
+    job = Job.objects.get(id=job_id)
+    if job.status != 'Queued':  # cancelled meanwhile
+        return
+    entry = CachedResult.objects.filter(id=entry_id).first()
+    if entry is not None and os.path.isdir(entry.path):
+        result_cache.restore(job, entry)
+        events.publish_job(job_id)
+    elif job.skip_validation:
+        dispatch_pipeline(job)
+    elif Job.objects.filter(id=job_id, status='Queued').update(status='Validating'):
+        events.publish_job(job_id)
+        validate_model(job_id)
@@ -3,6 +3,36 @@ from .models import Job
 from .forms import JobSubmissionForm
 from django.urls import reverse
 from django.core.files import File
+import asyncio
+import csv
+import gzip
+import hashlib
+import io
+import logging
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import zipfile
+
+
+class TempDirMixin:
+    """a temporary directory per test (self.tmpdir)"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
 
 
 # Create your tests here.
@@ -22,4 +52,737 @@ class ViewTest(TestCase):
         resp = self.client.get(url)
 
         self.assertEqual(resp.status_code, 200)
-        self.assertIn(w.id, resp.content)
\ No newline at end of file
+        self.assertIn(w.id, resp.content)
+
+
+class ResultCacheTest(TempDirMixin, TestCase):
+
+    def test_digest_ignores_line_endings_and_indentation(self):
+        from .result_cache import file_digest
+        a = self.write('a.xml', b'<sbml>\n  <model id="m"/>\n</sbml>\n')
+        b = self.write('b.xml', b'<sbml>\r\n\t<model id="m"/>\r\n\r\n</sbml>')
+        c = self.write('c.xml', b'<sbml>\n  <model id="n"/>\n</sbml>\n')
+        self.assertEqual(file_digest(a), file_digest(b))
+        self.assertNotEqual(file_digest(a), file_digest(c))
+
+    def test_digest_of_binary_files_is_raw(self):
+        from .result_cache import file_digest
+        # bytes that look like whitespace and line endings are part of a .mat file
+        a = self.write('a.mat', b'MATLAB\x00\n\r\n  \x01')
+        b = self.write('b.mat', b'MATLAB\x00\n\x01')
+        self.assertNotEqual(file_digest(a), file_digest(b))
+        with open(a, 'rb') as f:
+            self.assertEqual(file_digest(a), hashlib.sha256(f.read()).hexdigest())
+
+    def test_key_depends_on_parameters(self):
+        from .result_cache import cache_key
+        job = Job(cardinality_mcs=3, cardinality_pof=8, mutation_rate=0.1)
+        other = Job(cardinality_mcs=3, cardinality_pof=8, mutation_rate=0.2)
+        self.assertEqual(cache_key(job, 'digest'), cache_key(Job(cardinality_mcs=3, cardinality_pof=8,
+                                                                     mutation_rate=0.1), 'digest'))
+        self.assertNotEqual(cache_key(job, 'digest'), cache_key(other, 'digest'))
+        self.assertNotEqual(cache_key(job, 'digest'), cache_key(job, 'other digest'))
+
+    def test_artifacts_are_linked(self):
+        from .result_cache import copy_artifacts
+        src, dst = os.path.join(self.tmpdir, 'src'), os.path.join(self.tmpdir, 'dst')
+        os.makedirs(src)
+        os.makedirs(dst)
+        with open(os.path.join(src, 'old.mcs.comp'), 'wb') as f:
+            f.write(b'R1 R2\n')
+        copied = copy_artifacts(src, dst, 'old', 'new', link=True)
+        self.assertEqual(copied, [os.path.join(dst, 'new.mcs.comp')])
+        self.assertTrue(os.path.samefile(copied[0], os.path.join(src, 'old.mcs.comp')))
+
+    def test_rename_matches_whole_model_names(self):
+        from .result_cache import _rename
+        self.assertEqual(_rename('chg_proto.txt', 'c', 'new'), 'chg_proto.txt')
+        self.assertEqual(_rename('c.sfile_comp', 'c', 'new'), 'new.sfile_comp')
+        self.assertEqual(_rename('c_tmp.txt', 'c', 'new'), 'new_tmp.txt')
+        self.assertEqual(_rename('result_table_table.csv', 'table', 'new'), 'result_table_new.csv')
+        self.assertEqual(_rename('sweep_table_table.csv', 'table', 'new'), 'sweep_table_new.csv')
+        self.assertEqual(_rename('result_table_result.csv', 'result', 'new'), 'result_table_new.csv')
+
+
+class StageCacheTest(TempDirMixin, TestCase):
+
+    def test_outputs_are_reused_across_model_names(self):
+        from django.test import override_settings
+        from . import stage_cache
+        self.write('first.sfile', b'1\t-1\n')
+        self.write('second.sfile', b'1\t-1\n')
+        self.write('first.sfile_comp', b'1\n')
+        self.write('chg_proto.txt', b'proto\n')
+        with override_settings(STAGE_CACHE_ROOT=os.path.join(self.tmpdir, 'stages')):
+            key = stage_cache.stage_key('compress_network', self.tmpdir, ['first.sfile'])
+            self.assertEqual(key, stage_cache.stage_key('compress_network', self.tmpdir, ['second.sfile']))
+            self.assertNotEqual(key, stage_cache.stage_key('defigueiredo', self.tmpdir, ['first.sfile'], cardinality=3))
+            self.assertIsNone(stage_cache.fetch('compress_network', key, self.tmpdir, 'second', ['second.sfile_comp']))
+
+            stage_cache.publish('compress_network', key, self.tmpdir, 'first', ['first.sfile_comp', 'chg_proto.txt'],
+                                info=1)
+            os.remove(os.path.join(self.tmpdir, 'chg_proto.txt'))
+            meta = stage_cache.fetch('compress_network', key, self.tmpdir, 'second',
+                                     ['second.sfile_comp', 'chg_proto.txt'])
+            self.assertEqual(meta, {'info': 1})
+            with open(os.path.join(self.tmpdir, 'second.sfile_comp'), 'rb') as f:
+                self.assertEqual(f.read(), b'1\n')
+            self.assertTrue(os.path.isfile(os.path.join(self.tmpdir, 'chg_proto.txt')))
+
+
+class PofSweepTest(TestCase):
+
+    def test_matches_pofcalc_output(self):
+        from . import pof_sweep
+        # 'PoFcalc -m .. -d 3 -p 0.1 -c .. -r 9' of the MCS 1000, 0110 with compression 1 2 1 3
+        accumulated = pof_sweep.accumulate([1, 10, 39], [9, 36, 84], [0.1, 0.01])
+        for expected, value in zip([0.043046721, 0.090876411, 0.11160261], accumulated[0]):
+            self.assertAlmostEqual(value, expected, places=9)
+        self.assertAlmostEqual(accumulated[1, 0], 9 * 0.01 * 0.99 ** 8 / 9, places=14)
+
+        polynomial = pof_sweep.parse_polynomial('Final PoF(d0=r) = 1p + 2p^2 - 3p^3 + 1p^4')
+        self.assertEqual(polynomial, {1: 1, 2: 2, 3: -3, 4: 1})
+        self.assertAlmostEqual(pof_sweep.evaluate_polynomial(polynomial, [0.1])[0], 0.1171, places=14)
+        self.assertIsNone(pof_sweep.parse_polynomial('Final PoF(d0=r) = 0.1171'))
+
+    def test_polynomial_cancellation(self):
+        from . import pof_sweep
+        # 1 - (1 - p)^n, the coefficients grow like binomial(n, k) and alternate in sign
+        n = 400
+        binomials = [1]
+        for k in range(1, n + 1):
+            binomials.append(binomials[-1] * (n - k + 1) // k)
+        terms = ' '.join(f'{"-" if k % 2 == 0 else "+"} {binomials[k]}p^{k}' for k in range(1, n + 1))
+        polynomial = pof_sweep.parse_polynomial(f'Final PoF(d0=r) = {terms}')
+        for rate, value in zip([1e-4, 0.01, 0.5], pof_sweep.evaluate_polynomial(polynomial, [1e-4, 0.01, 0.5])):
+            self.assertAlmostEqual(value / -math.expm1(n * math.log1p(-rate)), 1., places=12)
+
+    def test_parse_mutation_rates(self):
+        from django.core.validators import ValidationError
+        from .validators import parse_mutation_rates, mutation_rate_sweep_validator
+        self.assertEqual(parse_mutation_rates('1, 0.1;0.01 0.1'), [0.01, 0.1, 1.0])
+        rates = parse_mutation_rates('0.001:1:4')
+        self.assertEqual(len(rates), 4)
+        self.assertAlmostEqual(rates[1], 0.01)
+        with self.assertRaises(ValidationError):
+            mutation_rate_sweep_validator('0.1, abc')
+        with self.assertRaises(ValidationError):
+            mutation_rate_sweep_validator('0, 0.1')
+        with self.assertRaises(ValidationError):
+            mutation_rate_sweep_validator('0.001:1:1000000000000')
+        for value in ('-1:1:5', '1:0.1:5', '0.1:inf:5', 'nan:1:5', '0.1, nan', 'nan, 0.1, 0.2', '0.1, 150, 0.2'):
+            with self.assertRaises(ValidationError):
+                mutation_rate_sweep_validator(value)
+        self.assertEqual(parse_mutation_rates('0.5:0.5:3'), [0.5])
+
+
+class McsBinaryTest(TempDirMixin, TestCase):
+
+    def test_order_insensitive_dedupe_with_spilled_chunks(self):
+        from . import mcs_binary
+        rxns_file = self.write('model.rfile_comp', b'"R1" "R2" "R3" "R4" "R5"')
+        mcs_file = self.write('model.mcs.comp', b'R1 R3\nR2\nR3 R1\nR4,R5,R2\nR2\nR5 R4 R2\n')
+        output = os.path.join(self.tmpdir, 'model.mcs.comp.binary')
+        sparse = os.path.join(self.tmpdir, 'model.mcs.comp.sparse')
+        # chunk_size=2 forces the external merge
+        self.assertEqual(mcs_binary.convert(mcs_file, rxns_file, output, sparse, chunk_size=2), (6, 3))
+        with open(output, 'r') as f:
+            self.assertEqual(sorted(f.read().split()), ['01000', '01011', '10100'])
+        with open(sparse, 'r') as f:
+            self.assertEqual(f.readline().strip(), '5')
+            self.assertEqual(sorted(f.read().splitlines()), ['0 2', '1', '1 3 4'])
+
+        with self.assertRaises(ValueError):
+            mcs_binary.convert(self.write('bad.mcs.comp', b'R1 R6\n'), rxns_file, output)
+
+
+class NetworkCompressionTest(TempDirMixin, TestCase):
+
+    def test_linear_compression_files(self):
+        from . import network_compression
+        files = {ext: self.write(f'model.{ext}', content) for ext, content in
+                 [('sfile', b'1 -1 0 0 0\n0 2 -1 -1 0\n0 0 0 0 1\n'), ('rfile', b'"R1" "R2" "R3" "R4" "R5"'),
+                  ('mfile', b'"M1" "M2" "M3"'), ('rvfile', b'0 0 0 1 0'), ('nfile', b'"R4"')]}
+        cwd = os.getcwd()
+        os.chdir(self.tmpdir)
+        try:
+            comp = network_compression.compress(files['sfile'], files['mfile'], files['rfile'], files['rvfile'],
+                                                'chg_proto.txt', '_comp', nfile=files['nfile'], linear_only=True)
+        finally:
+            os.chdir(cwd)
+        self.assertEqual([comp.names[r] for r in comp.reacs], ['R1%R2', 'R3', 'R4'])
+
+        def read(fname):
+            with open(os.path.join(self.tmpdir, fname), 'r') as f:
+                return f.read()
+        self.assertEqual(read('model.rfile_comp'), '"R1%R2" "R3" "R4"')
+        self.assertEqual(read('model.mfile_comp'), '"M2"')
+        self.assertEqual(read('model.sfile_comp'), '2 -1 -1\n')
+        self.assertEqual(read('model.rfile.new_reac_names'),
+                         'R1: R1%R2\nR2: R1%R2\nR3: R3\nR4: R4\nR5: FOREVER_GONE\n')
+        self.assertIn('REMOVE_DEADEND_META: m=2, M3, removed_reactions: R5 4\n', read('chg_proto.txt'))
+        self.assertIn('MERGED_TWO_IRREV: 0 1/1 R1 1 -1/1 R2 => 0 R1%R2', read('chg_proto.txt'))
+
+    def test_kernel_compression(self):
+        from . import network_compression
+        # R1 and R4 are fully coupled, R5 carries no flux, R6 and R7 would have to run in opposite directions
+        stoichiometry = [[1, -1, -1, 0, 0, 0, 0], [0, 1, 1, -1, 0, 0, 0], [0, 0, 0, 0, -1, 1, 1],
+                         [0, 0, 0, 0, 2, -1, -1]]
+        comp = network_compression.Compressor(stoichiometry, [f'R{i}' for i in range(1, 8)], ['A', 'B', 'C', 'D'],
+                                              ['0'] * 7, linear_only=True, kernel=True)
+        comp.compress()
+        self.assertEqual([comp.names[r] for r in comp.reacs], ['R1%R4', 'R2', 'R3'])
+        self.assertEqual([comp.meta_names[m] for m in comp.metas], ['A', 'B'])
+        self.assertEqual(comp.stoichiometry(), [[1, -1, -1], [-1, 1, 1]])
+        self.assertIn('MERGED_COUPLED_REACS: 0 R1 1/1 3 R4 1/1 => 0 R1%R4\n', comp.protocol)
+        self.assertEqual({r: names[-1] for r, names in comp.new_names.items() if r in ('R4', 'R5', 'R6', 'R7')},
+                         {'R4': 'R1%R4', 'R5': 'FOREVER_GONE', 'R6': 'FOREVER_GONE', 'R7': 'FOREVER_GONE'})
+
+    def test_integer_kernel(self):
+        from . import network_compression
+        matrix = [[2, -1, 0, 3], [0, 4, -2, 1], [2 ** 40, 0, 1, 0]]
+        kernel = network_compression.integer_kernel(matrix, 4)
+        self.assertEqual(kernel.shape, (4, 1))
+        for row in matrix:
+            self.assertEqual(sum(int(a) * int(k) for a, k in zip(row, kernel[:, 0])), 0)
+
+
+class DualSystemTest(TempDirMixin, TestCase):
+
+    def test_same_files_as_create_ccds_files(self):
+        from . import dual_system
+        inputs = [self.write(f'model.{ext}', content) for ext, content in
+                  [('rfile', b'"R1" "R2" "R3"'), ('mfile', b'"A" "B"'), ('sfile', b'1\t-1\t0\n0\t0.5\t-2\n'),
+                   ('rvfile', b'0 1 0'), ('tfile', b'R3')]]
+        basis = os.path.join(self.tmpdir, 'model')
+        self.assertEqual(dual_system.create(*inputs, basis=basis), (3, 8))
+
+        # written by scripts/create_ccds_files.pl for the same inputs
+        expected = {'_dual.cfile': '', '_dual.mfile': '"R1" "R2" "R3"',
+                    '_dual.rfile': '"A" "B" "v_R1" "v_R2" "v_R3" "z_R1" "z_R3" "target"',
+                    '_dual.rvfile': '1 1 1 1 1 0 0 0',
+                    '_dual.sfile': '  1  0  1  0  0 -1  0  0\n -1  0.5  0  1  0  0  0  0\n  0 -2  0  0  1  0 -1 -1\n',
+                    '_dual.vfile': '"A" "B" "v_R1" "v_R2" "v_R3"', '_dual.xfile': '2 3 2 1',
+                    '_efmtool.mfile': '"A" "B"', '_efmtool.rfile': '"R1" "R2" "R3"', '_efmtool.rvfile': '0 1 0',
+                    '_efmtool.sfile': '1 -1 0\n0 0.5 -2\n'}
+        for suffix, content in expected.items():
+            with open(basis + suffix, 'r') as f:
+                self.assertEqual(f.read(), content, suffix)
+
+        with self.assertRaises(ValueError):
+            dual_system.create(*inputs[:4], self.write('bad.tfile', b'R2'), basis=basis)
+
+
+class ProcessRegistryTest(TestCase):
+
+    def test_kills_only_live_processes_of_the_job(self):
+        from django.test import override_settings
+        from . import process_registry
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                               PIPELINE_CACHE='default'):
+            first, second = subprocess.Popen(['sleep', '30']), subprocess.Popen(['sleep', '30'])
+            finished = subprocess.Popen(['true'])
+            finished.wait()
+            process_registry.register(1, 'task-a', first.pid)
+            process_registry.register(1, 'task-b', finished.pid)
+            process_registry.register(2, 'task-c', second.pid)
+
+            self.assertEqual(process_registry.kill(1, task_id='task-b'), [])
+            self.assertEqual(process_registry.kill(1), [first.pid])
+            first.wait()
+            self.assertIsNone(second.poll())
+
+            process_registry.unregister(2, 'task-c')
+            self.assertEqual(process_registry.entries(2), {})
+            self.assertEqual(process_registry.kill(2), [])
+            second.kill()
+            second.wait()
+
+
+class CpuAllocatorTest(TempDirMixin, TestCase):
+
+    def test_cores_are_shared_and_returned(self):
+        from django.test import override_settings
+        from . import cpu_allocator
+        self.assertEqual(cpu_allocator.budget(64, 0), 64)
+        self.assertEqual(cpu_allocator.budget(64, 3), 16)
+        self.assertEqual(cpu_allocator.budget(64, 0, max_threads=10), 10)
+        self.assertEqual(cpu_allocator.budget(2, 5), 1)
+        with override_settings(CPU_ALLOCATION_FILE=os.path.join(self.tmpdir, 'cpus.json')):
+            n_cores = len(cpu_allocator.host_cores())
+            first = cpu_allocator.allocate('task-a', 1, waiting=1)
+            self.assertEqual(len(first), max(1, n_cores // 2))
+            second = cpu_allocator.allocate('task-b', 2)
+            if n_cores > 1:
+                self.assertFalse(set(first) & set(second))
+            self.assertEqual(cpu_allocator.holders(), {1, 2})
+            cpu_allocator.release('task-a')
+            cpu_allocator.release('task-b')
+            self.assertEqual(cpu_allocator.holders(), set())
+            self.assertEqual(len(cpu_allocator.allocate('task-c', 3)), n_cores)
+
+            cpu_allocator.register_queues('worker-fast@host', ['jobs_fast', 'jobs'])
+            cpu_allocator.register_queues('worker-heavy@host', ['jobs_heavy'])
+            self.assertEqual(cpu_allocator.host_queues(), {'jobs', 'jobs_fast', 'jobs_heavy'})
+
+
+class CostModelTest(TestCase):
+
+    def test_fit_recovers_runtimes_and_short_jobs_go_first(self):
+        import numpy as np
+        from . import cost_model
+        rng = np.random.RandomState(0)
+        true_weights = np.array([-10.0, 2.0, 0.0, 1.5, -0.5])
+        x = [cost_model.features(r, m, d, c) for r, m, d, c in
+             zip(rng.randint(50, 5000, 200), rng.randint(50, 5000, 200), rng.randint(1, 6, 200), rng.randint(0, 2, 200))]
+        y = [float(w @ true_weights) for w in x]
+        fitted = cost_model.fit_weights(x, y, cost_model.PRIOR['defigueiredo'][0])
+        np.testing.assert_allclose(np.array(x) @ fitted, y, atol=0.1)
+        np.testing.assert_allclose(fitted[[1, 3, 4]], true_weights[[1, 3, 4]], atol=0.1)
+        # without samples the prior stays
+        np.testing.assert_allclose(cost_model.fit_weights(np.zeros((0, 5)), [], true_weights), true_weights)
+
+        self.assertEqual(cost_model.priority(10), cost_model.MAX_PRIORITY)
+        self.assertGreater(cost_model.priority(60), cost_model.priority(3600))
+        self.assertEqual(cost_model.priority(1e9), 0)
+
+    def test_refit_skips_stage_cache_hits(self):
+        import numpy as np
+        from django.contrib.auth.models import User
+        from django.test import override_settings
+        from .models import SubTask
+        from . import cost_model
+        user = User.objects.create_user('cost')
+        job = Job.objects.create(user=user, reactions=500, metabolites=400, cardinality_mcs=3)
+        prior = cost_model.PRIOR['defigueiredo'][0]
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                               PIPELINE_CACHE='default'):
+            SubTask.objects.create(user=user, job=job, task_id='hit', name='defigueiredo', runtime=0.01, cached=True)
+            cost_model.refit()
+            np.testing.assert_allclose(cost_model.weights('defigueiredo'), prior)
+
+            SubTask.objects.create(user=user, job=job, task_id='run', name='defigueiredo', runtime=600)
+            cost_model.refit()
+            self.assertFalse(np.allclose(cost_model.weights('defigueiredo'), prior))
+
+    def test_count_from_file(self):
+        from django.conf import settings
+        from . import cost_model
+        fpath = os.path.join(settings.BASE_DIR, 'example_models', 'e_coli_core.xml')
+        self.assertEqual(cost_model.count_from_file(fpath), (95, 72))
+
+
+class ParsedModelTest(TempDirMixin, TestCase):
+
+    def test_rebuilt_model_matches_parsed_file(self):
+        import cobra
+        import numpy as np
+        from django.conf import settings
+        from django.test import override_settings
+        from . import parsed_model
+        fpath = os.path.join(settings.BASE_DIR, 'example_models', 'e_coli_core.xml')
+        with override_settings(PARSED_MODEL_ROOT=self.tmpdir):
+            digest, _ = parsed_model.ensure(fpath)
+            form = parsed_model.load(digest)
+        self.assertEqual(parsed_model.counts(form)['reactions'], 95)
+        self.assertEqual(parsed_model.counts(form)['metabolites'], 72)
+
+        original, rebuilt = cobra.io.read_sbml_model(fpath), parsed_model.to_cobra(form)
+        self.assertEqual([r.id for r in original.reactions], [r.id for r in rebuilt.reactions])
+        self.assertEqual([m.id for m in original.metabolites], [m.id for m in rebuilt.metabolites])
+        self.assertEqual([r.reversibility for r in original.reactions], [r.reversibility for r in rebuilt.reactions])
+        self.assertEqual(len(original.genes), len(rebuilt.genes))
+        self.assertEqual(str(original.objective.expression), str(rebuilt.objective.expression))
+        for attribute in ['charge', 'formula', 'annotation', 'notes']:
+            self.assertEqual([getattr(m, attribute) for m in original.metabolites],
+                             [getattr(m, attribute) for m in rebuilt.metabolites], attribute)
+        for attribute in ['subsystem', 'annotation', 'notes']:
+            self.assertEqual([getattr(r, attribute) for r in original.reactions],
+                             [getattr(r, attribute) for r in rebuilt.reactions], attribute)
+        self.assertEqual({g.id: (g.name, g.annotation) for g in original.genes},
+                         {g.id: (g.name, g.annotation) for g in rebuilt.genes})
+        np.testing.assert_array_equal(cobra.util.array.create_stoichiometric_matrix(original),
+                                      cobra.util.array.create_stoichiometric_matrix(rebuilt))
+        self.assertAlmostEqual(original.slim_optimize(), rebuilt.slim_optimize())
+
+
+class UploadValidationTest(TempDirMixin, TestCase):
+
+    def test_files_are_validated(self):
+        from django.conf import settings
+        from django.test import override_settings
+        from . import upload_validation
+        valid = os.path.join(self.tmpdir, 'e_coli_core.xml')
+        shutil.copy(os.path.join(settings.BASE_DIR, 'example_models', 'e_coli_core.xml'), valid)
+        broken = self.write('broken.xml', b'<?xml version="1.0"?>\n<sbml><model>\n')
+        done = []
+        with override_settings(PARSED_MODEL_ROOT=os.path.join(self.tmpdir, 'parsed')):
+            results = upload_validation.validate_files([valid, broken], on_done=lambda path, _: done.append(path))
+        self.assertEqual(results[valid], [])
+        self.assertTrue(results[broken])
+        self.assertEqual(done, [valid, broken])
+
+
+class StructureValidatorTest(TempDirMixin, TestCase):
+
+    def test_structure_of_the_file_is_checked(self):
+        from django.conf import settings
+        from django.core.validators import ValidationError
+        from .upload_validation import UploadedPath
+        from .validators import sbml_structure_validator
+        sbml_structure_validator(UploadedPath(os.path.join(settings.BASE_DIR, 'example_models', 'e_coli_core.xml')))
+        with self.assertRaises(ValidationError):
+            sbml_structure_validator(UploadedPath(self.write('broken.xml', b'<?xml version="1.0"?>\n<sbml><model>\n')))
+        with self.assertRaises(ValidationError):
+            sbml_structure_validator(UploadedPath(self.write('other.xml', b'<?xml version="1.0"?>\n<html></html>\n')))
+
+
+class SubprocessLogTest(TempDirMixin, TestCase):
+
+    def logger(self):
+        logger = logging.getLogger(f'subprocess_log_test_{id(self)}')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        handler = logging.FileHandler(os.path.join(self.tmpdir, 'stage.log'))
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        self.addCleanup(handler.close)
+        self.addCleanup(logger.removeHandler, handler)
+        return logger
+
+    def test_head_and_tail_are_logged_and_full_output_is_compressed(self):
+        from django.test import override_settings
+        from .subprocess_log import OutputLog, LineSplitter
+        output = ''.join(f'line {i}\n' for i in range(100)).encode()
+        with override_settings(SUBPROCESS_LOG_HEAD_LINES=3, SUBPROCESS_LOG_TAIL_LINES=2):
+            log = OutputLog(self.logger())
+            splitter = LineSplitter()
+            # chunks that split lines
+            for start in range(0, len(output), 7):
+                for line in splitter.feed(output[start:start + 7]):
+                    log.write(line)
+            for line in splitter.end():
+                log.write(line)
+            log.close()
+        self.assertEqual(log.count, 100)
+        with open(os.path.join(self.tmpdir, 'stage.log')) as f:
+            log = f.read().splitlines()
+        self.assertEqual(log, ['line 0', 'line 1', 'line 2', '... 95 lines omitted, full output in stage.out.gz ...',
+                               'line 98', 'line 99'])
+        with gzip.open(os.path.join(self.tmpdir, 'stage.out.gz'), 'rt') as f:
+            self.assertEqual(f.read(), output.decode())
+
+
+class SupervisorTest(TempDirMixin, TestCase):
+
+    logger = SubprocessLogTest.logger
+
+    def test_output_is_streamed_and_return_code_returned(self):
+        from django.test import override_settings
+        from . import supervisor
+        with override_settings(SUPERVISOR_SOCKET_DIR=self.tmpdir):
+            returncode = supervisor.run(['sh', '-c', 'echo first; echo second; exit 3'], self.logger(), 'task-a')
+        self.assertEqual(returncode, 3)
+        with open(os.path.join(self.tmpdir, 'stage.log')) as f:
+            self.assertEqual(f.read().splitlines(), ['first', 'second'])
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir, 'task-a.sock')))
+
+    def test_cancel_kills_the_process_group(self):
+        from django.test import override_settings
+        from . import supervisor, process_registry
+        from .custom_wraps import ExecutionAbortedError
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                               PIPELINE_CACHE='default', SUPERVISOR_SOCKET_DIR=self.tmpdir):
+            started = threading.Event()
+
+            def on_start(pid):
+                process_registry.register(1, 'task-a', pid)
+                started.set()
+
+            cancelled = []
+            canceller = threading.Thread(target=lambda: started.wait(5) and cancelled.extend(supervisor.cancel(1)))
+            canceller.start()
+            start = time.monotonic()
+            with self.assertRaises(ExecutionAbortedError):
+                supervisor.run(['sh', '-c', 'sleep 30 & sleep 30'], self.logger(), 'task-a', on_start=on_start)
+            canceller.join()
+            self.assertLess(time.monotonic() - start, 5)
+            self.assertEqual(cancelled, ['task-a'])
+
+
+class ProgressTest(TestCase):
+
+    def test_progress_is_parsed_from_the_output(self):
+        from django.test import override_settings
+        from .progress import ProgressTracker
+        with override_settings(PROGRESS_UPDATE_INTERVAL=3600):
+            pofcalc = ProgressTracker('task-a', 'PoFcalc')
+            pofcalc.feed_text('[          ] 0%\b\b\b\b\b1%\b\b2%\b\b\b\b\b\b\b#         ] 2%\b\b3%')
+            self.assertEqual(pofcalc.record['percent'], 3)
+            defigueiredo = ProgressTracker('task-b', 'defigueiredo', max_cardinality=5)
+            defigueiredo.feed_line('Cardinality 3: 120 MCS found')
+            self.assertEqual((defigueiredo.record['cardinality'], defigueiredo.record['mcs'],
+                              defigueiredo.record['percent']), (3, 120, 40))
+
+    def test_eta_from_rate_or_prediction(self):
+        from .progress import stage_eta
+        self.assertEqual(stage_eta({'started': 100, 'percent': 25}, now=200), 300)
+        self.assertEqual(stage_eta({'started': 100, 'percent': None}, predicted_runtime=150, now=200), 50)
+        self.assertIsNone(stage_eta(None))
+
+
+class LogTailTest(TempDirMixin, TestCase):
+
+    def test_log_is_read_in_steps_by_byte_offset(self):
+        from .log_tail import read_after, read_before
+        lines = [f'line {i} ' + 'x' * (i % 50) for i in range(5000)]
+        path = self.write('stage.log', ('\n'.join(lines) + '\nunfinished').encode())
+
+        last = read_before(path, n_lines=3)
+        self.assertEqual(last['lines'], lines[-3:])
+        self.assertTrue(last['more_before'])
+        # the unfinished line is returned once it is complete
+        self.assertEqual(read_after(path, last['end'])['lines'], [])
+        with open(path, 'a') as f:
+            f.write(' now\n')
+        self.assertEqual(read_after(path, last['end'])['lines'], ['unfinished now'])
+
+        collected, cursor = [], None
+        while True:
+            step = read_before(path, cursor, limit=4096)
+            self.assertLessEqual(step['end'] - step['start'], 4096)
+            collected, cursor = step['lines'] + collected, step['start']
+            if not step['more_before']:
+                break
+        self.assertEqual(collected, lines + ['unfinished now'])
+
+    def test_lines_longer_than_a_block_or_the_limit(self):
+        from .log_tail import read_before, BLOCK_SIZE
+        long_line = 'y' * (BLOCK_SIZE + 100)
+        path = self.write('stage.log', f'first\nsecond\n{long_line}'.encode())
+        # the unfinished last line is longer than a block
+        last = read_before(path, n_lines=2)
+        self.assertEqual(last['lines'], ['first', 'second'])
+        self.assertEqual(last['end'], len('first\nsecond\n'))
+
+        with open(path, 'a') as f:
+            f.write('\nlast\n')
+        # a line longer than the limit before the cursor is cut, not skipped
+        step = read_before(path, read_before(path, n_lines=1)['start'], limit=1000)
+        self.assertEqual(step['lines'], [long_line[-999:]])
+        self.assertTrue(step['more_before'])
+        step = read_before(path, step['start'], limit=BLOCK_SIZE * 2)
+        self.assertEqual(step['lines'], ['first', 'second', long_line[:-999]])
+
+
+class JobOverviewTest(TestCase):
+
+    def test_overview_is_paginated_and_counted_by_the_database(self):
+        from django.contrib.auth.models import User
+        from django.conf import settings
+        user = User.objects.create_user('overview', password='overview')
+        other = User.objects.create_user('other', password='other')
+        n_jobs = settings.JOBS_PER_PAGE + 3
+        Job.objects.bulk_create([Job(user=user, is_finished=i % 2 == 0) for i in range(n_jobs)] + [Job(user=other)])
+        self.client.login(username='overview', password='overview')
+
+        response = self.client.get(reverse('jobs'), {'sort': 'id'})
+        self.assertEqual(response.context['jobs_count'], n_jobs)
+        self.assertEqual(response.context['running_jobs_count'], n_jobs // 2)
+        page = list(response.context['table'].page.object_list)
+        self.assertEqual(len(page), settings.JOBS_PER_PAGE)
+        self.assertEqual([row.record.pk for row in page], sorted(row.record.pk for row in page))
+
+        # newest first without a sort parameter, paginated by the table only
+        response = self.client.get(reverse('jobs'))
+        newest = Job.objects.filter(user=user).latest('id')
+        self.assertEqual(list(response.context['table'].page.object_list)[0].record.pk, newest.pk)
+        self.assertFalse(response.context['is_paginated'])
+
+
+class EventStreamTest(TestCase):
+
+    def test_stream_pushes_the_events_of_the_job_and_closes_when_idle(self):
+        from unittest import mock
+        from . import events
+        sent = []
+
+        async def receive():
+            await asyncio.sleep(3600)
+
+        async def send(message):
+            sent.append(message)
+
+        async def publish():
+            await asyncio.sleep(0.05)
+            queue = next(iter(events.HUB.subscribers[7]))
+            events.HUB.put(queue, {'type': 'job', 'job': 2, 'user': 7, 'status': 'Started'})
+            events.HUB.put(queue, {'type': 'progress', 'job': 1, 'user': 7, 'progress': {'percent': 42}})
+
+        async def main():
+            with mock.patch.object(events, 'session_user', return_value=7), \
+                    mock.patch.object(events.HUB, 'thread', object()):
+                await asyncio.gather(events.stream({'type': 'http', 'query_string': b'job=1'}, receive, send),
+                                     publish())
+
+        with self.settings(EVENT_STREAM_KEEPALIVE=0.1, EVENT_STREAM_IDLE_TIMEOUT=0.3):
+            asyncio.run(main())
+        self.assertEqual(sent[0]['status'], 200)
+        body = b''.join(message.get('body', b'') for message in sent[1:])
+        self.assertIn(b'event: progress\ndata: {"type": "progress", "job": 1', body)
+        self.assertNotIn(b'"job": 2', body)
+        self.assertIn(b': keepalive', body)
+        self.assertTrue(body.endswith(b'event: idle\ndata: {}\n\n'))
+        self.assertFalse(sent[-1].get('more_body', False))
+        self.assertNotIn(7, events.HUB.subscribers)
+
+
+class TieredCacheTest(TestCase):
+
+    def test_local_tier_shared_tier_and_fallback(self):
+        from unittest import mock
+        from django.test import override_settings
+        from django.core.cache import caches
+        locmem = 'django.core.cache.backends.locmem.LocMemCache'
+        with override_settings(CACHES={
+            'default': {'BACKEND': 'jobs.cache_backend.TieredCache',
+                        'OPTIONS': {'LOCAL_TIMEOUT': 60, 'LOCAL_PREFIXES': ['upload_progress_']}},
+            'shared': {'BACKEND': locmem, 'LOCATION': 'shared'},
+            'db': {'BACKEND': locmem, 'LOCATION': 'db'},
+        }):
+            cache, shared, fallback = caches['default'], caches['shared'], caches['db']
+            cache.set('upload_progress_1', {'received': 1})
+            cache.set('pipeline_1', {'pid': 1})
+            self.assertEqual(shared.get('upload_progress_1'), {'received': 1})
+            # another process changed the keys: local keys are served from the process for LOCAL_TIMEOUT
+            shared.set('upload_progress_1', {'received': 2})
+            shared.set('pipeline_1', {'pid': 2})
+            self.assertEqual(cache.get('upload_progress_1'), {'received': 1})
+            self.assertEqual(cache.get('pipeline_1'), {'pid': 2})
+            cache.get('upload_progress_1')['received'] = 3
+            self.assertEqual(cache.get('upload_progress_1'), {'received': 1})
+            cache.delete('upload_progress_1')
+            self.assertIsNone(cache.get('upload_progress_1'))
+
+            with mock.patch.object(shared, 'set', side_effect=OSError('No space left on device')):
+                cache.set('pipeline_2', {'pid': 3})
+            self.assertEqual(fallback.get('pipeline_2'), {'pid': 3})
+            self.assertEqual(cache.get('pipeline_2'), {'pid': 3})
+
+    def test_upload_progress_writes_are_coalesced(self):
+        from unittest import mock
+        from django.test import override_settings
+        from .uploadhandler import UploadProgress, progress_key
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                               UPLOAD_PROGRESS_INTERVAL=60):
+            from django.core.cache import cache
+            progress = UploadProgress('uuid', data={})
+            with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+                progress.update(force=True, received=0)
+                for i in range(1, 1000):
+                    progress.update(received=i)
+                self.assertEqual(cache_set.call_count, 1)
+                progress.flush()
+                self.assertEqual(cache_set.call_count, 2)
+            self.assertEqual(cache.get(progress_key('uuid')), {'received': 999})
+
+
+class ChunkedUploadTest(TempDirMixin, TestCase):
+
+    def test_chunks_are_checked_and_the_upload_resumes_at_the_stored_offset(self):
+        from django.contrib.auth.models import User
+        from . import chunked_upload
+        archive = bytes(range(256)) * 40
+        chunks = [archive[i:i + 4096] for i in range(0, len(archive), 4096)]
+        with self.settings(CHUNKED_UPLOAD_ROOT=self.tmpdir, CHUNKED_UPLOAD_CHUNK_SIZE=4096):
+            user = User.objects.create_user('uploader')
+            with self.assertRaises(chunked_upload.ChunkError):
+                chunked_upload.create(user, 'model.xml', len(archive))
+            upload = chunked_upload.create(user, '../models.zip', len(archive))
+            self.assertEqual(upload.filename, 'models.zip')
+
+            def send(offset, chunk, checksum=None, length=None):
+                return chunked_upload.append(upload, offset, io.BytesIO(chunk), length or len(chunk),
+                                             checksum or hashlib.sha256(chunk).hexdigest())
+
+            self.assertEqual(send(0, chunks[0]), 4096)
+            # the connection dropped in the middle of the second chunk
+            with self.assertRaises(chunked_upload.ChunkError):
+                send(4096, chunks[1][:1000], hashlib.sha256(chunks[1]).hexdigest(), length=4096)
+            with self.assertRaises(chunked_upload.ChunkError):
+                send(4096, chunks[1], 'f' * 64)
+            with self.assertRaises(chunked_upload.ChunkError) as error:
+                send(8192, chunks[2])
+            self.assertEqual(error.exception.status, 409)
+            with self.assertRaises(chunked_upload.ChunkError):
+                chunked_upload.archive(upload)
+
+            upload.refresh_from_db()
+            offset = upload.offset
+            for chunk in chunks[offset // 4096:]:
+                offset = send(offset, chunk)
+            file = chunked_upload.archive(upload)
+            self.assertEqual(file.read(), archive)
+            file.close()
+            chunked_upload.discard(upload)
+            self.assertFalse(os.path.exists(chunked_upload.part_path(upload)))
+
+
+class JobArchiveTest(TempDirMixin, TestCase):
+
+    def test_archive_is_streamed_and_stored_once_complete(self):
+        from types import SimpleNamespace
+        from . import job_archive
+        os.mkdir(os.path.join(self.tmpdir, 'logs'))
+        model = self.write('model.xml', b'<sbml/>')
+        self.write('logs/PoFcalc.log', b'log\n' * 100)
+        self.write('model.mcs', os.urandom(3 * job_archive.READ_SIZE))
+        table = self.write('result_table_model.csv', b'cardinality,pof\n')
+        job = SimpleNamespace(sbml_file=SimpleNamespace(path=model), result_table=table, sweep_table=None,
+                              is_finished=True)
+
+        self.assertEqual([name for _, name in job_archive.members(job, 'results')],
+                         ['model.xml', 'result_table_model.csv', os.path.join('logs', 'PoFcalc.log')])
+        # an aborted download stores nothing
+        stream = job_archive.archive(job, 'all')[1]
+        next(stream)
+        stream.close()
+        self.assertIsNone(job_archive.cached(job, 'all'))
+
+        path, stream = job_archive.archive(job, 'all')
+        chunks = list(stream)
+        self.assertGreater(len(chunks), 3)
+        with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as zipf:
+            self.assertIsNone(zipf.testzip())
+            self.assertEqual(sorted(zipf.namelist()), ['logs/PoFcalc.log', 'model.mcs', 'model.xml',
+                                                       'result_table_model.csv'])
+        path, stream = job_archive.archive(job, 'all')
+        self.assertIsNone(stream)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b''.join(chunks))
+        self.assertNotIn('.archive_all.zip', [name for _, name in job_archive.members(job, 'all')])
+
+
+class ResultExportTest(TempDirMixin, TestCase):
+
+    def test_csv_is_streamed_with_the_result_tables_joined_in(self):
+        from django.contrib.auth.models import User
+        from . import result_export
+        user = User.objects.create_user('exporter')
+        table = self.write('result_table_model.csv',
+                           b'd,weight,F(d),weighted F(d),acc. weighted F(d),lethal CS,possible CS\n'
+                           b'1,0.1,0.5,0.05,0.05,3,10\n2,0.01,0.2,0.002,0.052,5,45\n')
+        Job.objects.bulk_create([Job(user=user, model_name='model', result='0.052', status='Done', is_finished=True,
+                                     result_table=table),
+                                 Job(user=user, model_name='other', result='0.1', status='Done', is_finished=True)])
+        jobs = Job.objects.filter(user=user)
+
+        with self.settings(EXPORT_CHUNK_SIZE=1):
+            lines = list(csv.reader(''.join(result_export.csv_stream(jobs, with_tables=True)).splitlines(),
+                                    delimiter=';'))
+        self.assertEqual(lines[0], result_export.columns(with_tables=True))
+        self.assertEqual([(line[1], line[-7]) for line in lines[1:]], [('model', '1'), ('model', '2'), ('other', '')])
+        self.assertEqual(len(list(result_export.csv_stream(jobs))), 2)
+
+        rows = list(result_export.typed(result_export.rows(jobs, with_tables=True), with_tables=True))
+        self.assertEqual(rows[1][-7:], [2, 0.01, 0.2, 0.002, 0.052, 5.0, 45.0])
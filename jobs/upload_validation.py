@@ -0,0 +1,35 @@
+from django.core.validators import ValidationError
+
+"""Structural check of the model files of zip and multi-file uploads. sbml_structure_validator only streams the file
+through expat, which is cheap enough to run in the request for every file of an archive, the full validation of every
+job runs in the validate_model task"""
+
+
+class UploadedPath:
+    """stands in for the uploaded file in the validators (which read value.name)"""
+    def __init__(self, path):
+        self.name = path
+
+
+def validate_file(path, full=False):
+    """runs sbml_structure_validator (or sbml_validator if full) on a model file. Returns the error messages, empty if
+    the file is valid"""
+    from .validators import sbml_structure_validator, sbml_validator
+    try:
+        (sbml_validator if full else sbml_structure_validator)(UploadedPath(path))
+    except ValidationError as e:
+        return e.messages
+    except Exception as e:
+        return [repr(e)]
+    return []
+
+
+def validate_files(paths, on_done=None):
+    """validates the files one after another, calls on_done(path, errors) as soon as a file is validated.
+    Returns {path: errors}"""
+    results = {}
+    for path in paths:
+        results[path] = validate_file(path)
+        if on_done is not None:
+            on_done(path, results[path])
+    return results
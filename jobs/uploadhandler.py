@@ -1,5 +1,11 @@
+from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadhandler import TemporaryFileUploadHandler
+import time
+
+"""Upload progress of the job form. The state of an upload (size, received bytes, validated files) is kept by the
+request in an UploadProgress and written to the cache (upload_progress_<X-Progress-ID>) at most every
+UPLOAD_PROGRESS_INTERVAL seconds, the form polls it through the upload_progress view"""
 
 
 def get_progress_id(request):
@@ -11,6 +17,37 @@ def get_progress_id(request):
     return progress_id
 
 
+def progress_key(progress_id):
+    return f'upload_progress_{progress_id}'
+
+
+def update_interval():
+    return getattr(settings, 'UPLOAD_PROGRESS_INTERVAL', 0.25)
+
+
+class UploadProgress:
+    """progress state of an upload, changes are written to the cache coalesced"""
+    timeout = 30
+
+    def __init__(self, progress_id, data=None):
+        self.key = progress_key(progress_id)
+        self.data = data if data is not None else cache.get(self.key, {})
+        self.interval = update_interval()
+        self.last_write = 0.0
+        self.changed = False
+
+    def update(self, force=False, **fields):
+        self.data.update(fields)
+        self.changed = True
+        if force or time.monotonic() - self.last_write >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self.changed:
+            cache.set(self.key, self.data, self.timeout)
+            self.changed, self.last_write = False, time.monotonic()
+
+
 class ProgressBarUploadHandler(TemporaryFileUploadHandler):
     """
     Cache system for TemporaryFileUploadHandler
@@ -18,18 +55,14 @@ class ProgressBarUploadHandler(TemporaryFileUploadHandler):
     def __init__(self, *args, **kwargs):
         super(TemporaryFileUploadHandler, self).__init__(*args, **kwargs)
         self.progress_id = None
+        self.progress = None
         self.original_file_name = None
 
     def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
         self.progress_id = get_progress_id(self.request)
         if self.progress_id:
-            cache.set(self.progress_id, {
-                'size': content_length,
-                'status': 'Uploading',
-                'received': 0,
-                'done': 0,
-                'total': 0
-            }, 30)
+            self.progress = UploadProgress(self.progress_id, data={})
+            self.progress.update(force=True, size=content_length, status='Uploading', received=0, done=0, total=0)
 
     def new_file(self, *args, **kwargs):
         """
@@ -40,17 +73,12 @@ class ProgressBarUploadHandler(TemporaryFileUploadHandler):
         self.original_file_name = self.file_name
 
     def receive_data_chunk(self, raw_data, start):
-        if self.progress_id:
-            data = cache.get(self.progress_id, {})
-            data['received'] += self.chunk_size
-            cache.set(self.progress_id, data, 30)
+        if self.progress is not None:
+            self.progress.update(received=self.progress.data['received'] + len(raw_data))
         self.file.write(raw_data)
 
     def upload_complete(self):
-        # deprecated in favor of setting an expiry time a-la-nginx
-        # setting an expiry time fixes the race condition in which the last
-        # progress request happens after the upload has finished meaning the
-        # bar never gets to 100%
-        pass
-        #if self.cache_key:
-        #    cache.delete(self.cache_key)
\ No newline at end of file
+        # the entry expires after UploadProgress.timeout a-la-nginx, deleting it here would race with the last
+        # progress request and the bar would never get to 100%
+        if self.progress is not None:
+            self.progress.flush()
@@ -2,18 +2,75 @@ from django.core.validators import ValidationError
 import libsbml
 from django.db.models.fields.files import FieldFile, FileField
 from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.conf import settings
+from xml.parsers import expat
+import numpy as np
 import cobra
+import math
 import os
 
+# bytes read at a time by the structural check
+READ_CHUNK_SIZE = 1 << 20
+
+
+def _open_upload(value):
+    """binary file object of an uploaded model (in memory, temporary upload path or path on disk) and whether it has
+    to be closed after reading"""
+    if isinstance(value, FieldFile):
+        if hasattr(value.file, 'temporary_file_path'):
+            return open(value.file.temporary_file_path(), 'rb'), True
+        value.file.seek(0)
+        return value.file, False
+    return open(value.name, 'rb'), True
+
+
+def sbml_structure_validator(value):
+    """
+    Fast structural check of the uploaded SBML/XML file in the request: the file has to be well-formed XML with an
+    <sbml> root element. It is streamed through expat in chunks, the full libSBML validation (sbml_validator) runs in
+    the validate_model task before the job is computed
+    :param value: FileField/FieldFile object
+    :return: FileField object or ValidationError
+    """
+    if os.path.splitext(value.name)[1].lower() not in ('.xml', '.sbml'):
+        return value
+    root = []
+
+    def start_element(name, attributes):
+        if not root:
+            root.append(name)
+
+    parser = expat.ParserCreate()
+    parser.StartElementHandler = start_element
+    f, close = _open_upload(value)
+    try:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+            parser.Parse(chunk, False)
+        parser.Parse(b'', True)
+    except expat.ExpatError as e:
+        raise ValidationError(message=f'XML/line {e.lineno}: {expat.errors.messages[e.code]}',
+                              code='sbml_file_error', params={'error': expat.errors.messages[e.code], 'line': e.lineno})
+    finally:
+        if close:
+            f.close()
+        else:
+            f.seek(0)
+    if not root or root[0].split(':')[-1] != 'sbml':
+        raise ValidationError(message='The file is not an SBML model (no <sbml> root element)',
+                              code='sbml_file_error', params={'error': 'no <sbml> root element', 'line': 1})
+    return value
+
 
 def sbml_validator(value):
     """
-    Validates the uploaded SBML/XML file using the libSBML library
+    Validates the uploaded SBML/XML file using the libSBML library. Runs in the validate_model task, the form only
+    checks the structure of the file (sbml_structure_validator)
     :param value: FileField/FieldFile object
     :return: FileField object or ValidationError
     """
     if os.path.splitext(value.name)[1] == '.json':  # no support for JSON validation!
         return
+    uploaded_path = None
     try:
         reader = libsbml.SBMLReader()
         if isinstance(value, FileField):
@@ -29,12 +86,15 @@ def sbml_validator(value):
             else:
                 # file size > 2.5MB: file not saved in memory but at a temporary upload path
                 document = reader.readSBML(value.file.temporary_file_path())
+                uploaded_path = value.file.temporary_file_path()
                 # 2nd validation with cobra
                 # cobraval = cobra.io.validate_sbml_model(value.file.temporary_file_path())
 
         else:
             document = reader.readSBML(value.name)
             # cobraval = cobra.io.validate_sbml_model(value.name)
+            if os.path.isfile(value.name):
+                uploaded_path = value.name
 
         nr_errors = document.getNumErrors()
         if nr_errors:
@@ -48,6 +108,14 @@ def sbml_validator(value):
                 errors.append(f'{category}/line {line}: {msg}')
             raise ValidationError(message=errors, code='sbml_file_error', params={'error': msg, 'line': line})
 
+        if uploaded_path is not None:
+            # the document is parsed already - store the model for the pipeline (see parsed_model.py)
+            from .parsed_model import ensure
+            try:
+                ensure(uploaded_path, document=document)
+            except Exception:
+                pass  # sbml_processing parses the file itself
+
         # # cobra validation
         # if cobraval[0] is None:
         #     raise ValidationError(message=cobraval[1]['COBRA_FATAL'], code='sbml_file_error',
@@ -56,4 +124,64 @@ def sbml_validator(value):
         return value
     except Exception as e:
         raise ValidationError(message=e.args[0], code='sbml_validation_exception',
-                              params={'error':e.args[0], 'line': '?'})
\ No newline at end of file
+                              params={'error':e.args[0], 'line': '?'})
+
+
+def too_many_rates():
+    return ValidationError(message=f'At most {settings.MAX_SWEEP_RATES} mutation rates per sweep',
+                           code='invalid_sweep')
+
+
+def rates_out_of_range():
+    return ValidationError(message='Mutation rates have to be between 0 and 100%', code='invalid_sweep')
+
+
+def valid_rate(rate):
+    return math.isfinite(rate) and 0 < rate < 100
+
+
+def parse_mutation_rates(value):
+    """
+    Parses the mutation rates (%) of a sweep job. Either a list ('0.01, 0.1, 1') or start:stop:number for log-spaced
+    rates ('0.001:1:20')
+    :param value: str
+    :return: sorted list of unique rates (float), ValidationError if a range has more than MAX_SWEEP_RATES rates or
+    doesn't satisfy 0 < start <= stop < 100
+    """
+    value = value.strip()
+    if ':' in value:
+        start, stop, num = value.split(':')
+        start, stop, num = float(start), float(stop), int(num)
+        # checked before the rates are generated
+        if num > settings.MAX_SWEEP_RATES:
+            raise too_many_rates()
+        if not (valid_rate(start) and valid_rate(stop)):
+            raise rates_out_of_range()
+        if start > stop:
+            raise ValidationError(message='The start of a mutation rate range has to be at most its stop',
+                                  code='invalid_sweep')
+        rates = np.logspace(np.log10(start), np.log10(stop), num).tolist()
+    else:
+        rates = [float(rate) for rate in value.replace(';', ',').replace(' ', ',').split(',') if rate]
+    return sorted(set(rates))
+
+
+def mutation_rate_sweep_validator(value):
+    """
+    Validates the mutation rates (%) of a sweep job
+    :param value: str
+    :return: str or ValidationError
+    """
+    try:
+        rates = parse_mutation_rates(value)
+    except ValueError:
+        raise ValidationError(message='Enter comma separated mutation rates (e.g. 0.01, 0.1, 1) or start:stop:number '
+                                      '(e.g. 0.001:1:20)', code='invalid_sweep')
+    if not rates:
+        raise ValidationError(message='Enter at least one mutation rate', code='invalid_sweep')
+    if len(rates) > settings.MAX_SWEEP_RATES:
+        raise too_many_rates()
+    # not only the first and last rate, nan doesn't sort
+    if not all(valid_rate(rate) for rate in rates):
+        raise rates_out_of_range()
+    return value
@@ -1,15 +1,15 @@
-from django.shortcuts import redirect
+from django.shortcuts import redirect, get_object_or_404
 from django.urls import reverse_lazy, reverse
 from django.contrib.auth.decorators import login_required
 from .forms import JobSubmissionForm, JobTable
 from django.views.generic import CreateView, DetailView, ListView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views.generic.edit import FormMixin
-from .models import Job, SubTask
+from .models import Job, SubTask, ChunkedUpload
 from ipware import get_client_ip
 from django.forms.models import model_to_dict
 from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, FileResponse, HttpResponseRedirect, \
-    HttpResponseServerError
+    HttpResponseServerError, HttpResponseBadRequest
 from django_celery_results.models import TaskResult
 from celery.result import AsyncResult
 from django_tables2.views import SingleTableView
@@ -22,26 +22,19 @@ import os
 from django.utils import timezone
 import pandas as pd
 import shutil
-from io import BytesIO as IO
-from zipfile import ZipFile
+from zipfile import ZipFile, BadZipFile
 from django.utils.datastructures import MultiValueDict
 from django.core.files.uploadhandler import TemporaryFileUploadHandler
 from django.core.validators import ValidationError
 from django.contrib import messages
 from django.http import StreamingHttpResponse
-import time
-from jobs.uploadhandler import get_progress_id
+from jobs.uploadhandler import get_progress_id, progress_key, UploadProgress
 from .tasks import revoke_job
+from . import upload_validation, progress, log_tail, chunked_upload, job_archive, result_export
 from RobustQ.celery import app
 
 
-def uploadstream(request, user):
-    def event_stream():
-        while True:
-            progress = cache.get('current_upload')
-            time.sleep(1)
-            yield f'data: {progress} from {request.user.username}\n\n'
-    return StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+UPLOAD_CHUNK_SIZE = 1 << 20
 
 
 # view that display the current upload progress (json)
@@ -54,7 +47,7 @@ def upload_progress(request, uuid):
     else:
         progress_id = get_progress_id(request)
     if progress_id:
-        data = cache.get(progress_id, None)
+        data = cache.get(progress_key(progress_id), None)
         return JsonResponse(data, safe=False)
     else:
         return HttpResponseServerError('Server Error: You must provide X-Progress-ID header or query param.')
@@ -69,6 +62,7 @@ class NewJobMixin(CreateView, FormMixin):
     form_list = []
     object = None
     progress_id = None
+    upload_progress = None
 
     def get_success_url(self):
         return '/jobs/'
@@ -77,6 +71,7 @@ class NewJobMixin(CreateView, FormMixin):
         context = super().get_context_data(**kwargs)
         context['job_form'] = context['form']
         context['max_upload'] = filesizeformat(settings.MAX_UPLOAD_SIZE)
+        context['max_archive'] = filesizeformat(chunked_upload.max_size())
         context['allowed_ext'] = ',.'.join(settings.ALLOWED_EXTENSIONS)
         context['timelimit'] = (settings.CELERY_TASK_TIME_LIMIT)/3600
         context['days_deleted'] = settings.DAYS_UNTIL_JOB_DELETE
@@ -87,7 +82,6 @@ class NewJobMixin(CreateView, FormMixin):
         file = request.FILES['sbml_file']
         self.progress_id = file.progress_id
         if len(request.FILES.getlist('sbml_file')) > 1:  # did the user upload multiple files?
-            cache.set('current_upload', len(request.FILES.getlist('sbml_file')), timeout=180)
             return self.multi_file_upload_handler(request)
 
         # only a single file was uploaded - check if its a zip archive first
@@ -97,7 +91,7 @@ class NewJobMixin(CreateView, FormMixin):
             return self.zip_file_handler(request, file)
 
         if JobSubmissionForm(request.POST).data.get('skip_validation', None) == 'on':
-            form = JobSubmissionForm(request.POST, request.FILES)
+            form = JobSubmissionForm(request.POST, request.FILES, prevalidated=True)
             form.is_valid()
             form.instance.user = request.user
             form._errors = {}
@@ -116,140 +110,139 @@ class NewJobMixin(CreateView, FormMixin):
 
     def zip_file_handler(self, request, file):
         """
-        called when the user uploads a zip. Creates a new Job object by calling form.save() for each
-        sbml file in the archive. We create a new 'fake' form for each file so we can run validation on each
-        file separately by calling form.is_valid()
+        called when the user uploads a zip. Creates a new Job object for each sbml file in the archive. The members
+        are streamed to temporary files (a corrupted member fails its CRC check while it is copied) and validated,
+        see create_jobs()
         """
-        myzip = ZipFile(file.file)
-        failed_files = []
-
-        if myzip.testzip():  # returns something if the zip is faulty
+        try:
+            myzip = ZipFile(file.file)
+            members = []
+            for member in myzip.infolist():
+                model_name, ext = os.path.splitext(member.filename)
+                if member.is_dir() or ext.replace('.', '') not in settings.ALLOWED_EXTENSIONS or \
+                        os.path.basename(model_name).startswith('.') or model_name.startswith('__MACOSX'):
+                    continue
+                members.append(member)
+            self.update_cache(zip_total=len(members))
+
+            files, failed_files = [], []
+            for member in members:
+                if member.file_size > settings.MAX_UPLOAD_SIZE:  # don't even extract it
+                    failed_files.append(os.path.basename(member.filename))
+                    self.update_cache(file=os.path.basename(member.filename), file_status='Failed')
+                    continue
+                # manually instantiate and create a TempUploadedFile object, which gets passed to the validators and
+                # holds our model file from the zip
+                # see https://docs.djangoproject.com/en/3.0/_modules/django/core/files/uploadhandler/
+                temp_file_handler = TemporaryFileUploadHandler(request)
+                temp_file_handler.new_file(field_name='sbml_file', file_name=os.path.basename(member.filename),
+                                           content_type='text/xml', content_length=member.file_size, charset=None)
+                with myzip.open(member) as f:
+                    shutil.copyfileobj(f, temp_file_handler.file, UPLOAD_CHUNK_SIZE)
+                temp_file_handler.file_complete(member.file_size)  # calls file.seek(0) and sets file.size
+                files.append(temp_file_handler.file)
+            myzip.close()
+        except (BadZipFile, OSError, EOFError, NotImplementedError):
             form = JobSubmissionForm(request.POST, request.FILES)
-            form.is_valid()
-            print(vars(form.cleaned_data['sbml_file']))
             form.add_error('sbml_file', ValidationError('Could not read archive. It may be corrupted or contain '
                                                         'bad files.'))
             return self.form_invalid(form)
 
-        filelist = myzip.namelist()
-        any_form_valid = False
-        self.update_cache(zip_total=len(filelist))
-
-        for model in filelist:
-            model_name, ext = os.path.splitext(model)
-            if ext.replace('.', '') not in settings.ALLOWED_EXTENSIONS or os.path.basename(model_name).startswith('.')\
-                    or model_name.startswith('__MACOSX'):
-                continue
-
-            file_size = myzip.getinfo(model).file_size
-            file_dict = MultiValueDict()
-            temp_file_handler = TemporaryFileUploadHandler(request)  # manually instantiate and create a
-            # TempUploadedFile object
-            # see https://docs.djangoproject.com/en/3.0/_modules/django/core/files/uploadhandler/
-
-            with myzip.open(model) as f:
-                temp_file_handler.new_file(field_name='sbml_file', file_name=os.path.basename(f.name),
-                                           content_type='text/xml',
-                                           content_length=file_size, charset=None)  # this class now holds our xml file
-                temp_file_handler.file.write(f.read())  # write the content to the tempuploadFile, which
-                # gets passed to the validators and holds our model file from the zip
-            # temp_file_handler.file.seek(0)
-            temp_file_handler.file_complete(file_size)  # calls file.seek(0) and sets file.size to file_size
-            file_dict['sbml_file'] = temp_file_handler.file
-            # InMemoryUploadedFile(f, 'sbml_file', f.name, 'text/xml', file_size, charset='utf-8')
-            # manually create a form object from each file in zip
-            # file_dict is a MultiValueDict() which holds our file, copying a request.FILES-like object
-            temp_form = JobSubmissionForm(request.POST, file_dict)
-
-            if temp_form.fields['skip_validation']:
-                # form = JobSubmissionForm(request.POST, request.FILES)
-                temp_form.is_valid()
-                temp_form.instance.user = request.user
-                temp_form._errors = {}
-                temp_form.save()
-                self.update_cache()
-                any_form_valid = True
-                continue
-            try:
-                if temp_form.is_valid():  # if the 'form' is valid, save it as a new Job object, thus queueing it up
-                    temp_form.instance.user = self.request.user
-                    temp_form.save()
-                    any_form_valid = True
-                else:
-                    failed_files.append(temp_file_handler.file.name)
-            except:
-                failed_files.append(temp_file_handler.file.name)
-            self.update_cache()
-
-        myzip.close()
-
-        if failed_files:
-            messages.add_message(request, messages.ERROR, f'File(s) {", ".join(failed_files)} failed SBML '
-                                                          f'validation. Try to upload them separately '
-                                                          f'to see detailed error messages.')
-
-        return HttpResponseRedirect(self.get_success_url()) if any_form_valid \
-            else self.form_invalid(JobSubmissionForm(
-                request.POST, request.FILES
-            ))
+        created, failed = self.create_jobs(request, files)
+        return self.finish_upload(request, created, failed_files + failed)
 
     def multi_file_upload_handler(self, request):
         """
         called when the user uploads multiple file (by selection). Like the zip file handler,
-        this saves a new Job object for each file. We create a new 'fake' form for each file so we can run validation on each
-        file separately by calling form.is_valid()
+        this saves a new Job object for each file, the files are validated in create_jobs()
         """
-        failed_files = []
-        any_form_valid = False
+        files = []
         total_files = len(request.FILES.getlist('sbml_file'))
         self.update_cache(total=total_files)
+        any_zip_valid = False
 
         for file in request.FILES.getlist('sbml_file'):
             _, ext = os.path.splitext(file.name)
             if ext == '.zip':
-                self.zip_file_handler(request, file)
-            file_dict = MultiValueDict()
-            file_dict['sbml_file'] = file
-            temp_form = JobSubmissionForm(request.POST, file_dict)
-            if temp_form.fields['skip_validation']:
-                # form = JobSubmissionForm(request.POST, request.FILES)
-                temp_form.is_valid()
-                temp_form.instance.user = request.user
-                temp_form._errors = {}
-                temp_form.save()
-                any_form_valid = True
-                self.update_cache()
+                any_zip_valid |= isinstance(self.zip_file_handler(request, file), HttpResponseRedirect)
                 continue
-            try:
-                if temp_form.is_valid():  # if the 'form' is valid, save it as a new Job object, thus queueing it up
-                    temp_form.instance.user = self.request.user
-                    temp_form.save()
-                    any_form_valid = True
-                else:
-                    failed_files.append(file.name)
-            except:
+            files.append(file)
+
+        created, failed_files = self.create_jobs(request, files)
+        return self.finish_upload(request, created + any_zip_valid, failed_files)
+
+    def create_jobs(self, request, files):
+        """
+        validates the structure of the uploaded model files (upload_validation.py) and saves a Job for every
+        valid one. The Jobs are created from forms that don't validate the file again. Reports the progress of every
+        file to upload_progress. Returns the number of created Jobs and the names of the failed files
+        """
+        skip_validation = request.POST.get('skip_validation', None) == 'on'
+        failed_files = []
+        created = 0
+        pending = {}
+        for file in files:
+            if hasattr(file, 'temporary_file_path') and not skip_validation:
+                pending[file.temporary_file_path()] = file
+            elif self.save_job(request, file, prevalidated=skip_validation):
+                created += 1
+                self.update_cache(file=file.name, file_status='Valid')
+            else:
                 failed_files.append(file.name)
-            self.update_cache()
+                self.update_cache(file=file.name, file_status='Failed')
+
+        def on_done(path, errors):
+            self.update_cache(file=pending[path].name, file_status='Failed' if errors else 'Validated')
 
+        results = upload_validation.validate_files(list(pending), on_done=on_done)
+        for path, file in pending.items():
+            if not results[path] and self.save_job(request, file, prevalidated=True):
+                created += 1
+            else:
+                failed_files.append(file.name)
+        return created, failed_files
+
+    def save_job(self, request, file, prevalidated):
+        """saves a new Job for one uploaded file with the parameters of the submitted form"""
+        file_dict = MultiValueDict()
+        file_dict['sbml_file'] = file
+        form = JobSubmissionForm(request.POST, file_dict, prevalidated=prevalidated)
+        try:
+            if not form.is_valid():
+                return False
+            form.instance.user = request.user
+            form.instance.ip, _ = get_client_ip(request)
+            form.save()
+        except Exception:
+            return False
+        return True
+
+    def finish_upload(self, request, created, failed_files):
+        if self.upload_progress is not None:
+            self.upload_progress.flush()
         if failed_files:
             messages.add_message(request, messages.ERROR, f'File(s) {", ".join(failed_files)} failed SBML '
                                                           f'validation. Try to upload them separately '
                                                           f'to see detailed error messages.')
-        return HttpResponseRedirect(self.get_success_url()) if any_form_valid \
+        return HttpResponseRedirect(self.get_success_url()) if created \
             else self.form_invalid(JobSubmissionForm(
                 request.POST, request.FILES
             ))
 
     def update_cache(self, **kwargs):
-        """ essentially adds +1 to total done count / updates cache with kwargs"""
-        uuid = self.progress_id
-        data = cache.get(uuid, {})
+        """ essentially adds +1 to total done count / updates cache with kwargs. file/file_status report the
+        validation state of a single file. The writes are coalesced (see uploadhandler.UploadProgress)"""
+        if self.upload_progress is None:
+            self.upload_progress = UploadProgress(self.progress_id)
+        data = self.upload_progress.data
         data['status'] = 'Validating'
-        data['total'] += kwargs.pop('total', 0)
+        data['total'] = data.get('total', 0) + kwargs.pop('total', 0)
         zip_total = kwargs.pop('zip_total', 0)
         data['total'] += zip_total
-        data['done'] += 1
-        cache.set(uuid, data)
+        data['done'] = data.get('done', 0) + 1
+        if 'file' in kwargs:
+            data.setdefault('files', {})[kwargs['file']] = kwargs['file_status']
+        self.upload_progress.update()
 
 
 class NewJobView(LoginRequiredMixin, NewJobMixin):
@@ -257,24 +250,79 @@ class NewJobView(LoginRequiredMixin, NewJobMixin):
     pass
 
 
+def chunked_upload_state(upload):
+    return {**chunked_upload.state(upload), 'url': reverse('chunked_upload', args=[upload.id]),
+            'complete_url': reverse('chunked_upload_complete', args=[upload.id])}
+
+
+@login_required
+def chunked_upload_create(request):
+    """Returns: JsonResponse
+    starts a resumable upload of a zip archive (POST filename, size), see chunked_upload.py"""
+    if request.method != 'POST':
+        return HttpResponseBadRequest('POST filename and size')
+    try:
+        upload = chunked_upload.create(request.user, request.POST.get('filename'), int(request.POST.get('size', 0)))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid size'}, status=400)
+    except chunked_upload.ChunkError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    return JsonResponse(chunked_upload_state(upload), status=201)
+
+
+@login_required
+def chunked_upload_chunk(request, upload_id):
+    """Returns: JsonResponse
+    GET: offset of the upload, the next chunk starts there. PUT: appends the chunk in the body, with its offset
+    (X-Upload-Offset) and SHA-256 (X-Chunk-SHA256). The response holds the offset of the upload in any case"""
+    upload = get_object_or_404(ChunkedUpload, id=upload_id, user=request.user)
+    if request.method == 'PUT':
+        try:
+            chunked_upload.append(upload, int(request.META.get('HTTP_X_UPLOAD_OFFSET', -1)), request,
+                                  int(request.META.get('CONTENT_LENGTH') or 0), request.META.get('HTTP_X_CHUNK_SHA256'))
+        except ValueError:
+            return JsonResponse({**chunked_upload_state(upload), 'error': 'Invalid offset'}, status=400)
+        except chunked_upload.ChunkError as e:
+            return JsonResponse({**chunked_upload_state(upload), 'error': str(e)}, status=e.status)
+    return JsonResponse(chunked_upload_state(upload))
+
+
+class ChunkedUploadCompleteView(LoginRequiredMixin, NewJobMixin):
+    """the job form is posted here once its archive is uploaded (see chunked_upload_chunk), creates the jobs of the
+    archive like a zip posted with the form"""
+
+    def post(self, request, *args, **kwargs):
+        upload = get_object_or_404(ChunkedUpload, id=kwargs['upload_id'], user=request.user)
+        try:
+            file = chunked_upload.archive(upload)
+        except chunked_upload.ChunkError as e:
+            return JsonResponse({**chunked_upload_state(upload), 'error': str(e)}, status=e.status)
+        self.progress_id = str(upload.id)
+        try:
+            return self.zip_file_handler(request, file)
+        finally:
+            file.close()
+            chunked_upload.discard(upload)
+
+
 class JobOverView(LoginRequiredMixin, SingleTableView, ListView):
-    """Class based job overview"""
-    # paginate_by = 10
+    """Class based job overview, paginated (JOBS_PER_PAGE) and sorted by the database"""
     template_name = 'jobs/overview.html'
     form_class = JobTable
     table_class = JobTable
+    # paginated by the table only, paginate_by of the ListView would paginate (and count) a second time
+    table_pagination = {'per_page': settings.JOBS_PER_PAGE}
 
     def get_queryset(self):
-        """ Returns jobs that belong to the current user """
-        return self.request.user.job_set.all()
+        """ Returns jobs that belong to the current user (newest first), only the columns of the table """
+        columns = [field for field in JobTable.Meta.fields if field != 'details']
+        return Job.objects.filter(user=self.request.user).only(*columns, 'is_finished', 'user').order_by('-id')
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(**kwargs)
-        jobs = self.request.user.job_set.all()
-        self.table = JobTable(jobs)  # -> table defined in forms.py
-        context['running_jobs'] = jobs.filter(is_finished='False')
-        context['jobs'] = jobs
-
+        # counted by the paginator already
+        context['jobs_count'] = context['table'].paginator.count
+        context['running_jobs_count'] = Job.objects.filter(user=self.request.user, is_finished=False).count()
         return context
 
 
@@ -294,9 +342,10 @@ class JobDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
         context = super().get_context_data(**kwargs)
         job = context['object']
         job_dict = model_to_dict(job)
-        to_pop = ['public_path', 'task_id_job', 'ip', 'sbml_file', 'user']
+        to_pop = ['public_path', 'task_id_job', 'ip', 'sbml_file', 'user', 'cache_key']
         # to_pop = []
         context['rt'] = job_dict.pop('result_table')
+        context['st'] = job_dict.pop('sweep_table')
         for k, v in job_dict.items():
             if v is None:
                 to_pop.append(k)
@@ -315,15 +364,16 @@ class JobDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
 
                 d['logfile'] = {}
                 try:
-                    with open(d['logfile_path'], 'r') as l:
-                        d['logfile']['logdata'] = l.readlines()
+                    # only the last lines, the rest is fetched by the page (tail_logfile)
+                    d['logfile'] = log_tail.read_before(d['logfile_path'], n_lines=log_tail.tail_lines())
+                    d['logfile']['logdata'] = d['logfile'].pop('lines')
 
                     d['logfile']['path'] = '/' + os.path.relpath(d.pop('logfile_path'))  # settings.STATIC_URL + os.path.join(fpath, f'logs/{d["name"]}.log')
 
                 except TypeError:
-                    d['logfile']['logdata'] = 'Could not load logfile'
+                    d['logfile']['logdata'] = ['Could not load logfile']
                 except FileNotFoundError:
-                    d['logfile']['logdata'] = 'Logfile not found or deleted'
+                    d['logfile']['logdata'] = ['Logfile not found or deleted']
 
                 try:
                     taskresult = TaskResult.objects.get(task_id=d['task_id'])
@@ -358,7 +408,7 @@ def cancel_job(request, pk):
     job = Job.objects.get(id=pk)
 
     if not request.user == job.user:
-        return HttpResponseForbidden
+        return HttpResponseForbidden()
     if job.is_finished:
         return redirect('index-home')
 
@@ -369,6 +419,18 @@ def cancel_job(request, pk):
         return HttpResponse('Failed to cancel job', status=400)
 
 
+@login_required
+def job_status(request, pk):
+    """status, progress of the stages and ETA (s) of a job (json), fetched by the details page on the events of the
+    job (events.py) or polled without the event stream (see progress.py)"""
+    job = get_object_or_404(Job, id=pk)
+    if not request.user == job.user:
+        return HttpResponseForbidden()
+    return JsonResponse({'id': job.id, 'status': job.status, 'is_finished': job.is_finished,
+                         'validation_errors': job.validation_errors.splitlines() if job.validation_errors else [],
+                         **progress.job_progress(job)})
+
+
 @login_required
 def cancel_all_jobs(request):
     jobs_to_cancel = Job.objects.filter(user=request.user, is_finished=False)
@@ -386,38 +448,28 @@ def download_results(request, type):
     """
     Args:
         request: Django request
-        type: (str) 'csv' or 'excel'
+        type: (str) 'csv', 'xlsx' or 'parquet'
 
-    Returns: HttpResponse for file download
-    Gathers all results and serves them as a downloadable csv/xl file
+    Returns: StreamingHttpResponse (csv) or FileResponse for file download
+    Gathers the results of all finished jobs, ?tables=1 joins in the result table of every job (one row per
+    cardinality). The jobs are read in chunks, see result_export.py
     """
+    if type == 'xslx':  # old links
+        type = 'xlsx'
+    if type not in result_export.FORMATS:
+        return HttpResponseBadRequest(f'type has to be one of {", ".join(result_export.FORMATS)}')
+    if type == 'parquet' and not result_export.parquet_available():
+        return HttpResponse('Parquet export is not available on this server', status=501)
+    with_tables = request.GET.get('tables') == '1'
     jobs = Job.objects.filter(user=request.user, is_finished=True, status='Done')
-    data = jobs.values('model_name', 'result', 'cardinality_mcs', 'cardinality_pof',
-                       'compression', 'make_consistent', 'mutation_rate', 'reactions',
-                       'metabolites', 'genes', 'objective_expression', 'duration', 'status')
-    df = pd.DataFrame.from_records(data)
 
     if type == 'csv':
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename=RobustQ_results_all.csv'
-
-        df.to_csv(path_or_buf=response, sep=';', float_format='%.4f', index=False, decimal=".")
+        response = StreamingHttpResponse(result_export.csv_stream(jobs, with_tables), content_type='text/csv')
     else:
-        xlfile = IO()
-        xlwriter = pd.ExcelWriter(xlfile)
-        df.to_excel(xlwriter)
-        xlwriter.save()
-        xlwriter.close()
-
-        # important step, rewind the buffer or when it is read() you'll get nothing
-        # but an error message when you try to open your zero length file in Excel
-        xlfile.seek(0)
-
-        # set the mime type so that the browser knows what to do with the file
-        response = HttpResponse(xlfile.read(),
-                                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = 'attachment; filename=results.xlsx'
-
+        response = FileResponse(result_export.export_file(jobs, type, with_tables),
+                                content_type=result_export.CONTENT_TYPES[type])
+    filename = f'RobustQ_results_all{"_tables" if with_tables else ""}.{type}'
+    response['Content-Disposition'] = f'attachment; filename={filename}'
     return response
 
 
@@ -427,28 +479,59 @@ def serve_logfile(request, task_id):
     Serves a text/log file from a certain task"""
     task = SubTask.objects.get(id=task_id)
     if not request.user == task.job.user:
-        return HttpResponseForbidden
+        return HttpResponseForbidden()
     file = open(task.logfile_path, 'r')
     return FileResponse(file)
 
 
+@login_required
+def tail_logfile(request, task_id):
+    """Returns: JsonResponse
+    Lines of a task log after (?after=<byte offset>) or before (?before=<byte offset>) a cursor, without a cursor the
+    last lines. At most LOG_TAIL_MAX_BYTES per request (see log_tail.py)"""
+    task = get_object_or_404(SubTask, id=task_id)
+    if not request.user == task.job.user:
+        return HttpResponseForbidden()
+    try:
+        if 'after' in request.GET:
+            data = log_tail.read_after(task.logfile_path, int(request.GET['after']))
+        elif 'before' in request.GET:
+            data = log_tail.read_before(task.logfile_path, int(request.GET['before']))
+        else:
+            data = log_tail.read_before(task.logfile_path, n_lines=log_tail.tail_lines())
+    except ValueError:
+        return HttpResponseBadRequest('Invalid cursor')
+    except (TypeError, OSError):
+        return JsonResponse({'error': 'Logfile not found or deleted'}, status=404)
+    return JsonResponse(data)
+
+
 @login_required
 def download_job(request, pk):
-    """Returns: FileResponse
-    Serves a zip file with all logs/files from a job"""
-    job = Job.objects.get(id=pk)
+    """Returns: StreamingHttpResponse or FileResponse
+    Serves a zip file with the logs/files of a job, ?files=results only the model, result tables and logs. The zip is
+    streamed while it is written, the one of a finished job is stored and served from the file (see job_archive.py)"""
+    job = get_object_or_404(Job, id=pk)
     if not request.user == job.user:
-        return HttpResponseForbidden
-    filename = f'RobustQ_{job.model_name}.zip'
-    # zipf = shutil.make_archive(filename, 'zip', os.path.dirname(job.sbml_file.path))
-    # zipf_ = open(zipf, 'rb')
-    response = HttpResponse()
-    zipf_ = ZipFile(response, 'w')
-    path = os.path.dirname(job.sbml_file.path)
-    for root, dirs, files in os.walk(path):
-        for file in files:
-            zipf_.write(os.path.join(root, file), os.path.relpath(os.path.join(root, file), path))
-    zipf_.close()
+        return HttpResponseForbidden()
+    subset = request.GET.get('files', 'all')
+    if subset not in job_archive.SUBSETS:
+        return HttpResponseBadRequest(f'files has to be one of {", ".join(job_archive.SUBSETS)}')
+    filename = f'RobustQ_{job.model_name}.zip' if subset == 'all' else f'RobustQ_{job.model_name}_{subset}.zip'
+
+    path, stream = job_archive.archive(job, subset)
+    if path is None:
+        response = StreamingHttpResponse(stream, content_type='application/zip')
+    elif settings.JOB_ARCHIVE_SENDFILE == 'X-Accel-Redirect':
+        # nginx serves MEDIA_ROOT as an internal location at JOB_ARCHIVE_SENDFILE_URL
+        response = HttpResponse(content_type='application/zip')
+        response['X-Accel-Redirect'] = settings.JOB_ARCHIVE_SENDFILE_URL + \
+            os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+    elif settings.JOB_ARCHIVE_SENDFILE:
+        response = HttpResponse(content_type='application/zip')
+        response[settings.JOB_ARCHIVE_SENDFILE] = path
+    else:
+        response = FileResponse(open(path, 'rb'), content_type='application/zip')
     response['Content-Disposition'] = 'attachment; filename={}'.format(filename)
     return response
 
@@ -467,14 +550,29 @@ def result_table(request, pk, type):
     """
     job = Job.objects.get(id=pk)
     if not request.user == job.user:
-        return HttpResponseForbidden
-    filename = job.result_table
+        return HttpResponseForbidden()
+    return table_response(job.result_table, type, f'result_table_{job.model_name}.csv')
+
+
+@login_required
+def sweep_table(request, pk, type):
+    """
+    Same as result_table for the rate x cardinality table of a mutation rate sweep
+    """
+    job = Job.objects.get(id=pk)
+    if not request.user == job.user:
+        return HttpResponseForbidden()
+    return table_response(job.sweep_table, type, f'sweep_table_{job.model_name}.csv')
+
+
+def table_response(filename, type, download_name):
+    """serves a csv table as json (detail view) or as csv download"""
     if filename:
         if type == 'json':
             return HttpResponse(pd.read_csv(filename).to_json(orient='records', double_precision=15), content_type='application/json')
         else:
             response = HttpResponse(content_type='text/csv')
-            response['Content-Disposition'] = f'attachment; filename=result_table_{job.model_name}.csv'
+            response['Content-Disposition'] = f'attachment; filename={download_name}'
 
             pd.read_csv(filename).to_csv(path_or_buf=response, sep=';', index=False, decimal=".")
             return response
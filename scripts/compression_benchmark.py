@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+import argparse
+import filecmp
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from jobs import network_compression  # noqa: E402
+
+"""Parity and benchmark harness for the in-process network compression (jobs/network_compression.py) against
+scripts/compress_network.pl.
+
+Both engines compress copies of the same input files with the arguments of the compress_network task. All written
+files (_comp files, change protocol, .new_reac_names/.new_reac_stoich) are compared. The perl script lists the
+reactions of a REMOVE_DEADEND_META entry in hash order, which differs between runs, so these are compared as sets.
+The perl script never runs its kernel based compression, so parity is checked without it; --kernel additionally
+reports runtime and size of the network with the kernel based compression of the python engine.
+Inputs are the .sfile/.mfile/.rfile/.rvfile/.nfile of a job folder (e.g. one of the example_models) or random
+networks:
+
+    python3 scripts/compression_benchmark.py --job-dir uploads/<user>/<job>
+    python3 scripts/compression_benchmark.py --random 200 300 --seeds 20
+"""
+
+OUTPUTS = ['sfile_comp', 'mfile_comp', 'rfile_comp', 'rvfile_comp', 'rfile.new_reac_names', 'rfile.new_reac_stoich']
+
+
+def random_network(path, model_name, n_metas, n_reacs, seed=0):
+    rng = random.Random(seed)
+    stoichiometry = [[0] * n_reacs for _ in range(n_metas)]
+    for r in range(n_reacs):
+        for m in rng.sample(range(n_metas), rng.choice([1, 2, 2, 3, 4])):
+            stoichiometry[m][r] = rng.choice([-2, -1, -1, -0.5, 1, 1, 0.5, 3])
+    files = {'sfile': '\n'.join(' '.join(str(v) for v in row) for row in stoichiometry) + '\n',
+             'rfile': ' '.join(f'"R{r}"' for r in range(n_reacs)),
+             'mfile': ' '.join(f'"M{m}"' for m in range(n_metas)),
+             'rvfile': ' '.join(rng.choice('01') for _ in range(n_reacs)),
+             'nfile': '"R0"'}
+    for ext, content in files.items():
+        with open(os.path.join(path, f'{model_name}.{ext}'), 'w') as f:
+            f.write(content)
+
+
+def job_dir_model(path):
+    sfiles = [f for f in os.listdir(path) if f.endswith('.sfile')]
+    if not sfiles:
+        raise SystemExit(f'No .sfile found in {path}')
+    return sfiles[0][:-len('.sfile')]
+
+
+def copy_inputs(src, model_name):
+    dest = tempfile.mkdtemp()
+    for ext in ['sfile', 'mfile', 'rfile', 'rvfile', 'nfile']:
+        shutil.copy(os.path.join(src, f'{model_name}.{ext}'), dest)
+    return dest
+
+
+def run_perl(path, model_name, timeout):
+    cmd = [os.path.join(BASE_DIR, 'scripts/compress_network.pl'),
+           '-s', f'{model_name}.sfile', '-m', f'{model_name}.mfile', '-r', f'{model_name}.rfile',
+           '-v', f'{model_name}.rvfile', '-n', f'{model_name}.nfile', '-i', f'{model_name}.nfile',
+           '-p', 'chg_proto.txt', '-o', '_comp', '-l', '-k']
+    start = time.time()
+    subprocess.run(cmd, cwd=path, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT, timeout=timeout, check=True)
+    return time.time() - start
+
+
+def run_python(path, model_name, kernel=False):
+    cwd = os.getcwd()
+    os.chdir(path)
+    start = time.time()
+    try:
+        network_compression.compress(f'{model_name}.sfile', f'{model_name}.mfile', f'{model_name}.rfile',
+                                     f'{model_name}.rvfile', 'chg_proto.txt', '_comp', nfile=f'{model_name}.nfile',
+                                     skipfile=f'{model_name}.nfile', linear_only=True, kernel=kernel)
+    finally:
+        os.chdir(cwd)
+    return time.time() - start
+
+
+def normalized_protocol(fpath):
+    entries = []
+    with open(fpath, 'r') as f:
+        for line in f:
+            if line.startswith('REMOVE_DEADEND_META'):
+                head, removed = line.rstrip('\n').split('removed_reactions: ')
+                removed = removed.split()
+                line = (head, sorted(zip(removed[::2], removed[1::2])))
+            entries.append(line)
+    return entries
+
+
+def compare(perl_dir, python_dir, model_name):
+    errors = [f'{model_name}.{ext} differs' for ext in OUTPUTS
+              if not filecmp.cmp(os.path.join(perl_dir, f'{model_name}.{ext}'),
+                                 os.path.join(python_dir, f'{model_name}.{ext}'), shallow=False)]
+    if normalized_protocol(os.path.join(perl_dir, 'chg_proto.txt')) != \
+            normalized_protocol(os.path.join(python_dir, 'chg_proto.txt')):
+        errors.append('chg_proto.txt differs')
+    return errors
+
+
+def benchmark(src, model_name, timeout):
+    perl_dir, python_dir = copy_inputs(src, model_name), copy_inputs(src, model_name)
+    try:
+        python_time = run_python(python_dir, model_name)
+        perl_time = run_perl(perl_dir, model_name, timeout)
+        return compare(perl_dir, python_dir, model_name), perl_time, python_time
+    finally:
+        shutil.rmtree(perl_dir)
+        shutil.rmtree(python_dir)
+
+
+def kernel_benchmark(src, model_name):
+    """runtime and number of reactions after the compression with and without the kernel based compression"""
+    results = []
+    for kernel in (False, True):
+        path = copy_inputs(src, model_name)
+        try:
+            runtime = run_python(path, model_name, kernel)
+            with open(os.path.join(path, f'{model_name}.rfile_comp'), 'r') as f:
+                results.append((len(f.read().split()), runtime))
+        finally:
+            shutil.rmtree(path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the in-process network compression with '
+                                                 'scripts/compress_network.pl')
+    parser.add_argument('--job-dir', help='job folder with the .sfile/.mfile/.rfile/.rvfile/.nfile of a model')
+    parser.add_argument('--random', nargs=2, type=int, metavar=('METAS', 'REACS'), help='random networks')
+    parser.add_argument('--seeds', type=int, default=10, help='number of random networks')
+    parser.add_argument('--timeout', type=int, default=3600, help='timeout for the perl script (s)')
+    parser.add_argument('--kernel', action='store_true', help='also report the kernel based compression')
+    args = parser.parse_args()
+
+    if args.job_dir:
+        runs = [(args.job_dir, job_dir_model(args.job_dir))]
+    elif args.random:
+        runs = []
+        for seed in range(args.seeds):
+            path = tempfile.mkdtemp()
+            random_network(path, f'random{seed}', *args.random, seed=seed)
+            runs.append((path, f'random{seed}'))
+    else:
+        parser.error('one of --job-dir or --random is required')
+
+    failed = 0
+    for path, model_name in runs:
+        errors, perl_time, python_time = benchmark(path, model_name, args.timeout)
+        print(f'{model_name}: perl {perl_time:.3f}s, python {python_time:.3f}s, parity: '
+              f'{"FAILED" if errors else "OK"}')
+        for error in errors:
+            print(f'    {error}')
+        failed += bool(errors)
+        if args.kernel:
+            (linear, linear_time), (kernel, kernel_time) = kernel_benchmark(path, model_name)
+            print(f'    reactions: linear {linear} ({linear_time:.3f}s), with kernel {kernel} ({kernel_time:.3f}s)')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
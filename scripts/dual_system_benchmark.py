@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+import argparse
+import filecmp
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from jobs import dual_system  # noqa: E402
+
+"""Parity and benchmark harness for the in-process dual system builder (jobs/dual_system.py) against
+scripts/create_ccds_files.pl.
+
+Both build the dual system of the same network (like the create_dual_system task) and all written files are compared
+byte for byte. Inputs are the (compressed) network files of a job folder or a random network:
+
+    python3 scripts/dual_system_benchmark.py --job-dir uploads/<user>/<job>
+    python3 scripts/dual_system_benchmark.py --job-dir uploads/<user>/<job> --uncompressed
+    python3 scripts/dual_system_benchmark.py --random 2000 4000
+"""
+
+OUTPUTS = [f'_dual.{ext}file' for ext in ['c', 'm', 'r', 'rv', 's', 'v', 'x']] + \
+          [f'_efmtool.{ext}file' for ext in ['m', 'r', 'rv', 's']]
+
+
+def random_network(path, n_metas, n_reacs, seed=0):
+    """network files as the compression writes them, the first reaction is the (irreversible) target"""
+    rng = random.Random(seed)
+    columns = [{m: rng.choice(['-2', '-1', '-1', '-0.5', '1', '1', '0.5', '3'])
+                for m in rng.sample(range(n_metas), rng.randint(1, 4))} for _ in range(n_reacs)]
+    files = {'sfile': ''.join(' '.join(col.get(m, '0') for col in columns) + '\n' for m in range(n_metas)),
+             'rfile': ' '.join(f'"R{r}"' for r in range(n_reacs)),
+             'mfile': ' '.join(f'"M{m}"' for m in range(n_metas)),
+             'rvfile': ' '.join(['0'] + [rng.choice('01') for _ in range(n_reacs - 1)]),
+             'tfile': 'R0'}
+    for ext, content in files.items():
+        with open(os.path.join(path, f'random.{ext}'), 'w') as f:
+            f.write(content)
+    return [f'random.{ext}' for ext in ['rfile', 'mfile', 'sfile', 'rvfile', 'tfile']]
+
+
+def job_dir_inputs(path, compressed):
+    sfiles = [f for f in os.listdir(path) if f.endswith('.sfile')]
+    if not sfiles:
+        raise SystemExit(f'No .sfile found in {path}')
+    model_name = sfiles[0][:-len('.sfile')]
+    if compressed:
+        return [f'{model_name}.{ext}file_comp' for ext in ['r', 'm', 's', 'rv', 't']]
+    if not os.path.isfile(os.path.join(path, f'{model_name}.tfile')):
+        shutil.copy(os.path.join(path, f'{model_name}.nfile'), os.path.join(path, f'{model_name}.tfile'))
+    return [f'{model_name}.{ext}file' for ext in ['r', 'm', 's', 'rv', 't']]
+
+
+def copy_inputs(src, inputs):
+    dest = tempfile.mkdtemp()
+    for fname in inputs:
+        shutil.copy(os.path.join(src, fname), dest)
+    return dest
+
+
+def run_perl(path, inputs, timeout):
+    with open(os.path.join(path, 'model.inp'), 'w') as f:
+        f.write(','.join(inputs))
+    start = time.time()
+    subprocess.run([os.path.join(BASE_DIR, 'scripts/create_ccds_files.pl'), '-c', 'model.inp', '-o', 'model'],
+                   cwd=path, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT, timeout=timeout, check=True)
+    return time.time() - start
+
+
+def run_python(path, inputs):
+    cwd = os.getcwd()
+    os.chdir(path)
+    start = time.time()
+    try:
+        dual_system.create(*inputs, basis='model')
+    finally:
+        os.chdir(cwd)
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the in-process dual system builder with '
+                                                 'scripts/create_ccds_files.pl')
+    parser.add_argument('--job-dir', help='job folder with the network files')
+    parser.add_argument('--uncompressed', action='store_true', help='use the uncompressed network of the job')
+    parser.add_argument('--random', nargs=2, type=int, metavar=('METAS', 'REACS'), help='random network')
+    parser.add_argument('--timeout', type=int, default=3600, help='timeout for the perl script (s)')
+    args = parser.parse_args()
+
+    if args.job_dir:
+        src = args.job_dir
+        inputs = job_dir_inputs(src, not args.uncompressed)
+    elif args.random:
+        src = tempfile.mkdtemp()
+        inputs = random_network(src, *args.random)
+    else:
+        parser.error('one of --job-dir or --random is required')
+
+    perl_dir, python_dir = copy_inputs(src, inputs), copy_inputs(src, inputs)
+    try:
+        python_time = run_python(python_dir, inputs)
+        perl_time = run_perl(perl_dir, inputs, args.timeout)
+        errors = [f'model{fname} differs' for fname in OUTPUTS
+                  if not filecmp.cmp(os.path.join(perl_dir, f'model{fname}'),
+                                     os.path.join(python_dir, f'model{fname}'), shallow=False)]
+    finally:
+        shutil.rmtree(perl_dir)
+        shutil.rmtree(python_dir)
+
+    print(f'perl {perl_time:.3f}s, python {python_time:.3f}s, parity: {"FAILED" if errors else "OK"}')
+    for error in errors:
+        print(f'    {error}')
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,16 +1,3 @@
-// function submit_this_form() {
-//     var eventSource = new EventSource("/uploadstream/test");
-//     eventSource.onmessage = function(event) {
-//         console.log(event.data)
-//     };
-//
-//     $('#jobform').submit(function(e) {
-//         $('#jobsubmitbtn').hide();
-//         $('#pageloader').show();
-//
-//     });
-// }
-
 // Generate 32 char random uuid
 function gen_uuid() {
     var uuid = ""
@@ -20,6 +7,73 @@ function gen_uuid() {
     return uuid
 }
 
+async function sha256(buffer) {
+    var digest = await crypto.subtle.digest('SHA-256', buffer);
+    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+}
+
+// Resumable upload of a zip archive in chunks (jobs/chunked_upload.py), the job form is posted once it is complete.
+// The id of the upload is kept in the local storage, so submitting the same file again continues it
+async function chunked_upload(form, file, progressbar) {
+    var headers = {'X-CSRFToken': form.querySelector('[name=csrfmiddlewaretoken]').value};
+    var key = 'chunked_upload_' + [file.name, file.size, file.lastModified].join('_');
+    var upload = null;
+    var response;
+    if (localStorage.getItem(key)) {
+        response = await fetch('/jobs/uploads/' + localStorage.getItem(key), {headers: headers});
+        if (response.ok) upload = await response.json();
+    }
+    if (!upload) {
+        var data = new FormData();
+        data.append('filename', file.name);
+        data.append('size', file.size);
+        response = await fetch('/jobs/uploads/', {method: 'POST', body: data, headers: headers});
+        upload = await response.json();
+        if (!response.ok) throw new Error(upload.error);
+        localStorage.setItem(key, upload.id);
+    }
+
+    var offset = upload.offset;
+    var failures = 0;
+    while (offset < file.size) {
+        progressbar.html('Uploading..').width(offset / file.size * 50 + '%');
+        var chunk = await file.slice(offset, offset + upload.chunk_size).arrayBuffer();
+        try {
+            response = await fetch(upload.url, {method: 'PUT', body: chunk, headers: Object.assign({
+                'Content-Type': 'application/octet-stream',
+                'X-Upload-Offset': offset,
+                'X-Chunk-SHA256': await sha256(chunk)
+            }, headers)});
+            var state = await response.json();
+            if (!response.ok && response.status !== 400 && response.status !== 409) {
+                throw Object.assign(new Error(state.error), {fatal: true});
+            }
+            if (!response.ok) failures++;
+            offset = state.offset;
+        } catch (err) {
+            // connection dropped, continue at the offset the server has once it is back
+            if (err.fatal || ++failures > 10) throw err;
+            await new Promise(resolve => setTimeout(resolve, 1000 * Math.min(30, 2 ** failures)));
+            response = await fetch(upload.url, {headers: headers}).catch(() => null);
+            if (response && response.ok) offset = (await response.json()).offset;
+        }
+        if (failures > 10) throw new Error('Upload failed');
+    }
+
+    progressbar.html('Validating..').width('50%');
+    var form_data = new FormData(form);
+    form_data.delete('sbml_file');
+    response = await fetch(upload.complete_url, {method: 'POST', body: form_data, headers: headers});
+    if (response.status !== 409) localStorage.removeItem(key);
+    if (response.redirected) {
+        window.location = response.url;
+    } else {
+        document.open();
+        document.write(await response.text());
+        document.close();
+    }
+}
+
 // Add upload progress for multipart forms.
 $(function() {
 
@@ -27,7 +81,24 @@ $(function() {
         // Prevent multiple submits
         if ($.data(this, 'submitted')) return false;
 
-        var nr_files = $('#id_sbml_file')[0].files.length;
+        var files = $('#id_sbml_file')[0].files;
+        if (files.length === 1 && files[0].name.split('.').pop() === 'zip' && window.crypto && crypto.subtle) {
+            var form = this;
+            $('#jobsubmitbtn').hide();
+            $('#pageloader').show();
+            $('#progressbar_container').show();
+            $.data(form, 'submitted', true);
+            chunked_upload(form, files[0], $('#progressbar')).catch(err => {
+                // submitting again resumes the upload
+                $('#progressbar').html(err.message || 'Upload failed');
+                $('#pageloader').hide();
+                $('#jobsubmitbtn').show();
+                $.data(form, 'submitted', false);
+            });
+            return false;
+        }
+
+        var nr_files = files.length;
         var freq = 2000; // freqency of update in ms
         var uuid = gen_uuid(); // id for this upload so we can fetch progress info.
         var progress_url = '/upload_progress/'; // ajax view serving progress info